@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import json
+import hashlib
+
+###############################################################################
+#
+# Content Hash Keys of Cached Artifacts
+#
+###############################################################################
+
+def key_for(*parts):
+    """
+    Returns the hex digest of the key parts (bytes, or anything JSON-serializable).
+    Every part is length-prefixed, so ('ab', 'c') and ('a', 'bc') get different keys.
+
+    Parameters:
+    - parts: bytes or JSON-serializable values
+        The values the cached artifact depends on, e.g. a kind tag, a version and the source data.
+
+    Returns:
+    - key: str
+        The SHA-256 hex digest of the parts.
+    """
+    key_digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, default=str).encode('utf-8')
+        key_digest.update(len(part).to_bytes(8, 'little'))
+        key_digest.update(part)
+    return key_digest.hexdigest()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+###############################################################################
+#
+# Incremental Recompute: Row Content Hashes Persisted Between Runs
+#
+###############################################################################
+
+# Graphics written into a sample folder by the SVG generators
+profile_graphic_types = ['sample_table_name_id', 'sample_table_client', 'sample_table_species',
+                         'sample_table_cultivar', 'sample_table_gen_date', 'description_table_top',
+                         'description_table_bot', 'donut_plot', 'legend_table', 'dose_table']
+flush_graphic_types = profile_graphic_types + ['indiv_flush_table', 'indiv_flush_bar']
+
+def sample_hashes(df, sample_index, group_ids, settings_key=''):
+    """
+    Returns a content hash of the replicate rows of every requested sample group.
+    Rows are hashed once in a vectorized pass, the column names are part of every hash
+    so a schema change invalidates all samples.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame loaded from the Google Sheet.
+    - sample_index: SampleIndex.SampleIndex
+        The index of df.
+    - group_ids: list
+        The sample group keys to hash.
+    - settings_key: str
+        Pipeline settings the outputs depend on (e.g. the dilution setting), part of
+        every hash when not empty.
+
+    Returns:
+    - hash_dict: dict
+        The hex digest of every group, None for groups without rows.
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    column_digest = hashlib.sha1('|'.join(str(col) for col in df.columns).encode('utf-8'))
+    if settings_key:
+        column_digest.update(settings_key.encode('utf-8'))
+    hash_dict = {}
+    for group_id in group_ids:
+        positions = sample_index.replicate_positions(group_id)
+        if len(positions) == 0:
+            hash_dict[group_id] = None
+            continue
+        group_digest = column_digest.copy()
+        group_digest.update(row_hashes[positions].tobytes())
+        hash_dict[group_id] = group_digest.hexdigest()
+    return hash_dict
+
+def combined_hash(hash_list):
+    """
+    Returns one hash over several sample hashes, e.g. all Flush Tests of a campaign.
+    """
+    combined_digest = hashlib.sha1()
+    for sample_hash in hash_list:
+        combined_digest.update(str(sample_hash).encode('utf-8'))
+    return combined_digest.hexdigest()
+
+def load_state(state_path):
+    """
+    Returns the persisted state {group_id: {'hash', 'bundled', 'processed_at'}}.
+    """
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r') as state_file:
+        return json.load(state_file)
+
+def save_state(state_path, state):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temp_path = f'{state_path}.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file, indent=2, sort_keys=True)
+    os.replace(temp_path, state_path)
+
+def graphics_exist(output_dir, sample_id, graphic_types):
+    """
+    Returns True when every '{sample_id}-{graphic_type}.svg' exists in output_dir.
+    """
+    return all(os.path.exists(f'{output_dir}/{sample_id}-{graphic_type}.svg') for graphic_type in graphic_types)
+
+def reports_exist(output_dir, sample_id):
+    """
+    Returns True when a report page '{sample_id} - {sample_name} - {page}.pdf' exists in
+    output_dir, the outputs of samples whose graphics were only held in memory.
+    """
+    if not os.path.isdir(output_dir):
+        return False
+    return any(entry.name.startswith(f'{sample_id} - ') and entry.name.endswith('.pdf') for entry in os.scandir(output_dir))
+
+def outputs_exist(state, output_dir, sample_id, graphic_types):
+    """
+    Returns True when the outputs of the last run of a sample exist: its graphics, or its
+    report pages when the graphics were bundled in memory without writing the SVG files.
+    """
+    if state.get(sample_id, {}).get('bundled', False):
+        return reports_exist(output_dir, sample_id)
+    return graphics_exist(output_dir, sample_id, graphic_types)
+
+def needs_processing(state, group_id, current_hash, outputs_present):
+    """
+    Returns the reason a sample has to be reprocessed, or None when it can be skipped.
+
+    Parameters:
+    - state: dict
+        The state returned by load_state.
+    - group_id: str
+        The sample group key.
+    - current_hash: str
+        The hash of the current replicate rows.
+    - outputs_present: bool
+        Whether the generated outputs of the sample exist.
+
+    Returns:
+    - reason: str or None
+        'new', 'changed', 'outputs missing' or None.
+    """
+    if group_id not in state:
+        return 'new'
+    if state[group_id]['hash'] != current_hash:
+        return 'changed'
+    if not outputs_present:
+        return 'outputs missing'
+    return None
+
+def mark_processed(state, group_id, current_hash, bundled=False):
+    """
+    Records that the graphics of a sample were regenerated, bundled when they were only
+    held in memory (no SVG files written). Which report pages are rebuilt is decided by
+    the report manifest (PDFGenerators/ReportPlanner).
+    """
+    state[group_id] = {'hash': current_hash,
+                       'bundled': bundled,
+                       'processed_at': datetime.now().strftime('%Y%m%d-%H%M%S')}
+
+def print_skip_summary(processed_dict, skipped_list):
+    """
+    Prints which samples were reprocessed (with the reason) and which were skipped.
+
+    Parameters:
+    - processed_dict: dict
+        {group_id: reason} of the reprocessed samples.
+    - skipped_list: list
+        The group keys of the unchanged samples.
+    """
+    print(f'INCREMENTAL RUN: {len(processed_dict)} reprocessed, {len(skipped_list)} unchanged and skipped')
+    for group_id, reason in processed_dict.items():
+        print(f'  {group_id}: {reason}')
+    if len(skipped_list) > 0:
+        print(f'  Skipped: {", ".join(skipped_list)}')
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+###############################################################################
+#
+# Whole-Sheet ppm to mg/g Conversion
+#
+###############################################################################
+
+def compound_name(col, unit):
+    """
+    Returns the compound a concentration column belongs to, e.g. 'Psilocybin' for
+    'Psilocybin_ppm' or 'Psilocybin_mg_g'.
+
+    Parameters:
+    - col: str
+        The column name.
+    - unit: str
+        The unit token of the column, 'ppm' or 'mg_g'.
+
+    Returns:
+    - compound: str
+        The column name without the unit token.
+    """
+    return col.replace(unit, '').strip('_')
+
+def conversion_column_lists(df):
+    """
+    Returns the ppm and mg/g column lists of a sheet DataFrame, paired by compound
+    name: the n-th ppm column converts into the n-th mg/g column.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame loaded from the Google Sheet.
+
+    Returns:
+    - ppm_col_list: list
+        The column names containing 'ppm'.
+    - mg_g_col_list: list
+        The matching column names containing 'mg_g'.
+
+    Raises:
+    - ValueError
+        If a ppm or mg/g column has no column of the same compound in the other unit.
+    """
+    ppm_col_dict = {compound_name(col, 'ppm'): col for col in df.columns if 'ppm' in col}
+    mg_g_col_dict = {compound_name(col, 'mg_g'): col for col in df.columns if 'mg_g' in col}
+    unmatched_list = ([col for compound, col in ppm_col_dict.items() if compound not in mg_g_col_dict] +
+                      [col for compound, col in mg_g_col_dict.items() if compound not in ppm_col_dict])
+    if unmatched_list:
+        raise ValueError(f'No ppm/mg_g counterpart for the columns: {unmatched_list}')
+    ppm_col_list = list(ppm_col_dict.values())
+    mg_g_col_list = [mg_g_col_dict[compound] for compound in ppm_col_dict]
+    return ppm_col_list, mg_g_col_list
+
+def numeric_block(df, columns):
+    """
+    Converts a block of sheet columns to a float matrix in one pass per column.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame holding the columns.
+    - columns: list
+        The column names to convert.
+
+    Returns:
+    - values: numpy.ndarray
+        A float64 matrix (rows x columns), NaN where a cell is blank or not a number.
+    - blank_mask: numpy.ndarray
+        A boolean matrix, True where the sheet cell was empty.
+    """
+    block = df[columns]
+    # Columns typed by SheetSchema need no string checks, blanks are already NaN
+    if all(pd.api.types.is_numeric_dtype(block[col]) for col in columns):
+        values = block.to_numpy(dtype='float64')
+        return values, np.isnan(values)
+    blank_mask = block.isna().to_numpy() | (block.astype(str).apply(lambda col: col.str.strip()) == '').to_numpy()
+    values = block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+    return values, blank_mask
+
+def calculate_all_mg_g_values(loaded_df, rows=None, apply_dilution=False, decimals=1):
+    """
+    Calculates every mg/g column of the sheet in a single columnar pass:
+    mg/g = ppm * (Sonication_Solvent_Volume / Processed_Amount) / 1000 [* Extract_Dilution_Factor].
+    Cells that cannot be converted are set to 0, like convert_ppm_mg_g, and flagged in
+    the returned error mask instead of being printed one by one.
+
+    Parameters:
+    - loaded_df: pandas DataFrame
+        The DataFrame loaded from the Google Sheet.
+    - rows: pandas Series or array of bool, optional
+        Restricts the conversion to these rows; all other rows are returned untouched.
+    - apply_dilution: bool
+        Multiply by Extract_Dilution_Factor (blank factors count as 1). Off by default
+        to keep the values produced by convert_ppm_mg_g, set by the 'apply_dilution'
+        config key in the pipeline.
+    - decimals: int
+        Number of decimals the mg/g values are rounded to.
+
+    Returns:
+    - updated_df: pandas DataFrame
+        A copy of loaded_df with the mg/g columns filled in.
+    - error_mask: pandas DataFrame
+        Boolean DataFrame (converted rows x mg/g columns), True where the cell failed to convert.
+    """
+    ppm_col_list, mg_g_col_list = conversion_column_lists(loaded_df)
+
+    if rows is None:
+        work_df = loaded_df
+    else:
+        work_df = loaded_df[np.asarray(rows, dtype=bool)]
+
+    # Convert the ppm matrix and the per-row experimental parameters once
+    ppm_values, ppm_blank = numeric_block(work_df, ppm_col_list)
+    param_values, param_blank = numeric_block(work_df, ['Sonication_Solvent_Volume',
+                                                        'Processed_Amount',
+                                                        'Extract_Dilution_Factor'])
+    extraction_vol, sample_wt, extract_dil = param_values.T
+    dil_blank = param_blank[:, 2]
+
+    # Per-row conversion factor, invalid rows are flagged rather than raising
+    with np.errstate(divide='ignore', invalid='ignore'):
+        row_factor = extraction_vol / sample_wt / 1000
+    row_invalid = ~np.isfinite(row_factor) | (sample_wt <= 0)
+    if apply_dilution:
+        extract_dil = np.where(dil_blank, 1.0, extract_dil)
+        row_invalid |= ~np.isfinite(extract_dil) | (extract_dil <= 0)
+        row_factor = row_factor * extract_dil
+
+    # Zero and blank ppm cells are always 0 mg/g, whatever the row parameters are
+    zero_ppm = ppm_blank | (ppm_values == 0)
+    ppm_invalid = ~ppm_blank & np.isnan(ppm_values)
+    error_cells = ppm_invalid | (row_invalid[:, None] & ~zero_ppm)
+
+    with np.errstate(invalid='ignore'):
+        mg_g_values = ppm_values * row_factor[:, None]
+    mg_g_values[zero_ppm | error_cells] = 0
+    mg_g_values = np.round(mg_g_values, decimals)
+
+    updated_df = loaded_df.copy()
+    if rows is None:
+        updated_df[mg_g_col_list] = mg_g_values
+        # Keep the dtypes declared by SheetSchema (float32)
+        updated_df = updated_df.astype({col: loaded_df[col].dtype for col in mg_g_col_list
+                                        if pd.api.types.is_float_dtype(loaded_df[col])})
+    else:
+        for c, mg_g_col in enumerate(mg_g_col_list):
+            if pd.api.types.is_float_dtype(updated_df[mg_g_col]):
+                # Keep the dtypes declared by SheetSchema (float32)
+                col_values = mg_g_values[:, c].astype(updated_df[mg_g_col].dtype)
+            else:
+                updated_df[mg_g_col] = updated_df[mg_g_col].astype(object)
+                col_values = mg_g_values[:, c]
+            updated_df.loc[work_df.index, mg_g_col] = col_values
+    error_mask = pd.DataFrame(error_cells, index=work_df.index, columns=mg_g_col_list)
+
+    return updated_df, error_mask
+
+def mg_g_error_report(updated_df, error_mask):
+    """
+    Returns one row per cell that failed the mg/g conversion.
+
+    Parameters:
+    - updated_df: pandas DataFrame
+        The DataFrame returned by calculate_all_mg_g_values.
+    - error_mask: pandas DataFrame
+        The error mask returned by calculate_all_mg_g_values.
+
+    Returns:
+    - error_df: pandas DataFrame
+        Columns Sample_ID and Column for every flagged cell.
+    """
+    stacked_mask = error_mask.stack()
+    flagged = stacked_mask[stacked_mask]
+    row_labels = flagged.index.get_level_values(0)
+    error_df = pd.DataFrame({'Sample_ID': updated_df.loc[row_labels, 'Sample_ID'].to_numpy(),
+                             'Column': flagged.index.get_level_values(1)})
+    return error_df
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+###############################################################################
+#
+# Local SQLite Store of the Computed Results: mg/g, Statistics, Flush Tests, Reports
+#
+###############################################################################
+
+# Bumped when the tables of the computed results change, drops them so the next runs store them again
+store_version = 2
+
+# Tables rebuilt from the sheet, the report build history is kept across store versions
+computed_table_list = ['samples', 'replicate_mg_g', 'sample_stats', 'flush_aggregates', 'model_importances']
+
+schema_sql = """
+CREATE TABLE IF NOT EXISTS samples (
+    group_id TEXT PRIMARY KEY,
+    row_hash TEXT,
+    sample_name TEXT,
+    client TEXT,
+    cultivar TEXT,
+    generation_date TEXT,
+    report_type TEXT,
+    info_json TEXT,
+    updated_at TEXT);
+CREATE INDEX IF NOT EXISTS samples_client ON samples (client);
+CREATE INDEX IF NOT EXISTS samples_cultivar ON samples (cultivar);
+CREATE INDEX IF NOT EXISTS samples_generation_date ON samples (generation_date);
+
+CREATE TABLE IF NOT EXISTS replicate_mg_g (
+    sample_id TEXT,
+    occurrence INTEGER,
+    group_id TEXT,
+    compound TEXT,
+    mg_g REAL,
+    updated_at TEXT,
+    PRIMARY KEY (group_id, sample_id, occurrence, compound));
+
+CREATE TABLE IF NOT EXISTS sample_stats (
+    group_id TEXT,
+    compound TEXT,
+    position INTEGER,
+    mean REAL,
+    sd REAL,
+    n INTEGER,
+    updated_at TEXT,
+    PRIMARY KEY (group_id, compound));
+
+CREATE TABLE IF NOT EXISTS flush_aggregates (
+    campaign_id TEXT,
+    sample_id TEXT,
+    bin_id TEXT,
+    flush_id TEXT,
+    position INTEGER,
+    sample_mass_g REAL,
+    pcb_pcn_sum_mg_g REAL,
+    updated_at TEXT,
+    PRIMARY KEY (campaign_id, sample_id));
+
+CREATE TABLE IF NOT EXISTS model_importances (
+    campaign_id TEXT,
+    model TEXT,
+    feature TEXT,
+    importance REAL,
+    updated_at TEXT,
+    PRIMARY KEY (campaign_id, model, feature));
+
+CREATE TABLE IF NOT EXISTS report_builds (
+    pdf_path TEXT,
+    sample_id TEXT,
+    report_type TEXT,
+    section INTEGER,
+    status TEXT,
+    seconds REAL,
+    built_at TEXT);
+CREATE INDEX IF NOT EXISTS report_builds_sample ON report_builds (sample_id, built_at);
+"""
+
+def sql_value(value):
+    """
+    Returns value as a type sqlite3 stores: NaN/NaT become NULL, numpy scalars Python numbers.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def date_text(value):
+    # Generation dates are stored as ISO 'YYYY-MM-DD' so they sort and compare as text
+    date_value = pd.to_datetime(value, errors='coerce')
+    return None if pd.isna(date_value) else date_value.strftime('%Y-%m-%d')
+
+class ResultsStore:
+    """
+    Embedded SQLite database of everything the pipeline computes from the sample sheet:
+    the mg/g value of every replicate, the mean/SD/n of every sample group, the Flush
+    Test aggregates, the model feature importances and the build status and time of
+    every report page. Samples are indexed by group ID, client, cultivar and generation
+    date, so re-runs and historical queries read precomputed rows instead of reloading
+    and recomputing the sheet.
+
+    Rows of a sample group are replaced whenever the group is reprocessed, together with
+    the hash of its replicate rows (IncrementalTracker.sample_hashes), so a stored group
+    is only read back while its rows are unchanged. Replicates sharing a Sample_ID are
+    kept apart by their occurrence number. Report builds are appended so their history
+    is kept.
+
+    Parameters:
+    - db_path: str
+        The SQLite database file, created with its folder when missing.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != store_version:
+            with self.connection:
+                for table in computed_table_list:
+                    self.connection.execute(f'DROP TABLE IF EXISTS {table}')
+                self.connection.execute(f'PRAGMA user_version = {store_version}')
+        self.connection.executescript(schema_sql)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    ###########################################################################
+    # Writes
+    ###########################################################################
+    def store_samples(self, updated_df, sample_index, sample_stats_df, group_list, hash_dict=None):
+        """
+        Replaces the replicate mg/g values, statistics and sample information of every
+        group of group_list in one transaction.
+
+        Parameters:
+        - updated_df: pandas DataFrame
+            The DataFrame with the mg/g values calculated.
+        - sample_index: SampleIndex.SampleIndex
+            The index of updated_df.
+        - sample_stats_df: pandas DataFrame
+            The table returned by StatsEngine.sample_stats_table.
+        - group_list: list
+            The sample group keys to store (groups missing from sample_stats_df are skipped).
+        - hash_dict: dict, optional
+            {group_id: hash} of the replicate rows the results were computed from.
+        """
+        if hash_dict is None:
+            hash_dict = {}
+        updated_at = datetime.now().strftime('%Y%m%d-%H%M%S')
+        mg_g_col_list = [col for col in updated_df.columns if 'mg_g' in col]
+        compound_list = [col.replace('_mg_g_MEAN', '') for col in sample_stats_df.columns if col.endswith('_mg_g_MEAN')]
+        info_col_list = list(sample_stats_df.columns[:sample_stats_df.columns.get_loc(f'{compound_list[0]}_mg_g_MEAN')])
+        group_list = [group_id for group_id in group_list if group_id in sample_stats_df.index]
+
+        sample_row_list = []
+        replicate_row_list = []
+        stats_row_list = []
+        for group_id in group_list:
+            stats_row = sample_stats_df.loc[group_id]
+            info_dict = {col: sql_value(stats_row[col]) for col in info_col_list}
+            sample_row_list.append((group_id, hash_dict.get(group_id), info_dict.get('Sample_Name'), info_dict.get('Client_Name'), info_dict.get('Cultivar'),
+                                    date_text(stats_row.get('Generation_Date')), info_dict.get('Report_Type'),
+                                    json.dumps(info_dict, default=str), updated_at))
+            for position, compound in enumerate(compound_list):
+                stats_row_list.append((group_id, compound, position, sql_value(stats_row[f'{compound}_mg_g_MEAN']),
+                                       sql_value(stats_row[f'{compound}_mg_g_SD']), sql_value(stats_row[f'{compound}_mg_g_N']),
+                                       updated_at))
+            replicate_df = sample_index.replicate_df(updated_df, group_id)
+            mg_g_df = replicate_df[mg_g_col_list].apply(pd.to_numeric, errors='coerce')
+            replicate_ids = replicate_df['Sample_ID'].astype(str).reset_index(drop=True)
+            occurrences = replicate_ids.groupby(replicate_ids).cumcount()
+            for sample_id, occurrence, mg_g_row in zip(replicate_ids, occurrences, mg_g_df.itertuples(index=False)):
+                replicate_row_list += [(sample_id, int(occurrence), group_id, mg_g_col.replace('_mg_g', ''), sql_value(mg_g), updated_at)
+                                       for mg_g_col, mg_g in zip(mg_g_col_list, mg_g_row)]
+
+        with self.connection:
+            group_param_list = [(group_id,) for group_id in group_list]
+            self.connection.executemany('DELETE FROM replicate_mg_g WHERE group_id = ?', group_param_list)
+            self.connection.executemany('DELETE FROM sample_stats WHERE group_id = ?', group_param_list)
+            self.connection.executemany('INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', sample_row_list)
+            self.connection.executemany('INSERT INTO replicate_mg_g VALUES (?, ?, ?, ?, ?, ?)', replicate_row_list)
+            self.connection.executemany('INSERT INTO sample_stats VALUES (?, ?, ?, ?, ?, ?, ?)', stats_row_list)
+        print(f'RESULTS STORE: {len(group_list)} samples, {len(replicate_row_list)} replicate mg/g values saved')
+
+    def store_flush_campaign(self, campaign_id, ft_df):
+        """
+        Replaces the per-replicate aggregates of a Flush Test campaign.
+
+        Parameters:
+        - campaign_id: str
+            The campaign ID, e.g. FT3-11.
+        - ft_df: pandas DataFrame
+            The 'Sample_ID', 'Bin_ID', 'Flush_ID', 'Position', 'Sample_Mass_g' and
+            'PCB_PCN_SUM_mg_g' columns of every replicate of the campaign.
+        """
+        updated_at = datetime.now().strftime('%Y%m%d-%H%M%S')
+        row_list = [(campaign_id, str(row['Sample_ID']), sql_value(row['Bin_ID']), sql_value(row['Flush_ID']),
+                     sql_value(row['Position']), sql_value(pd.to_numeric(row['Sample_Mass_g'], errors='coerce')),
+                     sql_value(pd.to_numeric(row['PCB_PCN_SUM_mg_g'], errors='coerce')), updated_at)
+                    for _, row in ft_df.iterrows()]
+        with self.connection:
+            self.connection.execute('DELETE FROM flush_aggregates WHERE campaign_id = ?', (campaign_id,))
+            self.connection.executemany('INSERT OR REPLACE INTO flush_aggregates VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row_list)
+
+    def store_importances(self, campaign_id, importance_dict):
+        """
+        Replaces the feature importances of the models of a Flush Test campaign.
+
+        Parameters:
+        - campaign_id: str
+            The campaign ID, e.g. FT3-11.
+        - importance_dict: dict
+            {model: DataFrame} with the 'Analysis Feature' and '▲-Contribution %' columns
+            returned by CatBoostReg.cat_boost_regressor.
+        """
+        updated_at = datetime.now().strftime('%Y%m%d-%H%M%S')
+        row_list = [(campaign_id, model, str(feature), sql_value(importance), updated_at)
+                    for model, importance_df in importance_dict.items()
+                    for feature, importance in zip(importance_df['Analysis Feature'], importance_df['▲-Contribution %'])]
+        with self.connection:
+            self.connection.execute('DELETE FROM model_importances WHERE campaign_id = ?', (campaign_id,))
+            self.connection.executemany('INSERT INTO model_importances VALUES (?, ?, ?, ?, ?)', row_list)
+
+    def record_report_builds(self, build_list):
+        """
+        Appends report page builds.
+
+        Parameters:
+        - build_list: list
+            (pdf_path, sample_id, report_type, section, status, seconds) of every page,
+            status 'built' or 'failed'.
+        """
+        built_at = datetime.now().strftime('%Y%m%d-%H%M%S')
+        with self.connection:
+            self.connection.executemany('INSERT INTO report_builds VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                        [(*build, built_at) for build in build_list])
+
+    ###########################################################################
+    # Queries
+    ###########################################################################
+    def lookup_sample_stats(self, group_id, row_hash=None):
+        """
+        Returns the stored statistics of one sample group in the same layout as
+        StatsEngine.lookup_sample_stats, or None when the group is not stored (or was
+        stored from other rows than those hashed to row_hash). Blank values are NaN.
+
+        Returns:
+        - A tuple containing the sample information row, a list of compound names, a list of
+          mean values, and a list of standard deviation values.
+        """
+        sample_row = self.connection.execute('SELECT info_json, row_hash FROM samples WHERE group_id = ?', (group_id,)).fetchone()
+        if sample_row is None or (row_hash is not None and sample_row[1] != row_hash):
+            return None
+        stats_row_list = self.connection.execute('SELECT compound, mean, sd FROM sample_stats WHERE group_id = ? ORDER BY position',
+                                                 (group_id,)).fetchall()
+        sample_info_df = pd.Series(json.loads(sample_row[0]), name=group_id)
+        return (sample_info_df, [row[0] for row in stats_row_list],
+                [np.nan if row[1] is None else row[1] for row in stats_row_list],
+                [np.nan if row[2] is None else row[2] for row in stats_row_list])
+
+    def query_samples(self, client=None, cultivar=None, date_from=None, date_to=None, compound=None):
+        """
+        Returns the stored statistics of the sample groups matching every given filter.
+
+        Parameters:
+        - client: str, optional
+            The Client_Name.
+        - cultivar: str, optional
+            The Cultivar.
+        - date_from, date_to: str, optional
+            Inclusive bounds of the Generation_Date ('YYYY-MM-DD').
+        - compound: str, optional
+            Only the rows of this compound, e.g. 'Psilocybin'.
+
+        Returns:
+        - stats_df: pandas DataFrame
+            One row per sample group and compound with the sample name, client, cultivar,
+            generation date, mean, SD and n.
+        """
+        condition_list = []
+        param_list = []
+        for condition, value in [('s.client = ?', client), ('s.cultivar = ?', cultivar),
+                                 ('s.generation_date >= ?', date_from), ('s.generation_date <= ?', date_to),
+                                 ('t.compound = ?', compound)]:
+            if value is not None:
+                condition_list.append(condition)
+                param_list.append(value)
+        where_sql = f"WHERE {' AND '.join(condition_list)}" if len(condition_list) > 0 else ''
+        return pd.read_sql_query('SELECT s.group_id, s.sample_name, s.client, s.cultivar, s.generation_date, '
+                                 't.compound, t.mean, t.sd, t.n FROM samples s JOIN sample_stats t ON t.group_id = s.group_id '
+                                 f'{where_sql} ORDER BY s.generation_date, s.group_id, t.position',
+                                 self.connection, params=param_list)
+
+    def replicate_values(self, group_id):
+        """
+        Returns the stored mg/g values of the replicates of a sample group, one row per
+        replicate (indexed by Sample_ID and occurrence) and one column per compound.
+        """
+        replicate_df = pd.read_sql_query('SELECT sample_id, occurrence, compound, mg_g FROM replicate_mg_g WHERE group_id = ?',
+                                         self.connection, params=[group_id])
+        return replicate_df.pivot(index=['sample_id', 'occurrence'], columns='compound', values='mg_g')
+
+    def report_history(self, sample_id=None):
+        """
+        Returns the report page builds, newest first, of one sample or of every sample.
+        """
+        where_sql = 'WHERE sample_id = ?' if sample_id is not None else ''
+        return pd.read_sql_query(f'SELECT * FROM report_builds {where_sql} ORDER BY built_at DESC',
+                                 self.connection, params=[sample_id] if sample_id is not None else [])
+
+def open_results_store(settings):
+    """
+    Returns the ResultsStore of the settings, None when store_results is disabled.
+    """
+    if not settings['store_results']:
+        return None
+    return ResultsStore(settings['results_db'])
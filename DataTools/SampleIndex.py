@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import re
+import numpy as np
+import pandas as pd
+
+###############################################################################
+#
+# Exact Sample_ID / Replicate Index
+#
+###############################################################################
+
+# Replicates are the parent ID followed by one capital letter (HLO1A, HLO1B, FT3A, ...)
+replicate_id_pattern = re.compile(r'^(?P<Parent_ID>.*\d)(?P<Replicate>[A-Z])$')
+
+# Flush Test replicates are named 'Bin {bin} Flush {flush} Position {position}'
+flush_name_pattern = re.compile(r'Bin\s+(?P<Bin_ID>\S+)\s+Flush\s+(?P<Flush_ID>\S+)', re.IGNORECASE)
+
+def grouped_positions(row_mask, keys):
+    """
+    Returns {key: row positions} of the rows selected by row_mask, the positions being
+    those of the full frame and not of the selected rows.
+    """
+    positions = np.flatnonzero(row_mask)
+    group_indices = pd.Series(positions).groupby(keys[row_mask]).indices
+    return {key: positions[indices] for key, indices in group_indices.items()}
+
+class SampleIndex:
+    """
+    Parses every Sample_ID of a sheet once (parent ID, replicate letter, flush/bin/position)
+    and maps sample IDs and replicate groups to row positions for O(1) lookups.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame loaded from the Google Sheet. Row positions stay valid for any
+        DataFrame derived from it without reordering or dropping rows (e.g. updated_df).
+    """
+    def __init__(self, df):
+        sample_ids = df['Sample_ID'].astype(str).str.strip()
+        if 'Sample_Name' in df.columns:
+            sample_names = df['Sample_Name'].astype(str)
+        else:
+            sample_names = pd.Series('', index=df.index)
+
+        id_parts = sample_ids.str.extract(replicate_id_pattern)
+        flush_parts = sample_names.str.extract(flush_name_pattern)
+        is_replicate = id_parts['Parent_ID'].notna()
+        is_combined = sample_ids.str.contains('-', regex=False) | sample_ids.str.contains(',', regex=False)
+        has_replicates = sample_ids.isin(set(id_parts.loc[is_replicate, 'Parent_ID']))
+
+        # Replicates group under their parent, unreplicated samples under themselves,
+        # combined IDs and bare parent rows of replicated samples are left out
+        group_keys = id_parts['Parent_ID'].where(is_replicate, sample_ids)
+        group_keys = group_keys.where(~is_combined & ~(has_replicates & ~is_replicate))
+
+        position = id_parts['Replicate'].str.slice(0, 1).map(lambda letter: ord(letter) - 64, na_action='ignore')
+
+        self.parsed_df = pd.DataFrame({'Sample_ID': sample_ids.to_numpy(),
+                                       'Parent_ID': id_parts['Parent_ID'].to_numpy(),
+                                       'Replicate': id_parts['Replicate'].to_numpy(),
+                                       'Is_Combined': is_combined.to_numpy(),
+                                       'Group_ID': group_keys.to_numpy(),
+                                       'Bin_ID': flush_parts['Bin_ID'].to_numpy(),
+                                       'Flush_ID': flush_parts['Flush_ID'].to_numpy(),
+                                       'Position': position.astype('Int64').array})
+        self.group_keys = group_keys
+
+        self.id_positions = grouped_positions(np.ones(len(df), dtype=bool), sample_ids.to_numpy())
+        self.group_positions = grouped_positions(group_keys.notna().to_numpy(), group_keys.to_numpy())
+        self.parent_positions = grouped_positions(is_replicate.to_numpy(), id_parts['Parent_ID'].to_numpy())
+        self.row_count = len(df)
+
+    def sample_positions(self, sample_id):
+        """
+        Returns the row positions whose Sample_ID is exactly sample_id.
+        """
+        return self.id_positions.get(sample_id, np.array([], dtype=np.intp))
+
+    def replicate_positions(self, group_id):
+        """
+        Returns the row positions of the replicates grouped under group_id.
+        """
+        return self.group_positions.get(group_id, np.array([], dtype=np.intp))
+
+    def replicate_df(self, df, group_id):
+        """
+        Returns the replicate rows of group_id from df (a DataFrame aligned with the index).
+        """
+        return df.iloc[self.replicate_positions(group_id)]
+
+    def sample_mask(self, sample_id):
+        """
+        Returns a boolean row mask of every row belonging to sample_id: the exact ID
+        and all of its replicates.
+        """
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[self.sample_positions(sample_id)] = True
+        mask[self.parent_positions.get(sample_id, np.array([], dtype=np.intp))] = True
+        return mask
+
+    def group_ids(self):
+        """
+        Returns every replicate group key in sheet order.
+        """
+        return list(self.group_keys.dropna().unique())
+
+    def flush_info(self, group_id):
+        """
+        Returns the Bin_ID, Flush_ID and replicate Position parsed for a Flush Test group.
+
+        Returns:
+        - flush_info_df: pandas DataFrame
+            Columns Sample_ID, Bin_ID, Flush_ID and Position for every replicate of group_id.
+        """
+        flush_info_df = self.parsed_df.iloc[self.replicate_positions(group_id)]
+        return flush_info_df[['Sample_ID', 'Bin_ID', 'Flush_ID', 'Position']]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import re
+import fnmatch
+
+###############################################################################
+#
+# Command-Line Sample Selection: ID Lists, Glob and Range Patterns
+#
+###############################################################################
+
+# Flush Test groups (FT3, FT11, ...) are selected through the flush range, not the sample patterns
+flush_test_pattern = r'^FT\d+$'
+
+# 'HLO120..HLO129' or 'HLO120..129'
+sample_range_pattern = r'^(?P<prefix>\D*)(?P<start>\d+)\.\.(?P<end_prefix>\D*)(?P<end>\d+)$'
+
+# Keywords selecting every sample: 'changed' skips the unchanged ones, 'all' rebuilds them too
+all_sample_keywords = ['all', 'changed']
+rebuild_sample_keywords = ['all']
+
+report_type_list = ['Profile', 'Cup', 'Flush']
+
+def report_category(report_type):
+    """
+    Returns 'Cup', 'Profile' or 'Flush' for a Report_Type (or report folder prefix) of the
+    sheet, None when it is none of them.
+    """
+    if 'CUP' in report_type or 'Cup' in report_type:
+        return 'Cup'
+    if 'Profile' in report_type:
+        return 'Profile'
+    if 'Flush' in report_type or 'FLUSH' in report_type or 'FT' in report_type:
+        return 'Flush'
+    return None
+
+def split_patterns(patterns):
+    """
+    Returns the patterns of a command line argument list, comma-separated values split apart.
+    """
+    return [pattern.strip() for value in patterns for pattern in value.split(',') if pattern.strip() != '']
+
+def forces_rebuild(patterns):
+    """
+    Returns True when the patterns select every sample with 'all', so unchanged samples
+    are reprocessed like with --force.
+    """
+    return any(pattern.lower() in rebuild_sample_keywords for pattern in split_patterns(patterns))
+
+def expand_sample_patterns(patterns, group_ids):
+    """
+    Returns the sample groups matching any of the patterns, in sheet order.
+
+    Parameters:
+    - patterns: list
+        Exact Sample_IDs ('HLO126'), glob patterns ('HLO12*'), numeric ranges
+        ('HLO120..HLO129', both ends with the same prefix) or 'all' / 'changed' for
+        every sample (see forces_rebuild).
+    - group_ids: list
+        The sample group keys of the sheet (SampleIndex.group_ids()).
+
+    Returns:
+    - sample_list: list
+        The selected group keys.
+    - unmatched_list: list
+        The patterns that matched no sample.
+    """
+    selected = set()
+    unmatched_list = []
+    for pattern in split_patterns(patterns):
+        if pattern.lower() in all_sample_keywords:
+            matches = list(group_ids)
+        elif re.match(sample_range_pattern, pattern):
+            range_parts = re.match(sample_range_pattern, pattern)
+            if range_parts.group('end_prefix') not in ['', range_parts.group('prefix')]:
+                raise ValueError(f'Invalid sample range: {pattern} (both ends need the same prefix)')
+            start, end = int(range_parts.group('start')), int(range_parts.group('end'))
+            number_parts = [re.match(rf'^{re.escape(range_parts.group("prefix"))}(\d+)$', group_id) for group_id in group_ids]
+            matches = [group_id for group_id, number in zip(group_ids, number_parts)
+                       if number is not None and start <= int(number.group(1)) <= end]
+        elif any(char in pattern for char in '*?['):
+            matches = fnmatch.filter(group_ids, pattern)
+        else:
+            matches = [group_id for group_id in group_ids if group_id == pattern]
+        if len(matches) == 0:
+            unmatched_list.append(pattern)
+        selected.update(matches)
+    sample_list = [group_id for group_id in group_ids if group_id in selected]
+    return sample_list, unmatched_list
+
+def parse_flush_range(flush_range):
+    """
+    Returns (ft_start, ft_end) of a Flush Test range such as '3-11', 'FT3-11' or 'FT3-FT11'.
+    """
+    range_parts = re.match(r'^(?:FT)?(\d+)(?:-(?:FT)?(\d+))?$', flush_range.strip(), re.IGNORECASE)
+    if range_parts is None:
+        raise ValueError(f'Invalid Flush Test range: {flush_range} (expected e.g. 3-11)')
+    ft_start = int(range_parts.group(1))
+    ft_end = int(range_parts.group(2) or ft_start)
+    if ft_end < ft_start:
+        raise ValueError(f'Invalid Flush Test range: {flush_range} (end before start)')
+    return ft_start, ft_end
+
+def flush_test_list(ft_start, ft_end):
+    """
+    Returns the Flush Test group keys FT{ft_start} through FT{ft_end}.
+    """
+    return [f'FT{ft_count}' for ft_count in range(ft_start, ft_end + 1)]
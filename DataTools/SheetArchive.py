@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from datetime import datetime
+import pandas as pd
+from DataTools import SheetCache
+
+###############################################################################
+#
+# Versioned Local Archive of the Sample Sheet: Row Deltas Between Snapshots
+#
+###############################################################################
+
+class SheetArchive:
+    """
+    Local replacement of the ArchiveDataFrame worksheets. Every archived version stores
+    only the rows that were added or changed since the previous version, plus the keys
+    of the removed rows, as a compressed columnar frame (Parquet, or a gzipped pickle
+    when Parquet cannot store the columns); a full snapshot is written for the first
+    version, when the columns change and every full_interval versions, so a version
+    is rebuilt from at most full_interval deltas.
+
+    Rows are keyed by key_col, repeated keys (e.g. blank Sample_IDs) by their occurrence
+    number, and compared through the row hashes of the last version. Columns mixing
+    numbers and text (as get_as_df returns them) are archived as text, so the versions
+    stay columnar; numeric and date columns keep their dtype.
+
+    Parameters:
+    - archive_dir: str
+        The folder holding the manifest and the version frames.
+    - key_col: str
+        The column identifying a row.
+    - full_interval: int
+        Number of versions after which a full snapshot is written again.
+    """
+    def __init__(self, archive_dir, key_col='Sample_ID', full_interval=20):
+        self.archive_dir = archive_dir
+        self.key_col = key_col
+        self.full_interval = full_interval
+        self.manifest_path = os.path.join(archive_dir, 'manifest.json')
+        self.manifest = SheetCache.read_manifest(self.manifest_path) or {'versions': []}
+
+    def version_path(self, version, kind):
+        return os.path.join(self.archive_dir, f'v{version:05d}-{kind}')
+
+    def row_keys(self, df):
+        """
+        Returns the key of every row of df: its key_col value, followed by '#{n}' for the
+        n-th repeat of a key.
+        """
+        key_values = df[self.key_col].astype(str).str.strip().reset_index(drop=True)
+        occurrence = key_values.groupby(key_values).cumcount()
+        return key_values.where(occurrence == 0, key_values + '#' + occurrence.astype(str)).to_numpy()
+
+    def row_hashes(self, df):
+        return pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy(), index=self.row_keys(df))
+
+    @staticmethod
+    def text_frame(df):
+        """
+        Returns df with every object column as text, missing cells left missing.
+        """
+        text_df = df.copy()
+        for col in text_df.columns[text_df.dtypes == object]:
+            values = text_df[col]
+            text_df[col] = values.where(values.isna(), values.astype(str))
+        return text_df
+
+    def save_manifest(self):
+        temp_path = f'{self.manifest_path}.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=1)
+        os.replace(temp_path, self.manifest_path)
+
+    def save(self, df, label=''):
+        """
+        Archives df as a new version when it differs from the last version.
+
+        Parameters:
+        - df: pandas DataFrame
+            The sheet to archive.
+        - label: str
+            A note kept in the manifest, e.g. the sheet revision.
+
+        Returns:
+        - entry: dict or None
+            The manifest entry of the new version, None when nothing changed.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        version_list = self.manifest['versions']
+        version = len(version_list) + 1
+        df = self.text_frame(df.reset_index(drop=True))
+        keyed_df = df.set_axis(self.row_keys(df))
+        keyed_df.index.name = 'Row_Key'
+        row_hashes = self.row_hashes(df)
+        entry = {'version': version,
+                 'saved_at': datetime.now().strftime('%Y%m%d-%H%M%S'),
+                 'label': label,
+                 'rows': len(df),
+                 'columns': [str(col) for col in df.columns]}
+
+        last_full = max([entry['version'] for entry in version_list if entry['full']], default=0)
+        if (len(version_list) == 0 or version_list[-1]['columns'] != entry['columns']
+                or version - last_full >= self.full_interval):
+            entry.update(full=True, changed=len(df), removed=[], order=False,
+                         format=SheetCache.write_frame(keyed_df, self.version_path(version, 'rows'), compress=True))
+        else:
+            last_hashes = SheetCache.read_frame(self.version_path(0, 'hashes'), self.manifest['hashes_format'])['Row_Hash']
+            changed_mask = ((last_hashes.reindex(row_hashes.index, fill_value=0).to_numpy() != row_hashes.to_numpy())
+                            | ~row_hashes.index.isin(last_hashes.index))
+            removed_list = [key for key in last_hashes.index if key not in row_hashes.index]
+            # The row order is stored only when it is not the last order minus the removed rows plus the added rows
+            removed_set = set(removed_list)
+            added_list = [key for key in row_hashes.index if key not in last_hashes.index]
+            expected_order = [key for key in last_hashes.index if key not in removed_set] + added_list
+            order_changed = expected_order != list(row_hashes.index)
+            if not changed_mask.any() and len(removed_list) == 0 and not order_changed:
+                print(f'SHEET ARCHIVE: unchanged since version {version - 1}')
+                return None
+            entry.update(full=False, changed=int(changed_mask.sum()), removed=removed_list, order=order_changed,
+                         format=SheetCache.write_frame(keyed_df[changed_mask], self.version_path(version, 'rows'), compress=True))
+            if order_changed:
+                entry['order_format'] = SheetCache.write_frame(pd.DataFrame({'Row_Key': row_hashes.index}),
+                                                               self.version_path(version, 'order'), compress=True)
+
+        # Row hashes of the newest version, compared by the next save
+        self.manifest['hashes_format'] = SheetCache.write_frame(row_hashes.rename('Row_Hash').to_frame(),
+                                                                self.version_path(0, 'hashes'))
+        version_list.append(entry)
+        self.save_manifest()
+        print(f"SHEET ARCHIVE: version {version} saved, {entry['changed']} rows {'(full)' if entry['full'] else 'changed'}, "
+              f"{len(entry['removed'])} removed")
+        return entry
+
+    def load(self, version=None, keyed=False):
+        """
+        Rebuilds an archived version from its last full snapshot and the following deltas.
+
+        Parameters:
+        - version: int, optional
+            The version number, defaults to the newest version.
+        - keyed: bool
+            Index the rows by their row key instead of a RangeIndex.
+
+        Returns:
+        - archived_df: pandas DataFrame
+            The sheet as it was archived.
+        """
+        version_list = self.manifest['versions']
+        if version is None:
+            version = len(version_list)
+        if not 1 <= version <= len(version_list):
+            raise ValueError(f'Archive version {version} not found in {self.archive_dir}')
+        base_version = max(entry['version'] for entry in version_list[:version] if entry['full'])
+        archived_df = SheetCache.read_frame(self.version_path(base_version, 'rows'), version_list[base_version - 1]['format'])
+        for entry in version_list[base_version:version]:
+            delta_df = SheetCache.read_frame(self.version_path(entry['version'], 'rows'), entry['format'])
+            if entry['order']:
+                row_order = SheetCache.read_frame(self.version_path(entry['version'], 'order'), entry['order_format'])['Row_Key'].tolist()
+            else:
+                removed_set = set(entry['removed'])
+                row_order = ([key for key in archived_df.index if key not in removed_set]
+                             + [key for key in delta_df.index if key not in archived_df.index])
+            replaced_list = entry['removed'] + [key for key in delta_df.index if key in archived_df.index]
+            archived_df = pd.concat([archived_df.drop(index=replaced_list), delta_df]).loc[row_order]
+        archived_df = archived_df[version_list[version - 1]['columns']]
+        return archived_df if keyed else archived_df.reset_index(drop=True)
+
+    def diff(self, old_version, new_version=None):
+        """
+        Compares two archived versions row by row and cell by cell.
+
+        Parameters:
+        - old_version: int
+            The earlier version.
+        - new_version: int, optional
+            The later version, defaults to the newest version.
+
+        Returns:
+        - diff_dict: dict
+            'added' and 'removed': the row keys only in one version, 'changed': a
+            DataFrame of the changed cells with the 'Row_Key', 'Column', 'Old' and 'New'
+            columns.
+        """
+        old_df = self.load(old_version, keyed=True)
+        new_df = self.load(new_version, keyed=True)
+        common_keys = old_df.index.intersection(new_df.index, sort=False)
+        common_cols = [col for col in new_df.columns if col in old_df.columns]
+        old_common = old_df.loc[common_keys, common_cols]
+        new_common = new_df.loc[common_keys, common_cols]
+        # Only rows whose hashes differ are compared cell by cell
+        row_changed = (pd.util.hash_pandas_object(old_common, index=False).to_numpy()
+                       != pd.util.hash_pandas_object(new_common, index=False).to_numpy())
+        change_list = []
+        for key in common_keys[row_changed]:
+            for col in common_cols:
+                old_value, new_value = old_common.at[key, col], new_common.at[key, col]
+                if not (old_value == new_value or (pd.isna(old_value) and pd.isna(new_value))):
+                    change_list.append((key, col, old_value, new_value))
+        return {'added': [key for key in new_df.index if key not in old_df.index],
+                'removed': [key for key in old_df.index if key not in new_df.index],
+                'changed': pd.DataFrame(change_list, columns=['Row_Key', 'Column', 'Old', 'New'])}
+
+    def versions(self):
+        """
+        Returns the manifest entries as a DataFrame, one row per version.
+        """
+        return pd.DataFrame([{'version': entry['version'], 'saved_at': entry['saved_at'], 'label': entry['label'],
+                              'rows': entry['rows'], 'full': entry['full'], 'changed': entry['changed'],
+                              'removed': len(entry['removed'])} for entry in self.manifest['versions']])
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import gzip
+import pickle
+from datetime import datetime
+import pandas as pd
+
+###############################################################################
+#
+# Sheet Backends: pygsheets (Google Sheets) and a Local File Stand-In
+#
+###############################################################################
+
+class PygsheetsBackend:
+    """
+    Loads worksheets from Google Sheets through pygsheets. The client is authorized
+    once and opened spreadsheets are kept for later reads and writes.
+
+    Parameters:
+    - service_file_path: str
+        The file path of the JSON file containing Google API credentials.
+    """
+    def __init__(self, service_file_path):
+        self.service_file_path = service_file_path
+        self.client = None
+        self.spreadsheets = {}
+
+    def open_spreadsheet(self, gsheet_key):
+        if self.client is None:
+            import pygsheets
+            self.client = pygsheets.authorize(service_file=self.service_file_path)
+        if gsheet_key not in self.spreadsheets:
+            self.spreadsheets[gsheet_key] = self.client.open_by_key(gsheet_key)
+        return self.spreadsheets[gsheet_key]
+
+    def revision(self, gsheet_key, sheet_name):
+        # Drive modifiedTime of the whole spreadsheet, a cheap metadata call
+        return str(self.open_spreadsheet(gsheet_key).updated)
+
+    def fetch(self, gsheet_key, sheet_name):
+        worksheet = self.open_spreadsheet(gsheet_key).worksheet_by_title(sheet_name)
+        return worksheet.get_as_df()
+
+    def write_ranges(self, gsheet_key, sheet_name, range_list, value_list):
+        # One values.batchUpdate request for all ranges
+        worksheet = self.open_spreadsheet(gsheet_key).worksheet_by_title(sheet_name)
+        worksheet.update_values_batch(range_list, value_list, 'ROWS')
+
+class LocalFileBackend:
+    """
+    Stand-in for PygsheetsBackend that reads worksheets from CSV files laid out as
+    '{root_dir}/{gsheet_key}/{sheet_name}.csv'. Empty cells load as '' like get_as_df().
+
+    Every write_ranges call is recorded in write_calls and applied to the CSV file.
+
+    Parameters:
+    - root_dir: str
+        The directory containing one folder per spreadsheet key.
+    """
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.write_calls = []
+
+    def worksheet_path(self, gsheet_key, sheet_name):
+        return os.path.join(self.root_dir, gsheet_key, f'{sheet_name}.csv')
+
+    def revision(self, gsheet_key, sheet_name):
+        file_stat = os.stat(self.worksheet_path(gsheet_key, sheet_name))
+        return f'{file_stat.st_mtime_ns}-{file_stat.st_size}'
+
+    def fetch(self, gsheet_key, sheet_name):
+        return pd.read_csv(self.worksheet_path(gsheet_key, sheet_name), keep_default_na=False)
+
+    def write_ranges(self, gsheet_key, sheet_name, range_list, value_list):
+        self.write_calls.append({'gsheet_key': gsheet_key, 'sheet_name': sheet_name,
+                                 'ranges': list(range_list), 'values': list(value_list)})
+        worksheet_df = self.fetch(gsheet_key, sheet_name).astype(object)
+        for cell_range, values in zip(range_list, value_list):
+            first_cell = re.match(r'([A-Z]+)(\d+)', cell_range)
+            first_col = 0
+            for letter in first_cell.group(1):
+                first_col = first_col * 26 + ord(letter) - 64
+            # Sheet row 1 is the header, so sheet row 2 is DataFrame row 0
+            first_row = int(first_cell.group(2)) - 2
+            for r, row_values in enumerate(values):
+                for c, value in enumerate(row_values):
+                    worksheet_df.iat[first_row + r, first_col - 1 + c] = value
+        worksheet_df.to_csv(self.worksheet_path(gsheet_key, sheet_name), index=False)
+
+###############################################################################
+#
+# On-Disk Snapshot Cache
+#
+###############################################################################
+
+def snapshot_paths(cache_dir, gsheet_key, sheet_name):
+    """
+    Returns the manifest path and the snapshot base path (without extension) of a worksheet.
+    """
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', f'{gsheet_key}__{sheet_name}')
+    return os.path.join(cache_dir, f'{safe_name}.json'), os.path.join(cache_dir, safe_name)
+
+def write_frame(df, base_path, compress=False):
+    """
+    Writes a DataFrame as Parquet, falling back to a pickle when pyarrow is not installed
+    or the columns mix types Parquet cannot store (e.g. '' in numeric columns). Parquet
+    files are always compressed, compress gzips the pickle fallback as well.
+
+    Returns:
+    - frame_format: str
+        'parquet', 'pickle' or 'pickle-gzip', needed by read_frame.
+    """
+    try:
+        df.to_parquet(f'{base_path}.parquet')
+        return 'parquet'
+    except Exception as error:
+        # No pyarrow installed, or mixed-type columns Parquet cannot store
+        print(f'Parquet snapshot not possible ({type(error).__name__}), using pickle')
+    if compress:
+        with gzip.open(f'{base_path}.pkl.gz', 'wb', compresslevel=6) as pickle_file:
+            pickle.dump(df, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+        return 'pickle-gzip'
+    with open(f'{base_path}.pkl', 'wb') as pickle_file:
+        pickle.dump(df, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return 'pickle'
+
+def read_frame(base_path, frame_format):
+    if frame_format == 'parquet':
+        return pd.read_parquet(f'{base_path}.parquet')
+    if frame_format == 'pickle-gzip':
+        with gzip.open(f'{base_path}.pkl.gz', 'rb') as pickle_file:
+            return pickle.load(pickle_file)
+    with open(f'{base_path}.pkl', 'rb') as pickle_file:
+        return pickle.load(pickle_file)
+
+def read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as manifest_file:
+        return json.load(manifest_file)
+
+def load_worksheet_cached(backend, gsheet_key, sheet_name, cache_dir, force_refresh=False):
+    """
+    Returns a worksheet as a DataFrame, downloading it only when the remote revision differs
+    from the snapshot saved in cache_dir. When the backend cannot be reached the last
+    snapshot is returned instead.
+
+    Parameters:
+    - backend: PygsheetsBackend or LocalFileBackend
+        The source of the worksheet.
+    - gsheet_key: str
+        The unique key of the Google Spreadsheet.
+    - sheet_name: str
+        The name of the sheet to load data from.
+    - cache_dir: str
+        The directory holding the snapshots and their manifests.
+    - force_refresh: bool
+        Always download the worksheet and replace the snapshot.
+
+    Returns:
+    - loaded_df: pandas DataFrame
+        The DataFrame containing the data from the specified sheet.
+    - snapshot_info: dict
+        The snapshot manifest plus 'source': 'remote', 'snapshot' or 'offline-snapshot'.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path, base_path = snapshot_paths(cache_dir, gsheet_key, sheet_name)
+    manifest = read_manifest(manifest_path)
+
+    try:
+        remote_revision = backend.revision(gsheet_key, sheet_name)
+        if not force_refresh and manifest is not None and manifest['revision'] == remote_revision:
+            print(f'SNAPSHOT UP TO DATE: {sheet_name} revision {remote_revision}')
+            loaded_df = read_frame(base_path, manifest['format'])
+            return loaded_df, dict(manifest, source='snapshot')
+        loaded_df = backend.fetch(gsheet_key, sheet_name)
+    except Exception as error:
+        if manifest is None:
+            raise
+        print(f'Could not reach {sheet_name} ({type(error).__name__}: {error})\nUsing snapshot saved {manifest["saved_at"]}')
+        loaded_df = read_frame(base_path, manifest['format'])
+        return loaded_df, dict(manifest, source='offline-snapshot')
+
+    manifest = {'gsheet_key': gsheet_key,
+                'sheet_name': sheet_name,
+                'revision': remote_revision,
+                'format': write_frame(loaded_df, base_path),
+                'rows': len(loaded_df),
+                'saved_at': datetime.now().strftime('%Y%m%d-%H%M%S')}
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return loaded_df, dict(manifest, source='remote')
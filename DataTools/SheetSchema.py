@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import warnings
+import pandas as pd
+
+###############################################################################
+#
+# Declared Sheet Schema and Load-Time dtype Coercion
+#
+###############################################################################
+
+# Compound concentration columns ('ppm' / 'mg_g' in the name) are stored as float32 with NaN blanks
+compound_dtype = 'float32'
+
+# Experimental parameters used in the mg/g conversion
+number_col_list = ['Sample_Weight_(g)', 'Sonication_Solvent_Volume', 'Processed_Amount', 'Extract_Dilution_Factor']
+
+# Repeated labels stored as categoricals
+category_col_list = ['Sample_ID', 'Report_Type']
+
+# Dates parsed to datetime64; Generation_Date is only printed on the reports and keeps the text of the sheet
+date_col_list = ['Date_Processed']
+
+def sheet_schema(df):
+    """
+    Returns the declared dtype of every column of the sheet that has one.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame loaded from the Google Sheet.
+
+    Returns:
+    - schema_dict: dict
+        {column: 'float32' | 'float64' | 'category' | 'datetime64[ns]'}, untyped
+        text columns are left out and stay as loaded.
+    """
+    schema_dict = {}
+    for col in df.columns:
+        if 'ppm' in col or 'mg_g' in col:
+            schema_dict[col] = compound_dtype
+        elif col in number_col_list:
+            schema_dict[col] = 'float64'
+        elif col in category_col_list:
+            schema_dict[col] = 'category'
+        elif col in date_col_list:
+            schema_dict[col] = 'datetime64[ns]'
+    return schema_dict
+
+def parse_dates(values):
+    # format='mixed' (pandas >= 2.0) parses every cell on its own instead of inferring one format
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            return pd.to_datetime(values, errors='coerce', format='mixed')
+    except (TypeError, ValueError):
+        return pd.to_datetime(values, errors='coerce')
+
+def apply_schema(loaded_df, schema_dict=None):
+    """
+    Coerces the sheet columns to their declared dtypes once at load. Blank cells become
+    NaN/NaT; non-blank cells that fail coercion also become NaN/NaT and are listed in the
+    validation report instead of failing later in the per-cell conversions.
+
+    Parameters:
+    - loaded_df: pandas DataFrame
+        The DataFrame loaded from the Google Sheet.
+    - schema_dict: dict, optional
+        {column: dtype}, defaults to sheet_schema(loaded_df).
+
+    Returns:
+    - typed_df: pandas DataFrame
+        A copy of loaded_df with the declared dtypes applied.
+    - validation_df: pandas DataFrame
+        Columns Sample_ID, Column, Value and Expected for every cell that failed coercion.
+    """
+    if schema_dict is None:
+        schema_dict = sheet_schema(loaded_df)
+    typed_df = loaded_df.copy()
+    sample_ids = loaded_df['Sample_ID'].astype(str)
+    failure_list = []
+
+    for col, dtype in schema_dict.items():
+        values = loaded_df[col]
+        blank_mask = values.isna() | (values.astype(str).str.strip() == '')
+        if dtype == 'category':
+            typed_df[col] = values.astype(str).str.strip().astype('category')
+            continue
+        if dtype.startswith('datetime'):
+            typed_values = parse_dates(values.where(~blank_mask))
+        else:
+            typed_values = pd.to_numeric(values.where(~blank_mask), errors='coerce').astype(dtype)
+        failed_mask = ~blank_mask & typed_values.isna()
+        if failed_mask.any():
+            failure_list.append(pd.DataFrame({'Sample_ID': sample_ids[failed_mask].to_numpy(),
+                                              'Column': col,
+                                              'Value': values[failed_mask].astype(str).to_numpy(),
+                                              'Expected': dtype}))
+        typed_df[col] = typed_values
+
+    if len(failure_list) > 0:
+        validation_df = pd.concat(failure_list, ignore_index=True)
+    else:
+        validation_df = pd.DataFrame(columns=['Sample_ID', 'Column', 'Value', 'Expected'])
+    return typed_df, validation_df
+
+def print_schema_report(loaded_df, typed_df, validation_df):
+    """
+    Prints the memory saved by the schema and the cells that failed coercion.
+    """
+    loaded_mb = loaded_df.memory_usage(deep=True).sum() / 1e6
+    typed_mb = typed_df.memory_usage(deep=True).sum() / 1e6
+    print(f'SCHEMA APPLIED: {loaded_mb:.1f} MB -> {typed_mb:.1f} MB')
+    if len(validation_df) > 0:
+        print(f'{len(validation_df)} cells failed type coercion and were set blank:\n{validation_df}')
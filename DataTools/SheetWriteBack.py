@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import pandas as pd
+
+###############################################################################
+#
+# Diff-Only Batched Write-Back to the Google Sheet
+#
+###############################################################################
+
+def column_letter(col_pos):
+    """
+    Returns the A1 column letters of a zero-based column position (0 -> A, 26 -> AA).
+    """
+    letters = ''
+    col_pos += 1
+    while col_pos > 0:
+        col_pos, remainder = divmod(col_pos - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def sheet_value(value):
+    """
+    Converts a DataFrame cell to a JSON-serializable sheet value: blanks become '',
+    NumPy floats keep their shortest repr (float32 5.1 is written as 5.1), dates become text.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, np.floating):
+        return float(str(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%m/%d/%Y')
+    return value
+
+def changed_cell_mask(loaded_df, updated_df, columns):
+    """
+    Returns a boolean matrix (rows x columns), True where updated_df differs from loaded_df.
+    Numbers are compared with a tolerance, blanks and text by value.
+    """
+    old_block = loaded_df[columns]
+    new_block = updated_df[columns]
+    old_numbers = old_block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+    new_numbers = new_block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+    numbers_equal = np.isclose(old_numbers, new_numbers, rtol=0, atol=1e-9)
+    old_text = old_block.fillna('').astype(str).to_numpy()
+    new_text = new_block.fillna('').astype(str).to_numpy()
+    return ~(numbers_equal | (old_text == new_text))
+
+def changed_ranges(loaded_df, updated_df, columns=None, header_rows=1):
+    """
+    Diffs updated_df against the loaded sheet and returns the changed cells as the fewest
+    rectangular A1 ranges: contiguous changed rows of a column form a run, and runs covering
+    the same rows in neighbouring columns are merged into one range.
+
+    Parameters:
+    - loaded_df: pandas DataFrame
+        The DataFrame as loaded from the sheet (same rows and columns as updated_df).
+    - updated_df: pandas DataFrame
+        The DataFrame with the computed values.
+    - columns: list, optional
+        The columns to diff, defaults to every column containing 'mg_g'.
+    - header_rows: int
+        Number of sheet rows above the first data row.
+
+    Returns:
+    - range_list: list
+        A1 range strings, e.g. 'R2:T6'.
+    - value_list: list
+        The row-major values of every range.
+    """
+    if columns is None:
+        columns = [col for col in updated_df.columns if 'mg_g' in col]
+    changed_mask = changed_cell_mask(loaded_df, updated_df, columns)
+
+    # Contiguous row runs per column: {(first_row, last_row): [column positions]}
+    run_dict = {}
+    for c, col in enumerate(columns):
+        changed_rows = np.flatnonzero(changed_mask[:, c])
+        if len(changed_rows) == 0:
+            continue
+        run_breaks = np.flatnonzero(np.diff(changed_rows) > 1)
+        run_starts = np.concatenate([[changed_rows[0]], changed_rows[run_breaks + 1]])
+        run_ends = np.concatenate([changed_rows[run_breaks], [changed_rows[-1]]])
+        sheet_col = updated_df.columns.get_loc(col)
+        for run_start, run_end in zip(run_starts, run_ends):
+            run_dict.setdefault((run_start, run_end), []).append(sheet_col)
+
+    range_list = []
+    value_list = []
+    for (run_start, run_end), sheet_col_list in run_dict.items():
+        sheet_col_list = sorted(sheet_col_list)
+        # Merge neighbouring columns sharing the same row run into one rectangle
+        block_starts = [0] + [i for i in range(1, len(sheet_col_list)) if sheet_col_list[i] != sheet_col_list[i-1] + 1]
+        block_ends = block_starts[1:] + [len(sheet_col_list)]
+        for block_start, block_end in zip(block_starts, block_ends):
+            first_col = sheet_col_list[block_start]
+            last_col = sheet_col_list[block_end - 1]
+            values = updated_df.iloc[run_start:run_end + 1, first_col:last_col + 1]
+            range_list.append(f'{column_letter(first_col)}{run_start + header_rows + 1}:'
+                              f'{column_letter(last_col)}{run_end + header_rows + 1}')
+            # Column-wise to_numpy keeps the NumPy scalar types sheet_value relies on
+            col_values = [[sheet_value(value) for value in values.iloc[:, c].to_numpy()] for c in range(values.shape[1])]
+            value_list.append([list(row) for row in zip(*col_values)])
+    return range_list, value_list
+
+def is_rate_limit_error(error):
+    """
+    Returns True for errors worth retrying: HTTP 429 (quota) and 5xx responses.
+    """
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is not None:
+        return int(status) == 429 or int(status) >= 500
+    error_text = str(error)
+    return '429' in error_text or 'RATE_LIMIT_EXCEEDED' in error_text or 'Quota exceeded' in error_text
+
+def write_back_changes(backend, gsheet_key, sheet_name, loaded_df, updated_df, columns=None,
+                       max_ranges_per_call=500, max_retries=5, backoff_seconds=2.0):
+    """
+    Sends only the cells of updated_df that differ from the loaded sheet, batching all
+    changed ranges into as few API calls as possible and retrying with exponential
+    backoff when the Sheets API rate limit is hit.
+
+    Parameters:
+    - backend: SheetCache.PygsheetsBackend or SheetCache.LocalFileBackend
+        The destination of the values.
+    - gsheet_key: str
+        The unique key of the Google Spreadsheet.
+    - sheet_name: str
+        The name of the sheet to update.
+    - loaded_df: pandas DataFrame
+        The DataFrame as loaded from the sheet.
+    - updated_df: pandas DataFrame
+        The DataFrame with the computed values.
+    - columns: list, optional
+        The columns to write, defaults to every column containing 'mg_g'.
+    - max_ranges_per_call: int
+        Upper bound of ranges sent in one batch update.
+    - max_retries: int
+        Number of retries of a rate-limited batch.
+    - backoff_seconds: float
+        The first retry delay, doubled after every retry.
+
+    Returns:
+    - write_summary: dict
+        Number of ranges, cells and API calls sent.
+    """
+    range_list, value_list = changed_ranges(loaded_df, updated_df, columns)
+    cell_count = sum(len(values) * len(values[0]) for values in value_list)
+    call_count = 0
+
+    for batch_start in range(0, len(range_list), max_ranges_per_call):
+        batch_ranges = range_list[batch_start:batch_start + max_ranges_per_call]
+        batch_values = value_list[batch_start:batch_start + max_ranges_per_call]
+        for attempt in range(max_retries + 1):
+            try:
+                backend.write_ranges(gsheet_key, sheet_name, batch_ranges, batch_values)
+                call_count += 1
+                break
+            except Exception as error:
+                if attempt == max_retries or not is_rate_limit_error(error):
+                    raise
+                delay = backoff_seconds * (2 ** attempt)
+                print(f'Rate limited writing {sheet_name}, retrying in {delay:.0f}s')
+                time.sleep(delay)
+
+    print(f'WRITE-BACK: {cell_count} changed cells in {len(range_list)} ranges, {call_count} API calls')
+    return {'ranges': len(range_list), 'cells': cell_count, 'calls': call_count}
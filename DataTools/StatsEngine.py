@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+from DataTools import SampleIndex
+
+###############################################################################
+#
+# One-Pass Replicate Statistics for All Samples
+#
+###############################################################################
+
+def stats_group_keys(df):
+    """
+    Returns the statistics group of every row as parsed by SampleIndex: replicates
+    (HLO1A, HLO1B, ...) are keyed by their parent ID, a sample without replicates is
+    keyed by itself. Combined IDs (containing '-' or ',') and bare parent rows of
+    replicated samples get no key.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame containing the 'Sample_ID' column.
+
+    Returns:
+    - group_keys: pandas Series
+        The group key of every row, NaN for rows that are not part of any group.
+    """
+    return SampleIndex.SampleIndex(df).group_keys
+
+def sample_stats_table(df, group_keys=None, decimals=1):
+    """
+    Computes the mean, standard deviation and replicate count of every mg/g column and the
+    sample information row for all sample groups in one grouped pass.
+
+    Parameters:
+    - df: pandas DataFrame
+        The DataFrame with the mg/g values calculated.
+    - group_keys: pandas Series, optional
+        The group key of every row (aligned with df), defaults to stats_group_keys(df).
+    - decimals: int
+        Number of decimals the mean and standard deviation are rounded to.
+
+    Returns:
+    - stats_df: pandas DataFrame
+        One row per group key with the sample information columns followed by
+        '{compound}_mg_g_MEAN', '{compound}_mg_g_SD' and '{compound}_mg_g_N' columns.
+    """
+    if group_keys is None:
+        group_keys = stats_group_keys(df)
+    grouped_rows = group_keys.notna()
+    df = df[grouped_rows]
+    group_keys = group_keys[grouped_rows].rename('Group_ID')
+
+    info_col_list = list(df.columns[:df.columns.get_loc('Sonication_Solvent_Volume')])
+    mg_g_col_list = [col for col in df.columns if 'mg_g' in col]
+
+    # Sample information is taken from the first replicate of every group
+    info_df = df.loc[~group_keys.duplicated(), info_col_list]
+    info_df.index = group_keys[~group_keys.duplicated()].to_numpy()
+
+    # Mean, SD and n for every compound in one reduction per statistic
+    mg_g_df = df[mg_g_col_list].apply(pd.to_numeric, errors='coerce').astype('float64')
+    grouped_mg_g = mg_g_df.groupby(group_keys, sort=False)
+    mean_df = grouped_mg_g.mean().round(decimals).add_suffix('_MEAN')
+    sd_df = grouped_mg_g.std().round(decimals).add_suffix('_SD')
+    n_df = grouped_mg_g.count().add_suffix('_N')
+
+    stats_df = pd.concat([info_df, mean_df, sd_df, n_df], axis=1)
+    stats_df.index.name = 'Group_ID'
+    return stats_df
+
+def stats_compound_list(stats_df):
+    """
+    Returns the compound names of a statistics table in sheet column order.
+
+    Parameters:
+    - stats_df: pandas DataFrame
+        The table returned by sample_stats_table.
+
+    Returns:
+    - full_compound_list: list
+        The compound names, e.g. 'Psilocybin' for 'Psilocybin_mg_g_MEAN'.
+    """
+    return [col.replace('_mg_g_MEAN', '') for col in stats_df.columns if col.endswith('_mg_g_MEAN')]
+
+def lookup_sample_stats(stats_df, sample_id):
+    """
+    Returns the statistics of one sample group in the same layout as stats_df_generator.
+
+    Parameters:
+    - stats_df: pandas DataFrame
+        The table returned by sample_stats_table.
+    - sample_id: str
+        The group key of the sample (the parent Sample_ID of the replicates).
+
+    Returns:
+    - A tuple containing the sample information row, a list of compound names, a list of
+      mean values, and a list of standard deviation values.
+    """
+    stats_row = stats_df.loc[sample_id]
+    full_compound_list = stats_compound_list(stats_df)
+    info_col_list = list(stats_df.columns[:stats_df.columns.get_loc(f'{full_compound_list[0]}_mg_g_MEAN')])
+    sample_info_df = stats_row[info_col_list]
+    full_mean_data = [stats_row[f'{compound}_mg_g_MEAN'] for compound in full_compound_list]
+    full_sd_data = [stats_row[f'{compound}_mg_g_SD'] for compound in full_compound_list]
+    return (sample_info_df, full_compound_list, full_mean_data, full_sd_data)
+
+###############################################################################
+#
+# Aggregate Rows of Several Groups (Flush Test Means)
+#
+###############################################################################
+
+# Columns always taken from the first replicate, even when they look numeric
+first_value_col_list = ['Sample_ID', 'Sample_Name', 'Generation_Date', 'Date_Processed',
+                        'Lab_Description', 'Homogenized_Description']
+
+def aggregate_group_means(df, group_keys, group_names=None):
+    """
+    Collapses the rows of every group into one aggregate row: numeric columns (blank cells
+    counted as 0) are averaged with one grouped reduction, text and date columns are taken
+    from the first replicate by column name. Any number of groups can be aggregated in one
+    call, e.g. all flushes, per Bin_ID or per Flush_ID.
+
+    Parameters:
+    - df: pandas DataFrame
+        The replicate rows to aggregate.
+    - group_keys: list or pandas Series
+        The group of every row of df, also used as the Sample_ID of the aggregate row.
+    - group_names: dict, optional
+        {group key: Sample_Name} for the aggregate rows, defaults to the first replicate name.
+
+    Returns:
+    - mean_df: pandas DataFrame
+        One row per group (in order of first appearance) with the columns of df.
+    """
+    df = df.reset_index(drop=True)
+    group_keys = pd.Series(list(group_keys), name='Group_ID')
+
+    # Columns typed numeric by SheetSchema are averaged directly (NaN blanks count as 0)
+    typed_col_list = [col for col in df.columns
+                      if col not in first_value_col_list and pd.api.types.is_numeric_dtype(df[col])]
+    untyped_col_list = [col for col in df.columns
+                        if col not in first_value_col_list and col not in typed_col_list
+                        and not pd.api.types.is_datetime64_any_dtype(df[col])
+                        and not isinstance(df[col].dtype, pd.CategoricalDtype)]
+
+    # An untyped column is numeric when it has values and every cell converts once blanks count as 0
+    untyped_df = df[untyped_col_list]
+    blank_df = untyped_df.astype(str).apply(lambda col: col.str.strip()) == ''
+    filled_df = untyped_df.mask(blank_df, 0)
+    converted_df = filled_df.apply(pd.to_numeric, errors='coerce')
+    numeric_col_list = typed_col_list + [col for col in untyped_col_list
+                                         if not blank_df[col].all()
+                                         and converted_df[col].notna().sum() == filled_df[col].notna().sum()]
+    numeric_df = pd.concat([df[typed_col_list].astype('float64').fillna(0), converted_df], axis=1)
+
+    first_rows = ~group_keys.duplicated()
+    mean_df = df[first_rows].astype(object)
+    mean_df.index = group_keys[first_rows].to_numpy()
+    group_means = numeric_df[numeric_col_list].groupby(group_keys, sort=False).mean()
+    for col in numeric_col_list:
+        mean_df[col] = group_means[col]
+
+    mean_df['Sample_ID'] = mean_df.index
+    if group_names is not None:
+        mean_df['Sample_Name'] = [group_names.get(key, name) for key, name in zip(mean_df.index, mean_df['Sample_Name'])]
+    return mean_df.reset_index(drop=True)
@@ -4,12 +4,46 @@ Created on Mon Mar 13 13:02:58 2023
 
 @author: theda
 """
+import time
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
 from catboost import CatBoostRegressor
 import pandas as pd
+from MLTools import ModelCache
 
-def cat_boost_regressor(ft_df):
+# Training budget of the flush pie models, set by configure_training
+training_settings = {'iterations': 1000,
+                     'early_stopping_rounds': 50,
+                     'time_budget_seconds': 0}
+
+def configure_training(iterations=1000, early_stopping_rounds=50, time_budget_seconds=0):
+    """
+    Sets the training budget of cat_boost_regressor in this process: the upper bound of
+    boosting iterations, the iterations without improvement of the held-out RMSE after
+    which training stops (0 disables early stopping) and the wall time after which
+    training stops (0 for no limit).
+    """
+    training_settings.update(iterations=iterations, early_stopping_rounds=early_stopping_rounds,
+                             time_budget_seconds=time_budget_seconds)
+
+class TrainingTimeBudget:
+    """
+    CatBoost callback stopping the training once time_budget_seconds have passed.
+    """
+    def __init__(self, time_budget_seconds):
+        self.deadline = time.monotonic() + time_budget_seconds
+
+    def after_iteration(self, info):
+        return time.monotonic() < self.deadline
+
+def print_training_info(training_info, label='CATBOOST'):
+    # The RMSE is measured on the held-out half by the model fitted on the other half, not by the refit model
+    half_data_rmse = training_info['half_data_validation_rmse']
+    rmse_text = f'{half_data_rmse:.3f}' if half_data_rmse is not None else 'n/a'
+    print(f"{label}: {training_info['iterations']} iterations, half-data model validation RMSE {rmse_text}, "
+          f"{training_info['seconds']:.1f}s")
+
+def cat_boost_regressor(ft_df, thread_count=None, return_info=False):
     # CatBoostRegressor Training/Testing Process
     # Prepare data for training
     X = ft_df.drop('Fruit_PCB+PCN_mg', axis=1)
@@ -18,9 +52,47 @@ def cat_boost_regressor(ft_df):
     # Split the data into training and testing datasets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.5, random_state=42)
     
-    # Train a CatBoostRegressor model
-    model = CatBoostRegressor(verbose=0)
-    model.fit(X, y)
+    # Models fitted on the same data and parameters are read from the model cache
+    model_cache = ModelCache.model_cache
+    if thread_count is None:
+        thread_count = model_cache.thread_count if model_cache is not None else -1
+    model_params = {'verbose': 0, 'thread_count': thread_count, 'allow_writing_files': False,
+                    'iterations': training_settings['iterations']}
+    early_stopping_rounds = training_settings['early_stopping_rounds']
+    time_budget_seconds = training_settings['time_budget_seconds']
+    if model_cache is not None:
+        cache_key = model_cache.model_key(X, y, dict(model_params, early_stopping_rounds=early_stopping_rounds,
+                                                     time_budget_seconds=time_budget_seconds))
+        cached = model_cache.load_importances(cache_key)
+        if cached is not None:
+            df_importances, training_info = cached
+            print_training_info(training_info, 'CATBOOST (cached)')
+            print(df_importances.head(10))
+            return (df_importances, training_info) if return_info else df_importances
+    
+    start_time = time.perf_counter()
+    # One budget shared by the early-stopped fit and the refit, the refit gets what is left of it
+    callbacks = [TrainingTimeBudget(time_budget_seconds)] if time_budget_seconds > 0 else None
+    half_data_rmse = None
+    if early_stopping_rounds > 0 and len(X_test) >= 2:
+        # Stop once the RMSE of the held-out half stops improving
+        model = CatBoostRegressor(**model_params)
+        model.fit(X_train, y_train, eval_set=(X_test, y_test), early_stopping_rounds=early_stopping_rounds,
+                  use_best_model=True, callbacks=callbacks)
+        iterations_used = model.get_best_iteration() + 1
+        half_data_rmse = model.get_best_score()['validation']['RMSE']
+        # Refit on every row with the iterations found on the held-out half, like the importances were before
+        model = CatBoostRegressor(**dict(model_params, iterations=iterations_used))
+        model.fit(X, y, callbacks=callbacks)
+        iterations_used = model.tree_count_
+    else:
+        # Train a CatBoostRegressor model
+        model = CatBoostRegressor(**model_params)
+        model.fit(X, y, callbacks=callbacks)
+        iterations_used = model.tree_count_
+    training_info = {'iterations': iterations_used,
+                     'half_data_validation_rmse': half_data_rmse,
+                     'seconds': round(time.perf_counter() - start_time, 3)}
     
     # Get the feature importance scores
     importances = model.feature_importances_
@@ -31,7 +103,10 @@ def cat_boost_regressor(ft_df):
     # Create a pandas dataframe to store the feature importance scores
     df_importances = pd.DataFrame({'Analysis Feature': features, '▲-Contribution %': [round(importance, 2) for importance in importances]})
     df_importances = df_importances.sort_values(by='▲-Contribution %', ascending=False)
+    if model_cache is not None:
+        model_cache.store(cache_key, model, df_importances, training_info)
     
     # Print the top 10 features with the highest importance scores
+    print_training_info(training_info)
     print(df_importances.head(10))
-    return(df_importances)
\ No newline at end of file
+    return (df_importances, training_info) if return_info else df_importances
@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import os
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
+from sklearn.base import clone
+from sklearn.model_selection import KFold
+from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.linear_model import LinearRegression, Ridge, Lasso, ElasticNet, BayesianRidge
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
@@ -9,69 +18,127 @@ from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
 from catboost import CatBoostRegressor
 
-import pandas as pd
+###############################################################################
+#
+# Cross-Validated Comparison of Regression Models on the Flush Test Data
+#
+###############################################################################
+
+# Categorical Flush Test columns one-hot encoded before fitting
+one_hot_col_list = ['Position', 'Bin_ID', 'Flush_ID']
+
+def candidate_models(model_threads=1):
+    """
+    Returns {name: estimator} of every regression model to compare. Models with their
+    own thread pools are capped at model_threads, so the parallel folds do not
+    oversubscribe the cores.
+    """
+    return {'LinearRegression': LinearRegression(),
+            'Ridge': Ridge(),
+            'Lasso': Lasso(),
+            'ElasticNet': ElasticNet(),
+            'DecisionTree': DecisionTreeRegressor(random_state=42),
+            'RandomForest': RandomForestRegressor(random_state=42, n_jobs=model_threads),
+            'GradientBoosting': GradientBoostingRegressor(random_state=42),
+            'KNeighbors': KNeighborsRegressor(n_jobs=model_threads),
+            'SVR (linear)': SVR(kernel='linear'),
+            'SVR (poly)': SVR(kernel='poly'),
+            'SVR (rbf)': SVR(kernel='rbf'),
+            'BayesianRidge': BayesianRidge(),
+            'XGBoost': XGBRegressor(random_state=42, n_jobs=model_threads),
+            'LightGBM': LGBMRegressor(random_state=42, n_jobs=model_threads, verbose=-1),
+            'CatBoost': CatBoostRegressor(verbose=0, random_seed=42, thread_count=model_threads, allow_writing_files=False)}
+
+def feature_matrix(ft_df, target_col='Fruit_PCB+PCN_mg'):
+    """
+    Returns the features X (one-hot encoded Flush Test columns, numeric columns as float)
+    and the target y of a Flush Test DataFrame.
+    """
+    X = ft_df.drop(columns=[col for col in [target_col, 'Sample_ID'] if col in ft_df.columns])
+    X = pd.get_dummies(X, columns=[col for col in one_hot_col_list if col in X.columns])
+    X = X.apply(pd.to_numeric, errors='coerce').astype('float64')
+    y = pd.to_numeric(ft_df[target_col], errors='coerce').astype('float64')
+    return X, y
+
+def evaluate_fold(model_name, model, X, y, train_index, test_index, model_threads=1):
+    """
+    Fits a copy of model on the training rows of one fold and scores it on both parts.
+
+    Returns:
+    - fold_dict: dict
+        The model name, train/test MSE and R-squared, and the fit and predict seconds.
+    """
+    # BLAS/OpenMP pools of numpy and scikit-learn are capped like the model threads
+    with threadpool_limits(limits=model_threads):
+        fold_model = clone(model)
+        start_time = time.perf_counter()
+        fold_model.fit(X[train_index], y[train_index])
+        fit_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        y_test_pred = fold_model.predict(X[test_index])
+        predict_seconds = time.perf_counter() - start_time
+        y_train_pred = fold_model.predict(X[train_index])
+    return {'Model': model_name,
+            'Train MSE': mean_squared_error(y[train_index], y_train_pred),
+            'Test MSE': mean_squared_error(y[test_index], y_test_pred),
+            'Train R-squared': r2_score(y[train_index], y_train_pred),
+            'Test R-squared': r2_score(y[test_index], y_test_pred),
+            'Fit Seconds': fit_seconds,
+            'Predict Seconds': predict_seconds}
+
+def feature_model_selection(ft_df, target_col='Fruit_PCB+PCN_mg', cv_folds=5, workers=None, model_threads=1, models=None):
+    """
+    Compares regression models on the Flush Test data with k-fold cross-validation. Every
+    (model, fold) pair is fitted as its own job on a pool of worker processes.
+
+    Parameters:
+    - ft_df: pandas DataFrame
+        The Flush Test rows: the target column, the Position/Bin_ID/Flush_ID columns and
+        numeric feature columns.
+    - target_col: str
+        The column to predict.
+    - cv_folds: int
+        Number of cross-validation folds, reduced so every test fold keeps two rows.
+    - workers: int, optional
+        Number of worker processes, defaults to the number of CPUs.
+    - model_threads: int
+        Threads each model may use; workers * model_threads should not exceed the cores.
+    - models: dict, optional
+        {name: estimator} to compare, defaults to candidate_models(model_threads).
+
+    Returns:
+    - model_stats_df: pandas DataFrame
+        One row per model ranked by the mean test MSE over the folds, with the mean
+        train/test MSE and R-squared, the test MSE standard deviation and the total
+        fit and predict seconds.
+    """
+    X, y = feature_matrix(ft_df, target_col)
+    complete_rows = X.notna().all(axis=1) & y.notna()
+    X = X[complete_rows].to_numpy()
+    y = y[complete_rows].to_numpy()
+    cv_folds = min(cv_folds, len(y) // 2)
+    if cv_folds < 2:
+        raise ValueError(f'{len(y)} complete rows are too few for cross-validation')
+    if models is None:
+        models = candidate_models(model_threads)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    fold_list = list(KFold(n_splits=cv_folds, shuffle=True, random_state=42).split(X))
+    start_time = time.perf_counter()
+    fold_dict_list = Parallel(n_jobs=min(workers, len(models) * len(fold_list)))(
+        delayed(evaluate_fold)(model_name, model, X, y, train_index, test_index, model_threads)
+        for model_name, model in models.items() for train_index, test_index in fold_list)
+    elapsed = time.perf_counter() - start_time
+
+    fold_df = pd.DataFrame(fold_dict_list)
+    grouped_folds = fold_df.groupby('Model', sort=False)
+    model_stats_df = grouped_folds[['Train MSE', 'Test MSE', 'Train R-squared', 'Test R-squared']].mean()
+    model_stats_df['Test MSE SD'] = grouped_folds['Test MSE'].std()
+    model_stats_df[['Fit Seconds', 'Predict Seconds']] = grouped_folds[['Fit Seconds', 'Predict Seconds']].sum()
+    model_stats_df = model_stats_df.sort_values('Test MSE').reset_index()
+    model_stats_df.insert(0, 'Rank', np.arange(1, len(model_stats_df) + 1))
 
-def feature_model_selection(ft_df):
-    # Define a list of regression models to test
-    models = [
-        LinearRegression(),
-        Ridge(),
-        Lasso(),
-        ElasticNet(),
-        DecisionTreeRegressor(),
-        RandomForestRegressor(),
-        GradientBoostingRegressor(),
-        KNeighborsRegressor(),
-        SVR(kernel='linear'),
-        SVR(kernel='poly'),
-        SVR(kernel='rbf'),
-        BayesianRidge(),
-        XGBRegressor(),
-        LGBMRegressor(),
-        CatBoostRegressor(verbose=0)]
-    
-    # Define dictionaries to store the MSE and R-squared scores for each model
-    mse_scores = {}
-    r2_scores = {}
-    
-    # Apply one-hot encoding to the 'Sample_ID' column
-    ft_df = pd.get_dummies(ft_df, columns=['Bin_ID','Flush_ID'])
-    
-    # Train and test each model, and store the scores in the dictionaries
-    for model in models:
-        model.fit(X_train, y_train)
-        y_train_pred = model.predict(X_train)
-        y_test_pred = model.predict(X_test)
-        mse_scores[str(model)] = [mean_squared_error(y_train, y_train_pred), mean_squared_error(y_test, y_test_pred)]
-        r2_scores[str(model)] = [r2_score(y_train, y_train_pred), r2_score(y_test, y_test_pred)]
-    
-    # Initialize lists to store the model names and scores
-    models = []
-    train_mse_scores = []
-    test_mse_scores = []
-    train_r2_scores = []
-    test_r2_scores = []
-    
-    # Store the model names and scores in the lists
-    for model, mse in mse_scores.items():
-        models.append(model)
-        train_mse_scores.append(mse[0])
-        test_mse_scores.append(mse[1])
-    
-    for model, r2 in r2_scores.items():
-        train_r2_scores.append(r2[0])
-        test_r2_scores.append(r2[1])
-    
-    # Create the dataframe
-    model_stats_df = pd.DataFrame({
-        'Model': models,
-        'Train MSE': train_mse_scores,
-        'Test MSE': test_mse_scores,
-        'Train R-squared': train_r2_scores,
-        'Test R-squared': test_r2_scores
-    })
-    
-    # Print the dataframe
+    print(f'MODEL SELECTION: {len(models)} models x {cv_folds} folds on {len(y)} rows in {elapsed:.1f}s')
     print(model_stats_df)
-    
-#feature_model_selection(ft_df)
\ No newline at end of file
+    return model_stats_df
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+import pandas as pd
+from DataTools import ContentKeys
+
+# Bumped when the training or the stored files change, invalidates every cached model
+model_cache_version = 2
+
+###############################################################################
+#
+# On-Disk Cache of Fitted Models and Their Feature Importances
+#
+###############################################################################
+
+class ModelCache:
+    """
+    Stores every fitted model as '{cache_dir}/{key}.cbm' and its feature importances as
+    '{cache_dir}/{key}.json', the key being a hash of the encoded feature matrix, the
+    target and the hyperparameters. A rerun on unchanged Flush Test data reads the
+    importances instead of training the model again. Files are written atomically,
+    the counters are guarded by a lock.
+
+    Parameters:
+    - cache_dir: str
+        The directory holding the models.
+    - thread_count: int
+        Threads every model may train with, -1 uses every core.
+    """
+    def __init__(self, cache_dir, thread_count=-1):
+        self.cache_dir = cache_dir
+        self.thread_count = thread_count
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def model_key(X, y, model_params):
+        """
+        Returns the key of a model trained on X and y with model_params. Settings that do
+        not change the fitted model (thread count, verbosity) are left out.
+        """
+        key_params = {param: value for param, value in model_params.items()
+                      if param not in ['thread_count', 'verbose', 'allow_writing_files']}
+        return ContentKeys.key_for('model', model_cache_version,
+                                   [str(col) for col in X.columns], [str(dtype) for dtype in X.dtypes],
+                                   pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes(),
+                                   pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes(),
+                                   key_params)
+
+    def model_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.cbm')
+
+    def load_importances(self, key):
+        """
+        Returns the cached importance DataFrame and training info of a model, or None
+        when the model is not cached.
+        """
+        importance_path = os.path.join(self.cache_dir, f'{key}.json')
+        try:
+            with open(importance_path, 'r') as importance_file:
+                cached = json.load(importance_file)
+        except (FileNotFoundError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return pd.DataFrame(cached['importances']), cached['info']
+
+    def load_model(self, key, model):
+        """
+        Loads the cached fit into model (e.g. an empty CatBoostRegressor) and returns it,
+        or returns None when the model is not cached.
+        """
+        if not os.path.exists(self.model_path(key)):
+            return None
+        return model.load_model(self.model_path(key))
+
+    def store(self, key, model, importance_df, info=None):
+        """
+        Saves a fitted model with its importance DataFrame and training info.
+        """
+        temp_path = f'{self.model_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        model.save_model(temp_path)
+        os.replace(temp_path, self.model_path(key))
+        importance_path = os.path.join(self.cache_dir, f'{key}.json')
+        with open(f'{temp_path}.json', 'w') as importance_file:
+            json.dump({'importances': importance_df.to_dict(orient='list'), 'info': info or {}}, importance_file, default=str)
+        os.replace(f'{temp_path}.json', importance_path)
+
+    def print_stats(self, label='MODEL CACHE'):
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups > 0 else 0
+        model_count = sum(1 for entry in os.scandir(self.cache_dir) if entry.name.endswith('.cbm'))
+        print(f'{label}: {self.hits} hits, {self.misses} trained ({hit_rate:.0f}% hit rate), {model_count} models cached')
+
+# The ModelCache consulted before training a model, None trains every model
+model_cache = None
+
+def configure_cache(cache_dir, thread_count=-1):
+    """
+    Sets the ModelCache of this process (None disables caching) and returns it.
+    """
+    global model_cache
+    if cache_dir is None:
+        model_cache = None
+    elif model_cache is None or model_cache.cache_dir != cache_dir:
+        model_cache = ModelCache(cache_dir, thread_count)
+    if model_cache is not None:
+        model_cache.thread_count = thread_count
+    return model_cache
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+###############################################################################
+#
+# Process-Wide Cache of Decoded Template and Photo Images for the PDF Reports
+#
+###############################################################################
+
+# Template images placed on every (Cup) report, decoded when the report resources are created
+template_image_list = ['HL_transparent.png', 'default_image.png', 'tryptomicssupport.png', 'HCFall22-banner.png',
+                       'HCFall22-Micro.png', 'HCFall22-Rec.png', 'HCFall22-Therapy.png', 'HCFall22-Spirit.png',
+                       'HCFall22-Unique.png', 'Micro.png', 'Rec.png', 'Therapy.png', 'Spirit.png', 'Unique.png']
+
+def image_bytes(img):
+    # Size of the decoded pixels, one byte per band for the 8-bit modes of the templates and photos
+    return img.width * img.height * len(img.getbands())
+
+class ImageAssetCache:
+    """
+    Decodes every image once per process and hands FPDF the loaded PIL image, so the
+    template images and photos are not read and decoded again for every page and report.
+    fpdf2 keys embedded PIL images by their content, so an image placed on several
+    pages of a document is stored once. Entries are keyed by path and modification time,
+    the least recently used are dropped beyond max_images or max_bytes of decoded pixels;
+    an image larger than max_bytes on its own is decoded for every use. Threads can share
+    one cache.
+
+    Parameters:
+    - max_images: int
+        Upper bound of decoded images kept in memory.
+    - max_bytes: int
+        Upper bound of the decoded pixel data kept in memory, full resolution photos
+        (photo_dpi = 0) take tens of MB each.
+    """
+    def __init__(self, max_images=64, max_bytes=256 * 1024 * 1024):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        self.image_dict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, cache_key, load_function):
+        with self.lock:
+            if cache_key in self.image_dict:
+                self.image_dict.move_to_end(cache_key)
+                self.hits += 1
+                return self.image_dict[cache_key][0]
+        # Decode outside the lock, two threads may decode the same image once each
+        img = load_function()
+        img_bytes = image_bytes(img)
+        with self.lock:
+            self.misses += 1
+            if img_bytes > self.max_bytes or cache_key in self.image_dict:
+                return img
+            self.image_dict[cache_key] = (img, img_bytes)
+            self.cached_bytes += img_bytes
+            while len(self.image_dict) > self.max_images or self.cached_bytes > self.max_bytes:
+                self.cached_bytes -= self.image_dict.popitem(last=False)[1][1]
+        return img
+
+    def image(self, image_path):
+        """
+        Returns the decoded image of image_path.
+        """
+        def load_image():
+            img = Image.open(image_path)
+            # Decode now, a lazily loaded image would be decoded by every reader
+            img.load()
+            return img
+        return self.cached((image_path, os.path.getmtime(image_path)), load_image)
+
+    def transparent(self, image_path, alpha=0.2):
+        """
+        Returns image_path blended over a transparent white background, alpha being the
+        weight of the image (0.2 keeps 20% of it), used to place text over the photo.
+        """
+        def load_transparent():
+            img = self.image(image_path).convert('RGBA')
+            new_img = Image.new('RGBA', img.size, (255, 255, 255, 0))
+            return Image.blend(new_img, img, alpha=alpha)
+        return self.cached((image_path, os.path.getmtime(image_path), 'transparent', alpha), load_transparent)
+
+    def preload(self, image_dir, image_list=template_image_list):
+        """
+        Decodes the images of image_list found in image_dir.
+        """
+        for image_name in image_list:
+            image_path = f'{image_dir}/{image_name}'
+            if os.path.exists(image_path):
+                self.image(image_path)
+
+    def print_stats(self, label='IMAGE CACHE'):
+        print(f'{label}: {self.hits} reused, {self.misses} decoded, {len(self.image_dict)} in memory '
+              f'({self.cached_bytes / (1024 * 1024):.0f} MB)')
+
+# Shared by every ReportResources of the process
+image_asset_cache = ImageAssetCache()
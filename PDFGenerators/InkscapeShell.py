@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import threading
+import subprocess
+
+###############################################################################
+#
+# Long-Lived Inkscape Shell Session for SVG to PNG Conversions
+#
+###############################################################################
+
+class InkscapeConversionError(Exception):
+    pass
+
+class InkscapeShell:
+    """
+    Keeps one 'inkscape --shell' process (Inkscape >= 1.0) and sends it the export
+    actions of every conversion, instead of launching Inkscape once per SVG.
+
+    A conversion is finished when its PNG exists and its size stopped changing;
+    conversions that do not finish within timeout_seconds raise InkscapeConversionError.
+    Threads can share one session: the process is started, written to and closed under
+    a lock, and the waits poll the process handle their commands were sent to.
+
+    Parameters:
+    - inkscape_path: str
+        The Inkscape executable.
+    - timeout_seconds: float
+        Upper bound of the time one conversion may take.
+    """
+    def __init__(self, inkscape_path='inkscape', timeout_seconds=60):
+        self.inkscape_path = inkscape_path
+        self.timeout_seconds = timeout_seconds
+        self.process = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        if shutil.which(self.inkscape_path) is None:
+            raise InkscapeConversionError(f'Inkscape not found: {self.inkscape_path}')
+        self.process = subprocess.Popen([self.inkscape_path, '--shell'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True)
+
+    def send(self, command):
+        """
+        Writes command to the shell session and returns the process it was sent to.
+        """
+        with self.lock:
+            self.start()
+            process = self.process
+            try:
+                process.stdin.write(f'{command}\n')
+                process.stdin.flush()
+            except (BrokenPipeError, OSError) as error:
+                raise InkscapeConversionError(f'Inkscape shell exited ({error})')
+        return process
+
+    def wait_for_outputs(self, png_list, process=None):
+        """
+        Waits until every PNG of png_list is written, returns the PNGs that were not.
+        Stops early when process (by default the current session) exits.
+        """
+        if process is None:
+            with self.lock:
+                process = self.process
+        pending = {png_path: None for png_path in png_list}
+        deadline = time.monotonic() + self.timeout_seconds * max(1, len(png_list))
+        while len(pending) > 0 and time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                break
+            for png_path, last_size in list(pending.items()):
+                if os.path.exists(png_path):
+                    png_size = os.path.getsize(png_path)
+                    # Done when the file is non-empty and did not grow since the last poll
+                    if png_size > 0 and png_size == last_size:
+                        del pending[png_path]
+                    else:
+                        pending[png_path] = png_size
+            time.sleep(0.05)
+        return list(pending)
+
+    def convert_batch(self, conversion_list):
+        """
+        Converts every (svg_path, png_path) pair through the shell session.
+
+        Returns:
+        - failure_dict: dict
+            {svg_path: reason} of the conversions that did not produce a PNG.
+        """
+        failure_dict = {}
+        png_dict = {}
+        process = None
+        for svg_path, png_path in conversion_list:
+            if not os.path.exists(svg_path):
+                failure_dict[svg_path] = 'SVG not found'
+                continue
+            if os.path.exists(png_path):
+                os.remove(png_path)
+            try:
+                # The shell resolves paths against its own working directory, send absolute ones
+                process = self.send(f'file-open:{os.path.abspath(svg_path)}; export-type:png; '
+                          f'export-filename:{os.path.abspath(png_path)}; export-do; file-close')
+            except InkscapeConversionError as error:
+                failure_dict[svg_path] = str(error)
+                continue
+            png_dict[png_path] = svg_path
+        for png_path in self.wait_for_outputs(list(png_dict), process):
+            exit_code = process.poll()
+            failure_dict[png_dict[png_path]] = (f'Inkscape exited with code {exit_code}' if exit_code is not None
+                                                else f'no PNG after {self.timeout_seconds}s')
+        return failure_dict
+
+    def convert(self, svg_path, png_path):
+        failure_dict = self.convert_batch([(svg_path, png_path)])
+        if svg_path in failure_dict:
+            raise InkscapeConversionError(failure_dict[svg_path])
+
+    def close(self):
+        with self.lock:
+            if self.process is None:
+                return
+            if self.process.poll() is None:
+                try:
+                    self.process.stdin.write('quit\n')
+                    self.process.stdin.close()
+                    self.process.wait(timeout=self.timeout_seconds)
+                except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+                    self.process.kill()
+            self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
@@ -8,275 +8,800 @@ Created on Sat Mar  4 11:30:57 2023
 # Load Necessary Libraries to import images and organize PDF Reports
 ###############################################################################
 import os
+import io
+import re
+import sys
+import time
+import tempfile
+import threading
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from fpdf import FPDF
+from fpdf.svg import SVGObject
 import cairosvg
 import pandas as pd
 import configparser
-from PIL import Image
+from DataTools import IncrementalTracker, SampleSelection, ResultsStore
+from SVGGenerators import RenderCache
+from PDFGenerators import InkscapeShell, ImageAssets, PhotoDerivatives, ReportPlanner
 
-global sample_id
-global sample_name
-global sample_dir
-global section_title_dict
-global profile_images_dir
+# Used when neither --config nor the HL_CONFIG environment variable is given: config.txt in the repository folder
+default_config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.txt')
 
-###############################################################################
-# Function to add PNG to a PDF
-###############################################################################
-def add_png_to_pdf(image_name, x_pos, y_pos, image_w, image_h):
-    jpg_name = image_name.replace('png','jpg')
-    if not os.path.exists(image_name): 
-        print(f"File not found: {image_name}\nUsing Default Image")
-        pdf.image(f'{template_dir}/default_image.png', x_pos, y_pos, image_w, image_h) 
-    elif '-M' in image_name:
-        img = Image.open(image_name).convert('RGBA')
-        new_img = Image.new('RGBA', img.size (255,255, 255, 0))
-        # Blend the original image with the new transparent image using alpha=0.2 (20% transparency)
-        transp_img = Image.blend(new_img, img, alpha=0.2)
-        transp_img.save(f'{sample_id}-transp-M.png')
-        pdf.image(f'{sample_id}-transp-M.png', x_pos, y_pos, image_w, image_h) 
-    elif os.path.exists(image_name):   
-        pdf.image(image_name, x_pos, y_pos, image_w, image_h)
-    elif os.path.exists(jpg_name):   
-        pdf.image(jpg_name, x_pos, y_pos, image_w, image_h) 
-
-    print(f"{image_name} Added")
-###############################################################################
+section_title_dict = {'Flush':   ['FLUSH TEST AVERAGE\nCHEMICAL PROFILE &\nDOSE REPORT',
+                                  'FLUSH TEST PROFILES\nPCB+PCN DISTRIBUTION &\nHEAT MAP' ,
+                                  'FLUSH TEST\nMACHINE LEARNING STATISTICAL ANLAYSIS\nOF PCB+PCN POTENCY VARIANCE'],
+                      'Profile': ['CHEMICAL\nPROFILE &\nDOSE REPORT'],
+                      'Cup':     ['HYPHAE CUP\nCHEMICAL PROFILE &\nDOSE REPORT']}
+
+# GENERATE CHAMP DICTS ########################## UPDATE FOR EVERY CUP
+champ_dict = {'Micro' : 'CUP265',
+              'Rec/Out': 'CUP282',
+              'Therapy' : 'CUP314',
+              'Spiritual' : 'CUP319',
+              'Profile' : 'CUP311'}
+champ_logo_dict = {'Micro' : 'HCFall22-Micro.png',
+                   'Rec/Out': 'HCFall22-Rec.png',
+                   'Therapy' : 'HCFall22-Therapy.png',
+                   'Spiritual' : 'HCFall22-Spirit.png',
+                   'Profile' : 'HCFall22-Unique.png'}
+
+def page_layout(report_type, s, sample_id, template_dir, profile_images_dir, flush_images_dir):
+    """
+    Returns the [graphic_type, pdf_x, pdf_y, input_w, input_h] placements of section s of a
+    report, graphic types naming the '{sample_id}-{graphic_type}.svg' files of the sample
+    folder, template SVGs or photos.
+    """
+    if report_type in ['Cup', 'Profile'] or s == 0:
+        return [['sample_table_client', 10, 40, 186, 10],
+                ['sample_table_cultivar', 10, 50, 186, 10],
+                ['sample_table_gen_date', 10, 60, 186, 10],
+                ['sample_table_species', 10, 70, 186, 10],
+                ['description_table_top', 10, 80, 186, 10],
+                ['description_table_bot', 10, 90, 186, 61],
+                [f'{profile_images_dir}/{sample_id}-W.png', 11, 91, 56, 56],
+                [f'{profile_images_dir}/{sample_id}-H.png', 104, 91, 56, 56],
+                ['donut_plot', 5, 148.5, 105, 105],
+                ['legend_table', 108, 149, 88, 105],
+                ['dose_table', 10, 253, 186, 37]]
+    elif s == 1:
+        return [['indiv_flush_bar',8,40.5,191,136.429],
+                [f'{template_dir}/rec_use_spec.svg', 185, 56.5, 21.5, 107.5],
+                ['indiv_flush_table',10,180,106.7,68.5],
+                ['pcb-pcn-heatmap_plot', 120, 180, 70, 70],
+                [f'{flush_images_dir}/{sample_id}-M.png', 121.5, 189.5, 56.5, 59]]
+    elif s == 2:
+        return [['sample_table_name_id', 10, 30, 186, 10],
+                ]
+    return []
+
+def page_inputs(settings, report_type, s, sample_id, sample_dir, photo_dict):
+    """
+    Returns the paths of every file placed on section s of a report: the header images,
+    the sample SVGs, template SVGs and photos (photo_dict resolving their PNG/JPG file).
+    """
+    template_dir = settings['template_dir']
+    input_list = [f'{template_dir}/HL_transparent.png', f'{template_dir}/default_image.png',
+                  os.path.join(sample_dir, f'{sample_id}-sample_table_name_id.svg')]
+    if report_type == 'Cup':
+        input_list += [f'{template_dir}/tryptomicssupport.png', f'{template_dir}/HCFall22-banner.png']
+        for key, value in champ_dict.items():
+            if value == sample_id:
+                input_list += [f'{template_dir}/{champ_logo_dict[key]}', f"{template_dir}/{champ_logo_dict[key].split('-')[1]}"]
+    for graphic_type, pdf_x, pdf_y, input_w, input_h in page_layout(report_type, s, sample_id, template_dir,
+                                                                    settings['profile_images_dir'], settings['flush_images_dir']):
+        if '-W' in graphic_type or '-H' in graphic_type or '-M' in graphic_type:
+            input_list.append(photo_dict.get(graphic_type, graphic_type))
+        elif 'Template' in graphic_type:
+            input_list.append(graphic_type)
+        else:
+            input_list.append(os.path.join(sample_dir, f'{sample_id}-{graphic_type}.svg'))
+    return input_list
+
+def generated_graphic_types(sample_id):
+    """
+    Returns the graphic types the graphics stage writes for sample_id: the flush bar and
+    table too for an individual Flush Test, only the profile graphics otherwise.
+    """
+    if re.match(SampleSelection.flush_test_pattern, sample_id):
+        return IncrementalTracker.flush_graphic_types
+    return IncrementalTracker.profile_graphic_types
+
+def page_layout_key(settings, report_type, s, sample_id):
+    """
+    Returns the ReportPlanner layout key of section s of a report, covering the placements,
+    the section title and the options changing how the inputs are embedded.
+    """
+    return ReportPlanner.layout_key(report_type, s, section_title_dict[report_type][s],
+                                    page_layout(report_type, s, sample_id, settings['template_dir'],
+                                                settings['profile_images_dir'], settings['flush_images_dir']),
+                                    settings['pdf_vector_graphics'], settings['photo_dpi'])
+
+def load_report_config(config_path):
+    """
+    Returns the directories and options of the report functions from the config.txt file
+    (see README.md) as a dictionary.
+    """
+    # Use Python's built-in configparser library to parse the variables in the config.txt file
+    config = configparser.ConfigParser()
+    if len(config.read(config_path)) == 0:
+        raise FileNotFoundError(f'Config file not found: {config_path}')
+
+    template_dir = config.get('DEFAULT', 'template_dir')
+    return {'automation_workspace': config.get('DEFAULT', 'automation_workspace'),
+            'template_dir': template_dir,
+            'profile_images_dir': config.get('DEFAULT', 'profile_images_dir'),
+            'flush_images_dir': config.get('DEFAULT', 'flush_images_dir'),
+            'incremental_state_dir': config.get('DEFAULT', 'incremental_state_dir', fallback=f'{template_dir}/Incremental State'),
+            'pdf_vector_graphics': config.getboolean('DEFAULT', 'pdf_vector_graphics', fallback=False),
+            'render_cache_dir': config.get('DEFAULT', 'render_cache_dir', fallback=f'{template_dir}/Render Cache'),
+            'render_cache_mb': config.getint('DEFAULT', 'render_cache_mb', fallback=500),
+            'report_workers': config.getint('DEFAULT', 'report_workers', fallback=1),
+            'photo_derivative_dir': config.get('DEFAULT', 'photo_derivative_dir', fallback=f'{template_dir}/Photo Derivatives'),
+            'photo_dpi': config.getint('DEFAULT', 'photo_dpi', fallback=200),
+            'photo_workers': config.getint('DEFAULT', 'photo_workers', fallback=0),
+            'store_results': config.getboolean('DEFAULT', 'store_results', fallback=True),
+            'results_db': config.get('DEFAULT', 'results_db', fallback=f'{template_dir}/Results/results.sqlite')}
+
+class SVGWarningCollector(logging.Handler):
+    """
+    Collects the warnings fpdf2 logs while the current thread parses an SVG, e.g. the
+    elements and attributes it skips as unsupported. Records of other report threads
+    are ignored.
+    """
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.thread_id = threading.get_ident()
+        self.message_list = []
+
+    def emit(self, record):
+        if record.thread == self.thread_id:
+            self.message_list.append(record.getMessage())
+
+def svg_vector_warnings(svg_data):
+    """
+    Parses an SVG the way fpdf2 embeds it and returns the warnings it logged, an empty
+    list when fpdf2 draws every element of the SVG.
+    """
+    svg_logger = logging.getLogger('fpdf.svg')
+    collector = SVGWarningCollector()
+    svg_logger.addHandler(collector)
+    try:
+        SVGObject(svg_data)
+    finally:
+        svg_logger.removeHandler(collector)
+    return collector.message_list
 
 ###############################################################################
-# Function to add SVG to a PDF by converting with CairoSVG
-###############################################################################
-def cairo_add_svg_to_pdf(sample_id,graphic_type,input_w,input_h,pdf_x,pdf_y):
-    print(sample_id,graphic_type,input_w,input_h,pdf_x,pdf_y)
-    input_path = f'{sample_id}-{graphic_type}.svg'
-    input_png = f'{sample_id}-{graphic_type}.png'
-    if 'Template' in graphic_type:
-        input_path = graphic_type
-        input_png = graphic_type.replace('svg','png')
-    cairosvg.svg2png(url=input_path, write_to=input_png)
-    add_png_to_pdf(input_png, pdf_x, pdf_y, input_w, input_h)
+#
+# Resources Shared by the Reports of a Process
+#
 ###############################################################################
 
+class ReportResources:
+    """
+    The warm state every ReportBuilder of a process shares: the report settings, the
+    render cache, the decoded template images, the downsampled sample photos and one
+    Inkscape shell session. Create it once and reuse it across
+    sample batches, close it when the process is done.
+
+    Parameters:
+    - settings: dict
+        The report settings (load_report_config).
+    """
+    def __init__(self, settings):
+        self.settings = settings
+        self.render_cache = RenderCache.RenderCache(settings['render_cache_dir'], settings['render_cache_mb'] * 1024 * 1024)
+        self.inkscape_shell = InkscapeShell.InkscapeShell()
+        self.image_cache = ImageAssets.image_asset_cache
+        self.image_cache.preload(settings['template_dir'])
+        # {'{image_dir}/{stem}.png': photo} of the sample photos, PNG/JPG resolved once
+        image_dir_list = [settings['profile_images_dir'], settings['flush_images_dir']]
+        if settings['photo_dpi'] > 0:
+            self.photo_dict = PhotoDerivatives.generate_derivatives(image_dir_list, settings['photo_derivative_dir'],
+                                                                   settings['photo_dpi'], settings['photo_workers'])
+        else:
+            self.photo_dict = PhotoDerivatives.photo_index(image_dir_list)
+        # {svg_path: reason} of the Inkscape conversions that failed
+        self.conversion_failures = {}
+
+    def inkscape_convert(self, input_path, input_png):
+        try:
+            self.inkscape_shell.convert(input_path, input_png)
+        except InkscapeShell.InkscapeConversionError as error:
+            self.conversion_failures[input_path] = str(error)
+            print(f'Inkscape conversion of {input_path} failed: {error}')
+
+    def convert_pending_inkscape(self, folder_list):
+        # Convert every uncached description table of the run in one batch before the reports are built
+        conversion_list = []
+        for folder in folder_list:
+            for entry in os.scandir(folder):
+                if entry.is_file() and entry.name.endswith('-description_table_bot.svg'):
+                    input_path = entry.path
+                    cache_key = self.render_cache.file_key(input_path, output='png', converter='inkscape')
+                    if not os.path.exists(self.render_cache.artifact_path(cache_key, 'png')):
+                        conversion_list.append((input_path, input_path.replace('.svg', '.png'), cache_key))
+        if len(conversion_list) == 0:
+            return
+        try:
+            failure_dict = self.inkscape_shell.convert_batch([(input_path, input_png) for input_path, input_png, _ in conversion_list])
+        except InkscapeShell.InkscapeConversionError as error:
+            failure_dict = {input_path: str(error) for input_path, _, _ in conversion_list}
+        for input_path, input_png, cache_key in conversion_list:
+            if input_path in failure_dict:
+                self.conversion_failures[input_path] = failure_dict[input_path]
+            else:
+                self.render_cache.store(cache_key, 'png', input_png)
+        print(f'INKSCAPE: {len(conversion_list) - len(failure_dict)} of {len(conversion_list)} description tables converted')
+
+    def print_conversion_failures(self):
+        if len(self.conversion_failures) == 0:
+            return
+        print(f'INKSCAPE: {len(self.conversion_failures)} conversion(s) failed, the default image was used instead')
+        for input_path, reason in self.conversion_failures.items():
+            print(f'  {input_path}: {reason}')
+
+    def close(self):
+        self.inkscape_shell.close()
+        self.print_conversion_failures()
+        self.conversion_failures = {}
+        self.render_cache.print_stats()
+        self.image_cache.print_stats()
+
 ###############################################################################
-# Function to add SVG to a PDF by converting with Inkscape
-# Use Inkscape to convert SVG to PNG because CairoSVG distorts the text
+#
+# Builder of the PDF Reports of One Sample
+#
 ###############################################################################
-def inkscape_add_svg_to_pdf(sample_id,graphic_type,input_w,input_h,pdf_x,pdf_y):
-    input_path = f'{sample_id}-{graphic_type}.svg'
-    input_png = f'{sample_id}-{graphic_type}.png'    
-    os.system(f'inkscape --export-type=png {input_path}')
-    add_png_to_pdf(input_png, pdf_x, pdf_y, input_w, input_h)
-
-
-def build_report(input_list):
-    input_df = pd.DataFrame(input_list,
-                                      columns = ['graphic_type',
-                                                'pdf_x','pdf_y',
-                                                'input_w','input_h'])    
-    for index, row in input_df.iterrows():
-        if row['graphic_type'] == 'description_table_bot':
-            inkscape_add_svg_to_pdf(sample_id,row['graphic_type'],
-                                    row['input_w'], row['input_h'],
-                                    row['pdf_x'], row['pdf_y'])
-        elif '-W' in row['graphic_type'] or '-H' in row['graphic_type'] or '-M' in row['graphic_type']:
-            add_png_to_pdf(row['graphic_type'],
-                            row['pdf_x'], row['pdf_y'],
-                            row['input_w'], row['input_h'])
-        else:
-            cairo_add_svg_to_pdf(sample_id,row['graphic_type'],
-                                  row['input_w'], row['input_h'],
-                                  row['pdf_x'], row['pdf_y'])
-
-def generate_report(report_type, save_dir, section_title, s):
-    global pdf
-    pdf = FPDF()
-    pdf.add_page()
- 
-    # Add HL Logo
-    HL_logo_path =  f"{template_dir}/HL_transparent.png"
-    pdf.image(HL_logo_path, 10, 9, 80, 20)
-    
-    # Add Sample ID Banner
-    cairo_add_svg_to_pdf(sample_id,'sample_table_name_id',191,10.269,10,30)
-    
-    
-    # define the styles for the text
-    pdf.set_font('Arial','', 14)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_fill_color(255, 255, 255)
-
-    # Add Section ttile
-    pdf.set_xy(88, 10)
-    pdf.multi_cell(0, 6, section_title)
-    
-    if report_type == 'Cup':
-        print('DO CUP PROFILE REPORT')
-        # GENERATE CHAMP DICTS ########################## UPDATE FOR EVERY CUP
-        champ_dict = {'Micro' : 'CUP265',
-                      'Rec/Out': 'CUP282',
-                      'Therapy' : 'CUP314',
-                      'Spiritual' : 'CUP319',
-                      'Profile' : 'CUP311'}
-        champ_logo_dict = {'Micro' : 'HCFall22-Micro.png',
-                           'Rec/Out': 'HCFall22-Rec.png',
-                           'Therapy' : 'HCFall22-Therapy.png',
-                           'Spiritual' : 'HCFall22-Spirit.png',
-                           'Profile' : 'HCFall22-Unique.png'}
-        
-        # Add Support Logos ########################## UPDATE FOR EVERY CUP
-        tryp_logo_path =  f"{template_dir}/tryptomicssupport.png"
-        tryp_logo_w, tryp_logo_h = 32, 10
-        tryp_logo_x, tryp_logo_y = 164, 17.5
-        add_png_to_pdf(tryp_logo_path, tryp_logo_x, tryp_logo_y, tryp_logo_w, tryp_logo_h)
-        
-        for key, value in champ_dict.items():
-            print(value)
-            print(sample_id)
-            if value == sample_id:
-                    print(f"{sample_id} ADD CUSTOM LOGO {key} CHAMP")
-                    champ_logo = champ_logo_dict.get(key)
-                    champ_ribbon = champ_logo.split('-')[1]
-                    cup_logo_path = f"{template_dir}/{champ_logo}"
+
+class ReportBuilder:
+    """
+    Builds the PDF reports of one sample. Every builder carries its own FPDF document,
+    sample metadata and folder, so builders of different samples can run concurrently
+    on a thread pool; graphic file names are resolved against sample_dir instead of
+    the working directory.
+
+    Parameters:
+    - resources: ReportResources
+        The settings, render cache and Inkscape session shared by all builders.
+    - sample_id: str
+        The Sample_ID (or Flush Test ID) of the report.
+    - sample_name: str
+        The name in the report file name.
+    - sample_dir: str
+        The sample folder holding the graphics, the PDFs are saved there.
+    - asset_bundle: AssetBundle.AssetBundle, optional
+        In-memory graphics of the sample, used before the files of sample_dir.
+    """
+    def __init__(self, resources, sample_id, sample_name, sample_dir, asset_bundle=None):
+        self.resources = resources
+        self.render_cache = resources.render_cache
+        self.image_cache = resources.image_cache
+        self.template_dir = resources.settings['template_dir']
+        self.profile_images_dir = resources.settings['profile_images_dir']
+        self.flush_images_dir = resources.settings['flush_images_dir']
+        self.pdf_vector_graphics = resources.settings['pdf_vector_graphics']
+        self.sample_id = sample_id
+        self.sample_name = sample_name
+        self.sample_dir = sample_dir
+        self.asset_bundle = asset_bundle
+        self.pdf = None
+
+    def sample_path(self, file_name):
+        return os.path.join(self.sample_dir, file_name)
+
+    ###########################################################################
+    # Function to add PNG to a PDF
+    ###########################################################################
+    def add_png_to_pdf(self, image_name, x_pos, y_pos, image_w, image_h):
+        # Sample photos are embedded from their downsampled derivative
+        image_name = self.resources.photo_dict.get(image_name, image_name)
+        jpg_name = image_name.replace('png','jpg')
+        # Images come decoded from the process-wide cache
+        if not os.path.exists(image_name):
+            print(f"File not found: {image_name}\nUsing Default Image")
+            self.pdf.image(self.image_cache.image(f'{self.template_dir}/default_image.png'), x_pos, y_pos, image_w, image_h)
+        elif '-M' in image_name:
+            # Blend the original image with a transparent image using alpha=0.2 (20% transparency), once per photo
+            self.pdf.image(self.image_cache.transparent(image_name, 0.2), x_pos, y_pos, image_w, image_h)
+        elif os.path.exists(image_name):
+            self.pdf.image(self.image_cache.image(image_name), x_pos, y_pos, image_w, image_h)
+        elif os.path.exists(jpg_name):
+            self.pdf.image(self.image_cache.image(jpg_name), x_pos, y_pos, image_w, image_h)
+
+        print(f"{image_name} Added")
+
+    ###########################################################################
+    # Function to convert an SVG to PNG through the render cache
+    ###########################################################################
+    def cached_svg_to_png(self, input_path, input_png, converter, convert_function):
+        # Unchanged SVGs are copied from the cache instead of re-rasterized
+        if not os.path.exists(input_path):
+            convert_function()
+            return
+        cache_key = self.render_cache.file_key(input_path, output='png', converter=converter)
+        if not self.render_cache.fetch(cache_key, 'png', input_png):
+            convert_function()
+            if os.path.exists(input_png):
+                self.render_cache.store(cache_key, 'png', input_png)
+
+    ###########################################################################
+    # Function to place an SVG into the PDF page as vector graphics
+    ###########################################################################
+    def vector_add_svg_to_pdf(self, input_path, input_w, input_h, pdf_x, pdf_y, svg_data=None):
+        # fpdf2 draws the SVG paths and text into the page, returns False when the SVG cannot be embedded
+        if not self.pdf_vector_graphics or (svg_data is None and not os.path.exists(input_path)):
+            return False
+        try:
+            if svg_data is None:
+                with open(input_path, 'rb') as svg_file:
+                    svg_data = svg_file.read()
+            # fpdf2 skips unsupported SVG features with a logged warning, such SVGs are rasterized instead
+            warning_list = svg_vector_warnings(svg_data)
+            if len(warning_list) > 0:
+                print(f'Vector embedding of {input_path} would drop content ({warning_list[0]}), rasterizing')
+                return False
+            self.pdf.image(io.BytesIO(svg_data), pdf_x, pdf_y, input_w, input_h)
+        except Exception as error:
+            print(f'Vector embedding of {input_path} failed ({type(error).__name__}: {error}), rasterizing')
+            return False
+        print(f"{input_path} Added")
+        return True
+
+    ###########################################################################
+    # Function to add SVG to a PDF by converting with CairoSVG
+    ###########################################################################
+    def cairo_add_svg_to_pdf(self, graphic_type, input_w, input_h, pdf_x, pdf_y):
+        file_name = f'{self.sample_id}-{graphic_type}.svg'
+        if 'Template' in graphic_type:
+            # Template SVGs are shared by every report, converting them in memory keeps
+            # concurrent reports from writing the same PNG
+            with open(graphic_type, 'rb') as svg_file:
+                self.svg_data_add_to_pdf(graphic_type, svg_file.read(), 'cairosvg', input_w, input_h, pdf_x, pdf_y)
+            return
+        if self.asset_bundle is not None and file_name in self.asset_bundle:
+            self.svg_data_add_to_pdf(file_name, self.asset_bundle.get(file_name), 'cairosvg', input_w, input_h, pdf_x, pdf_y)
+            return
+        input_path = self.sample_path(file_name)
+        input_png = self.sample_path(f'{self.sample_id}-{graphic_type}.png')
+        if self.vector_add_svg_to_pdf(input_path, input_w, input_h, pdf_x, pdf_y):
+            return
+        self.cached_svg_to_png(input_path, input_png, 'cairosvg', lambda: cairosvg.svg2png(url=input_path, write_to=input_png))
+        self.add_png_to_pdf(input_png, pdf_x, pdf_y, input_w, input_h)
+
+    ###########################################################################
+    # Function to add SVG to a PDF by converting with Inkscape
+    # Use Inkscape to convert SVG to PNG because CairoSVG distorts the text
+    ###########################################################################
+    def inkscape_add_svg_to_pdf(self, graphic_type, input_w, input_h, pdf_x, pdf_y):
+        file_name = f'{self.sample_id}-{graphic_type}.svg'
+        if self.asset_bundle is not None and file_name in self.asset_bundle:
+            self.svg_data_add_to_pdf(file_name, self.asset_bundle.get(file_name), 'inkscape', input_w, input_h, pdf_x, pdf_y)
+            return
+        input_path = self.sample_path(file_name)
+        input_png = self.sample_path(f'{self.sample_id}-{graphic_type}.png')
+        if self.vector_add_svg_to_pdf(input_path, input_w, input_h, pdf_x, pdf_y):
+            return
+        self.cached_svg_to_png(input_path, input_png, 'inkscape', lambda: self.resources.inkscape_convert(input_path, input_png))
+        self.add_png_to_pdf(input_png, pdf_x, pdf_y, input_w, input_h)
+
+    ###########################################################################
+    # Function to add in-memory SVG data to a PDF without intermediate files
+    ###########################################################################
+    def svg_data_add_to_pdf(self, file_name, svg_data, converter, input_w, input_h, pdf_x, pdf_y):
+        if self.vector_add_svg_to_pdf(file_name, input_w, input_h, pdf_x, pdf_y, svg_data):
+            return
+        cache_key = self.render_cache.bytes_key(svg_data, output='png', converter=converter)
+        png_data = self.render_cache.read(cache_key, 'png')
+        if png_data is None:
+            png_data = self.svg_data_to_png(os.path.basename(file_name), svg_data, converter)
+            if png_data is not None:
+                self.render_cache.store_bytes(cache_key, 'png', png_data)
+        if png_data is None:
+            # Falls back to the default image like a missing PNG file
+            self.add_png_to_pdf(self.sample_path(os.path.basename(file_name).replace('.svg', '.png')),
+                                pdf_x, pdf_y, input_w, input_h)
+            return
+        self.pdf.image(io.BytesIO(png_data), pdf_x, pdf_y, input_w, input_h)
+        print(f"{file_name} Added")
+
+    def svg_data_to_png(self, file_name, svg_data, converter):
+        if converter == 'cairosvg':
+            return cairosvg.svg2png(bytestring=svg_data)
+        # Inkscape only converts files, the SVG is staged in a scratch folder
+        with tempfile.TemporaryDirectory() as convert_dir:
+            input_path = os.path.join(convert_dir, file_name)
+            input_png = input_path.replace('.svg', '.png')
+            with open(input_path, 'wb') as svg_file:
+                svg_file.write(svg_data)
+            self.resources.inkscape_convert(input_path, input_png)
+            if not os.path.exists(input_png):
+                return None
+            with open(input_png, 'rb') as png_file:
+                return png_file.read()
+
+    def build_report(self, input_list):
+        input_df = pd.DataFrame(input_list,
+                                          columns = ['graphic_type',
+                                                    'pdf_x','pdf_y',
+                                                    'input_w','input_h'])
+        for index, row in input_df.iterrows():
+            if row['graphic_type'] == 'description_table_bot':
+                self.inkscape_add_svg_to_pdf(row['graphic_type'],
+                                             row['input_w'], row['input_h'],
+                                             row['pdf_x'], row['pdf_y'])
+            elif '-W' in row['graphic_type'] or '-H' in row['graphic_type'] or '-M' in row['graphic_type']:
+                self.add_png_to_pdf(row['graphic_type'],
+                                    row['pdf_x'], row['pdf_y'],
+                                    row['input_w'], row['input_h'])
+            else:
+                self.cairo_add_svg_to_pdf(row['graphic_type'],
+                                          row['input_w'], row['input_h'],
+                                          row['pdf_x'], row['pdf_y'])
+
+    def generate_report(self, report_type, section_title, s):
+        """
+        Builds section s of the report of the sample and saves it into sample_dir.
+
+        Returns:
+        - report_name: str
+            The path of the saved PDF.
+        """
+        sample_id = self.sample_id
+        template_dir = self.template_dir
+        self.pdf = pdf = FPDF()
+        pdf.add_page()
+
+        # Add HL Logo
+        HL_logo_path =  f"{template_dir}/HL_transparent.png"
+        pdf.image(self.image_cache.image(HL_logo_path), 10, 9, 80, 20)
+
+        # Add Sample ID Banner
+        self.cairo_add_svg_to_pdf('sample_table_name_id',191,10.269,10,30)
+
+
+        # define the styles for the text
+        pdf.set_font('Arial','', 14)
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_fill_color(255, 255, 255)
+
+        # Add Section ttile
+        pdf.set_xy(88, 10)
+        pdf.multi_cell(0, 6, section_title)
+
+        if report_type == 'Cup':
+            print('DO CUP PROFILE REPORT')
+            # Add Support Logos ########################## UPDATE FOR EVERY CUP
+            tryp_logo_path =  f"{template_dir}/tryptomicssupport.png"
+            tryp_logo_w, tryp_logo_h = 32, 10
+            tryp_logo_x, tryp_logo_y = 164, 17.5
+            self.add_png_to_pdf(tryp_logo_path, tryp_logo_x, tryp_logo_y, tryp_logo_w, tryp_logo_h)
+
+            for key, value in champ_dict.items():
+                if value == sample_id:
+                        print(f"{sample_id} ADD CUSTOM LOGO {key} CHAMP")
+                        champ_logo = champ_logo_dict.get(key)
+                        champ_ribbon = champ_logo.split('-')[1]
+                        cup_logo_path = f"{template_dir}/{champ_logo}"
+                        cup_logo_w, cup_logo_h = 52, 15
+                        cup_logo_x, cup_logo_y = 109.5, 12
+                        self.add_png_to_pdf(cup_logo_path, cup_logo_x, cup_logo_y, cup_logo_w, cup_logo_h)
+                        champ_ribbon_path = f"{template_dir}/{champ_ribbon}"
+                        champ_ribbon_w, champ_ribbon_h = 51, 50
+                        champ_ribbon_x, champ_ribbon_y = 110, 40
+                        self.add_png_to_pdf(champ_ribbon_path, champ_ribbon_x, champ_ribbon_y, champ_ribbon_w, champ_ribbon_h)
+                        break
+                else:
+                    print(f"{sample_id} ADD DEFAULT LOGO CUP.")
+                    cup_logo_path = f"{template_dir}/HCFall22-banner.png"
                     cup_logo_w, cup_logo_h = 52, 15
                     cup_logo_x, cup_logo_y = 109.5, 12
-                    add_png_to_pdf(cup_logo_path, cup_logo_x, cup_logo_y, cup_logo_w, cup_logo_h)
-                    champ_ribbon_path = f"{template_dir}/{champ_ribbon}"
-                    champ_ribbon_w, champ_ribbon_h = 51, 50
-                    champ_ribbon_x, champ_ribbon_y = 110, 40
-                    add_png_to_pdf(champ_ribbon_path, champ_ribbon_x, champ_ribbon_y, champ_ribbon_w, champ_ribbon_h)
-                    break
-            else:
-                print(f"{sample_id} ADD DEFAULT LOGO CUP.")
-                cup_logo_path = f"{template_dir}/HCFall22-banner.png"
-                cup_logo_w, cup_logo_h = 52, 15
-                cup_logo_x, cup_logo_y = 109.5, 12
-                add_png_to_pdf(cup_logo_path, cup_logo_x, cup_logo_y, cup_logo_w, cup_logo_h)
-        
-        indiv_report_list = [['sample_table_client', 10, 40, 186, 10],
-                                   ['sample_table_cultivar', 10, 50, 186, 10],
-                                   ['sample_table_gen_date', 10, 60, 186, 10],
-                                   ['sample_table_species', 10, 70, 186, 10],
-                                   ['description_table_top', 10, 80, 186, 10],
-                                   ['description_table_bot', 10, 90, 186, 61],
-                                   [f'{profile_images_dir}/{sample_id}-W.png', 11, 91, 56, 56],
-                                   [f'{profile_images_dir}/{sample_id}-H.png', 104, 91, 56, 56],
-                                   ['donut_plot', 5, 148.5, 105, 105],
-                                   ['legend_table', 108, 149, 88, 105],
-                                   ['dose_table', 10, 253, 186, 37]]
-        build_report(indiv_report_list)
-        
-        
-    # GENERATE INDIVIDUAL CHEMICAL PROFILE REPORT
-    elif report_type == 'Profile':
-        print('DO CHEM PROFILE REPORT')
-        indiv_report_list = [['sample_table_client', 10, 40, 186, 10],
-                                   ['sample_table_cultivar', 10, 50, 186, 10],
-                                   ['sample_table_gen_date', 10, 60, 186, 10],
-                                   ['sample_table_species', 10, 70, 186, 10],
-                                   ['description_table_top', 10, 80, 186, 10],
-                                   ['description_table_bot', 10, 90, 186, 61],
-                                   [f'{profile_images_dir}/{sample_id}-W.png', 11, 91, 56, 56],
-                                   [f'{profile_images_dir}/{sample_id}-H.png', 104, 91, 56, 56],
-                                   ['donut_plot', 5, 148.5, 105, 105],
-                                   ['legend_table', 108, 149, 88, 105],
-                                   ['dose_table', 10, 253, 186, 37]]
-        build_report(indiv_report_list)
-    
-    # GENERATE FLUSH TEST REPORTS
-    elif report_type == 'Flush':
-        print('DO FLUSH TEST REPORT')
-        if s == 0:
-            indiv_report_list = [['sample_table_client', 10, 40, 186, 10],
-                                       ['sample_table_cultivar', 10, 50, 186, 10],
-                                       ['sample_table_gen_date', 10, 60, 186, 10],
-                                       ['sample_table_species', 10, 70, 186, 10],
-                                       ['description_table_top', 10, 80, 186, 10],
-                                       ['description_table_bot', 10, 90, 186, 61],
-                                       [f'{profile_images_dir}/{sample_id}-W.png', 11, 91, 56, 56],
-                                       [f'{profile_images_dir}/{sample_id}-H.png', 104, 91, 56, 56],
-                                       ['donut_plot', 5, 148.5, 105, 105],
-                                       ['legend_table', 108, 149, 88, 105],
-                                       ['dose_table', 10, 253, 186, 37]]
-            build_report(indiv_report_list)
-        elif s == 1:
-            flush_heat_report_list = [['indiv_flush_bar',8,40.5,191,136.429],
-                                      [f'{template_dir}/rec_use_spec.svg', 185, 56.5, 21.5, 107.5],
-                                      ['indiv_flush_table',10,180,106.7,68.5],
-                                      ['pcb-pcn-heatmap_plot', 120, 180, 70, 70],
-                                      [f'{flush_images_dir}/{sample_id}-M.png', 121.5, 189.5, 56.5, 59]]
-            build_report(flush_heat_report_list)
-        elif s == 2:
-            flush_feature_report_list = [['sample_table_name_id', 10, 30, 186, 10],
-                                         ]
-            build_report(flush_feature_report_list)
-    
-    # Save the Generated PDF of the sample
-    report_name = f'{save_dir}/{sample_id} - {sample_name} - {s+1}.pdf'
-    print(report_name)
-    pdf.output(report_name, "F")
-    print()
-
-
-
-# Use Python's built-in configparser library to parse the variables in the config.txt file
-config = configparser.ConfigParser()
-config.read('C:/Users/theda/OneDrive/Documents/Python\HL/config.txt')
-
-automation_workspace = config.get('DEFAULT', 'automation_workspace')
-template_dir = config.get('DEFAULT', 'template_dir')
-
-profile_images_dir = config.get('DEFAULT', 'profile_images_dir')
-flush_images_dir = config.get('DEFAULT', 'flush_images_dir')
-
-subfolders = [ f.path for f in os.scandir(automation_workspace) if f.is_dir() ]
-HL_logo_path = f'{template_dir}/HL_transparent.png'
-report_name = ''
-
-os.chdir(automation_workspace)
+                    self.add_png_to_pdf(cup_logo_path, cup_logo_x, cup_logo_y, cup_logo_w, cup_logo_h)
 
-section_title_dict = {'Flush':   ['FLUSH TEST AVERAGE\nCHEMICAL PROFILE &\nDOSE REPORT',
-                                  'FLUSH TEST PROFILES\nPCB+PCN DISTRIBUTION &\nHEAT MAP' ,
-                                  'FLUSH TEST\nMACHINE LEARNING STATISTICAL ANLAYSIS\nOF PCB+PCN POTENCY VARIANCE'],
-                      'Profile': ['CHEMICAL\nPROFILE &\nDOSE REPORT'],
-                      'Cup':     ['HYPHAE CUP\nCHEMICAL PROFILE &\nDOSE REPORT']}
+        # GENERATE INDIVIDUAL CHEMICAL PROFILE REPORT
+        elif report_type == 'Profile':
+            print('DO CHEM PROFILE REPORT')
+
+        # GENERATE FLUSH TEST REPORTS
+        elif report_type == 'Flush':
+            print('DO FLUSH TEST REPORT')
+
+        self.build_report(page_layout(report_type, s, sample_id, template_dir, self.profile_images_dir, self.flush_images_dir))
+
+        # Save the Generated PDF of the sample
+        report_name = self.sample_path(f'{sample_id} - {self.sample_name} - {s+1}.pdf')
+        print(report_name)
+        pdf.output(report_name, "F")
+        print()
+        return report_name
+
+###############################################################################
+#
+# Report Runs Over the Automation Workspace or the In-Memory AssetBundles
+#
+###############################################################################
+
+def report_job(sample_id, sample_name, sample_dir, report_type, section_list, asset_bundle=None):
+    """
+    Returns the description of the reports of one sample, run by run_report_jobs.
+
+    Parameters:
+    - section_list: list
+        The section numbers of section_title_dict[report_type] to build, in order.
+    """
+    return {'sample_id': sample_id,
+            'sample_name': sample_name,
+            'sample_dir': sample_dir,
+            'report_type': report_type,
+            'section_list': section_list,
+            'asset_bundle': asset_bundle,
+            # {section: seconds} of the built sections, filled by run_report_jobs
+            'section_seconds': {}}
+
+def run_report_jobs(resources, job_list, workers=1):
+    """
+    Builds the reports of every job, the jobs of different samples spread over a thread
+    pool; the sections of one sample are built in order by the same thread.
 
-for sample_dir in subfolders:
-    if 'Template' in sample_dir:
-        pass
+    Parameters:
+    - resources: ReportResources
+        The state shared by the builders.
+    - job_list: list
+        Jobs built with report_job.
+    - workers: int
+        Number of report threads, 1 builds the jobs in this thread.
+
+    Returns:
+    - error_dict: dict
+        {sample_id: traceback} of the samples whose reports failed.
+    """
+    error_dict = {}
+    error_lock = threading.Lock()
+
+    def run_job(job):
+        report_builder = ReportBuilder(resources, job['sample_id'], job['sample_name'], job['sample_dir'], job['asset_bundle'])
+        try:
+            for s in job['section_list']:
+                start_time = time.perf_counter()
+                report_builder.generate_report(job['report_type'], section_title_dict[job['report_type']][s], s)
+                job['section_seconds'][s] = time.perf_counter() - start_time
+        except Exception:
+            with error_lock:
+                error_dict[job['sample_id']] = traceback.format_exc()
+
+    if workers <= 1 or len(job_list) <= 1:
+        for job in job_list:
+            run_job(job)
     else:
-        os.chdir(sample_dir)    
-        sample_info = sample_dir.split(automation_workspace)[1]
-        report_type = sample_info.split(' - ')[0]
-        sample_id = sample_info.split(' - ')[1]
-        sample_name = sample_info.split(' - ')[2]
-        if 'CUP' in report_type or 'Cup' in report_type: 
-            report_type = 'Cup'
-            for s, section_title in enumerate(section_title_dict[report_type]):
-                pass
-                # if not os.path.exists(report_name):
-                #     generate_report(report_type, sample_dir, section_title, s)
-        elif 'Profile' in report_type:
-            report_type = 'Profile'
-            for s, section_title in enumerate(section_title_dict[report_type]):
-                pass
-                # if not os.path.exists(report_name):
-                #     generate_report(report_type, sample_dir, section_title, s)
-        elif 'Flush'  in report_type or 'FLUSH' in report_type or 'FT'  in report_type:
-            report_type = 'Flush'
-            for s, section_title in enumerate(section_title_dict[report_type]):
-               if not os.path.exists(report_name):
-                   generate_report(report_type,sample_dir, section_title, s)
+        with ThreadPoolExecutor(max_workers=min(workers, len(job_list))) as executor:
+            list(executor.map(run_job, job_list))
+    for sample_id, error in error_dict.items():
+        print(f'Report of {sample_id} FAILED\n{error}')
+    return error_dict
+
+def folder_report_name(sample_dir):
+    """
+    Returns the name a report of sample_dir is saved under, the Sample_Name part of the
+    '{Report_Type} - {Sample_ID} - {Sample_Name}' folder name (the Cultivar for a Flush
+    Test campaign, also used by the Flush Tests in its subfolders).
+    """
+    return os.path.basename(sample_dir).split(' - ')[2]
+
+def report_pdf_path(sample_dir, sample_id, sample_name, s):
+    return os.path.join(sample_dir, f'{sample_id} - {sample_name} - {s+1}.pdf')
+
+def plan_report_jobs(settings, planner, page_list, force=False, bundle_dict=None):
+    """
+    Compares every page with the report manifest and groups the stale pages into one
+    report job per sample.
+
+    Parameters:
+    - settings: dict
+        The report settings (load_report_config).
+    - planner: ReportPlanner.ReportPlanner
+        The manifest of the built pages.
+    - page_list: list
+        (sample_id, sample_name, sample_dir, report_type, s) of every page to plan.
+    - force: bool
+        Rebuild every page.
+    - bundle_dict: dict, optional
+        {sample_dir: AssetBundle} of the samples whose graphics are held in memory.
+
+    Returns:
+    - page_plan_list: list
+        (pdf_path, reason) of every page, reason None when the page is up to date. Pages
+        missing a sample graphic are blocked (ReportPlanner.is_blocked) and get no job.
+    - job_list: list
+        Jobs (report_job) of the stale pages.
+    - signature_dict: dict
+        {pdf_path: signature} of the stale pages, recorded once they are built.
+    """
+    if bundle_dict is None:
+        bundle_dict = {}
+    # Pages are planned against the original photos, photo_dpi is part of the layout key
+    photo_dict = PhotoDerivatives.photo_index([settings['profile_images_dir'], settings['flush_images_dir']])
+    page_plan_list = []
+    job_dict = {}
+    signature_dict = {}
+    for sample_id, sample_name, sample_dir, report_type, s in page_list:
+        pdf_path = report_pdf_path(sample_dir, sample_id, sample_name, s)
+        input_list = page_inputs(settings, report_type, s, sample_id, sample_dir, photo_dict)
+        signature = planner.page_signature(page_layout_key(settings, report_type, s, sample_id), input_list,
+                                           bundle_dict.get(sample_dir))
+        # A missing graphic the graphics stage writes blocks the page instead of being replaced with the default
+        # image; graphics it never writes (the heat map, the flush bars of a campaign) keep the placeholder
+        generated_list = [os.path.join(sample_dir, f'{sample_id}-{graphic_type}.svg')
+                          for graphic_type in generated_graphic_types(sample_id)]
+        graphic_list = [input_path for input_path in input_list if input_path in generated_list]
+        reason = planner.missing_reason(signature, graphic_list) or planner.stale_reason(pdf_path, signature, force)
+        page_plan_list.append((pdf_path, reason))
+        if reason is None or ReportPlanner.is_blocked(reason):
+            continue
+        if sample_dir not in job_dict:
+            job_dict[sample_dir] = report_job(sample_id, sample_name, sample_dir, report_type, [], bundle_dict.get(sample_dir))
+        job_dict[sample_dir]['section_list'].append(s)
+        signature_dict[pdf_path] = signature
+    return page_plan_list, list(job_dict.values()), signature_dict
+
+def record_report_jobs(settings, planner, job_list, signature_dict, error_dict):
+    """
+    Records the pages of the jobs built without errors in the report manifest. The status
+    and build time of every page are saved to the results store.
+    """
+    build_list = []
+    for job in job_list:
+        for s in job['section_list']:
+            pdf_path = report_pdf_path(job['sample_dir'], job['sample_id'], job['sample_name'], s)
+            built = s in job['section_seconds'] and job['sample_id'] not in error_dict
+            build_list.append((pdf_path, job['sample_id'], job['report_type'], s,
+                               'built' if built else 'failed', job['section_seconds'].get(s)))
+            if built:
+                planner.record(pdf_path, signature_dict[pdf_path])
+    planner.save()
+    results_store = ResultsStore.open_results_store(settings)
+    if results_store is not None:
+        results_store.record_report_builds(build_list)
+        results_store.close()
+
+def generate_reports(config_path=default_config_path, report_types=None, sample_patterns=None, force=False,
+                     resources=None, workers=None, dry_run=False):
+    """
+    Builds the stale PDF report pages of every sample folder in the automation workspace.
+    A page is stale when its PDF is missing or when its layout or one of its input files
+    (graphics, photos, template images) changed since it was built, see ReportPlanner.
+
+    Parameters:
+    - config_path: str
+        The config.txt file.
+    - report_types: list, optional
+        Any of 'Profile', 'Cup' and 'Flush', defaults to all of them.
+    - sample_patterns: list, optional
+        Sample_IDs, glob patterns or ranges of the sample folders to build (Flush Test
+        campaigns by their campaign ID, e.g. FT3-11), defaults to every folder.
+    - force: bool
+        Rebuild every page, even the up to date ones.
+    - resources: ReportResources, optional
+        Warm resources of an earlier batch to reuse (left open), by default they are
+        created from config_path and closed at the end.
+    - workers: int, optional
+        Number of report threads, overrides report_workers of the config file.
+    - dry_run: bool
+        Only print which pages would be rebuilt and why.
+
+    Returns:
+    - error_dict: dict
+        {sample_id: traceback} of the samples whose reports failed.
+    """
+    settings = resources.settings if resources is not None else load_report_config(config_path)
+    automation_workspace = settings['automation_workspace']
+    if report_types is None:
+        report_types = SampleSelection.report_type_list
+    if workers is None:
+        workers = settings['report_workers']
+
+    subfolders = [ f.path for f in os.scandir(automation_workspace) if f.is_dir() and 'Template' not in f.path ]
+
+    # Folder names are '{Report_Type} - {Sample_ID} - {Sample_Name}'
+    folder_id_dict = {}
+    for folder in subfolders:
+        folder_info = os.path.basename(folder).split(' - ')
+        if len(folder_info) >= 3 and SampleSelection.report_category(folder_info[0]) in report_types:
+            folder_id_dict[folder] = folder_info[1]
+    if sample_patterns is not None:
+        force = force or SampleSelection.forces_rebuild(sample_patterns)
+        selected_list = SampleSelection.expand_sample_patterns(sample_patterns, list(folder_id_dict.values()))[0]
+        folder_id_dict = {folder: folder_id for folder, folder_id in folder_id_dict.items() if folder_id in selected_list}
+
+    # Every page of the selected reports: (sample_id, sample_name, sample_dir, report_type, section)
+    page_list = []
+    for sample_dir in folder_id_dict:
+        sample_info = os.path.basename(sample_dir).split(' - ')
+        report_type = SampleSelection.report_category(sample_info[0])
+        sample_id = sample_info[1]
+        sample_name = folder_report_name(sample_dir)
+        page_list += [(sample_id, sample_name, sample_dir, report_type, s) for s in range(len(section_title_dict[report_type]))]
+        if report_type == 'Flush':
+            # An individual Flush Test gets the profile and heat map pages, its campaign every page
             ft_subfolders = [ f.path for f in os.scandir(sample_dir) if f.is_dir() ]
             for flush_dir in ft_subfolders:
-                if flush_dir == f'{sample_dir}\catboost_info':
-                    pass
-                else:
-                    os.chdir(flush_dir)   
-                    sample_info = flush_dir.split(f'{sample_dir}\\')[1]
-                    report_type = 'Flush'
-                    sample_id = sample_info
-                    print(flush_dir)
-                    generate_report(report_type, flush_dir, section_title_dict[report_type][0], 0)
-                    generate_report(report_type, flush_dir, section_title_dict[report_type][1], 1)
+                flush_id = os.path.basename(flush_dir)
+                if flush_id != 'catboost_info':
+                    page_list += [(flush_id, sample_name, flush_dir, report_type, s) for s in [0, 1]]
+
+    planner = ReportPlanner.ReportPlanner(f"{settings['incremental_state_dir']}/report_manifest.json")
+    page_plan_list, job_list, signature_dict = plan_report_jobs(settings, planner, page_list, force)
+    ReportPlanner.print_plan(page_plan_list, dry_run)
+    if dry_run or len(job_list) == 0:
+        return {}
+
+    own_resources = resources is None
+    if own_resources:
+        resources = ReportResources(settings)
+    if not settings['pdf_vector_graphics']:
+        resources.convert_pending_inkscape([job['sample_dir'] for job in job_list])
+
+    error_dict = run_report_jobs(resources, job_list, workers)
+    record_report_jobs(settings, planner, job_list, signature_dict, error_dict)
+    if own_resources:
+        resources.close()
+    return error_dict
+
+def generate_bundle_reports(config_path, bundle_list, resources=None, workers=None):
+    """
+    Builds the stale PDF report pages straight from the AssetBundles of the graphics
+    stage, without rescanning the automation workspace or reading the graphics back from
+    the sample folders. The PDFs are saved into the output_dir of every bundle.
+
+    Parameters:
+    - config_path: str
+        The config.txt file.
+    - bundle_list: list
+        AssetBundles of the regenerated samples, Flush Tests and Flush Test campaigns.
+    - resources: ReportResources, optional
+        Warm resources of an earlier batch to reuse (left open).
+    - workers: int, optional
+        Number of report threads, overrides report_workers of the config file.
+
+    Returns:
+    - error_dict: dict
+        {sample_id: traceback} of the samples whose reports failed.
+    """
+    settings = resources.settings if resources is not None else load_report_config(config_path)
+    if workers is None:
+        workers = settings['report_workers']
+
+    page_list = []
+    bundle_dict = {}
+    for asset_bundle in bundle_list:
+        report_type = SampleSelection.report_category(asset_bundle.report_type)
+        if report_type not in section_title_dict:
+            continue
+        os.makedirs(asset_bundle.output_dir, exist_ok=True)
+        bundle_dict[asset_bundle.output_dir] = asset_bundle
+        section_list = list(range(len(section_title_dict[report_type])))
+        # An individual Flush Test gets the profile and heat map pages, its campaign every page
+        if re.match(SampleSelection.flush_test_pattern, asset_bundle.sample_id):
+            section_list = [0, 1]
+        page_list += [(asset_bundle.sample_id, asset_bundle.sample_name, asset_bundle.output_dir, report_type, s)
+                      for s in section_list]
+
+    planner = ReportPlanner.ReportPlanner(f"{settings['incremental_state_dir']}/report_manifest.json")
+    page_plan_list, job_list, signature_dict = plan_report_jobs(settings, planner, page_list, bundle_dict=bundle_dict)
+    ReportPlanner.print_plan(page_plan_list)
+    if len(job_list) == 0:
+        return {}
 
+    own_resources = resources is None
+    if own_resources:
+        resources = ReportResources(settings)
+    error_dict = run_report_jobs(resources, job_list, workers)
+    record_report_jobs(settings, planner, job_list, signature_dict, error_dict)
+    if own_resources:
+        resources.close()
+    return error_dict
 
+if __name__ == '__main__':
+    # Standalone report build, the full pipeline runs through ReportGenMain.main()
+    generate_reports(sys.argv[1] if len(sys.argv) > 1 else os.environ.get('HL_CONFIG', default_config_path))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from DataTools import ContentKeys
+
+###############################################################################
+#
+# Downsampled Derivatives of the Sample Photos for Report Embedding
+#
+###############################################################################
+
+photo_extension_list = ['.png', '.jpg', '.jpeg']
+
+# Largest photo slot of the reports in mm (the -M flush photo is 56.5 x 59 mm)
+photo_slot_mm = 59
+
+# Bumped when the derivative encoding changes, invalidates every derivative
+derivative_version = 1
+
+def target_pixels(photo_dpi, slot_mm=photo_slot_mm):
+    """
+    Returns the long side in pixels of a photo printed slot_mm wide at photo_dpi.
+    """
+    return round(slot_mm / 25.4 * photo_dpi)
+
+def derivative_path(derivative_dir, source_path, target_px):
+    """
+    Returns the path of the derivative of source_path, named after its stem and a key of
+    the source path, modification time, size and target size, so a changed photo gets a
+    new derivative. Every photo folder gets its own subfolder of derivative_dir.
+    """
+    source_stat = os.stat(source_path)
+    derivative_key = ContentKeys.key_for('photo', derivative_version, os.path.abspath(source_path),
+                                         source_stat.st_mtime_ns, source_stat.st_size, target_px)
+    stem, ext = os.path.splitext(os.path.basename(source_path))
+    # PNG photos may carry transparency and stay PNG, the others are re-encoded as JPEG
+    output_ext = '.png' if ext.lower() == '.png' else '.jpg'
+    source_dir_name = os.path.basename(os.path.dirname(os.path.abspath(source_path)))
+    return os.path.join(derivative_dir, source_dir_name, f'{stem}.{derivative_key[:16]}{output_ext}')
+
+def make_derivative(source_path, output_path, target_px, jpeg_quality=85):
+    """
+    Writes source_path downsampled to at most target_px on its long side to output_path.
+    JPEGs are decoded at a reduced scale (draft mode) instead of full resolution.
+    """
+    with Image.open(source_path) as img:
+        if img.format == 'JPEG':
+            img.draft('RGB', (target_px, target_px))
+        img.thumbnail((target_px, target_px), Image.LANCZOS, reducing_gap=2.0)
+        temp_path = f'{output_path}.{os.getpid()}.tmp'
+        if output_path.endswith('.png'):
+            img.save(temp_path, 'PNG', optimize=True)
+        else:
+            img.convert('RGB').save(temp_path, 'JPEG', quality=jpeg_quality, optimize=True)
+    os.replace(temp_path, output_path)
+    return output_path
+
+def photo_index(image_dir_list):
+    """
+    Returns {'{image_dir}/{stem}.png': source_path} of every photo in the image folders,
+    the PNG/JPG fallback resolved once: a PNG is preferred over a JPG of the same stem.
+    """
+    index_dict = {}
+    for image_dir in image_dir_list:
+        if not os.path.isdir(image_dir):
+            continue
+        for entry in os.scandir(image_dir):
+            stem, ext = os.path.splitext(entry.name)
+            if not entry.is_file() or ext.lower() not in photo_extension_list:
+                continue
+            photo_name = f'{image_dir}/{stem}.png'
+            indexed_path = index_dict.get(photo_name)
+            if indexed_path is None or (photo_extension_list.index(ext.lower())
+                                        < photo_extension_list.index(os.path.splitext(indexed_path)[1].lower())):
+                index_dict[photo_name] = entry.path
+    return index_dict
+
+def generate_derivatives(image_dir_list, derivative_dir, photo_dpi=200, workers=None):
+    """
+    Creates the missing derivatives of every photo in the image folders, spread over a
+    pool of worker processes, and removes the derivatives of changed photos.
+
+    Parameters:
+    - image_dir_list: list
+        The photo folders (profile_images_dir, flush_images_dir).
+    - derivative_dir: str
+        The folder holding the derivatives.
+    - photo_dpi: int
+        Resolution of the photos in their report slots.
+    - workers: int, optional
+        Number of worker processes, defaults to the number of CPUs.
+
+    Returns:
+    - derivative_dict: dict
+        {'{image_dir}/{stem}.png': derivative_path} of every photo whose derivative exists.
+    """
+    start_time = time.perf_counter()
+    target_px = target_pixels(photo_dpi)
+    derivative_dict = {}
+    pending_list = []
+    failed_list = []
+    for photo_name, source_path in photo_index(image_dir_list).items():
+        output_path = derivative_path(derivative_dir, source_path, target_px)
+        derivative_dict[photo_name] = output_path
+        if not os.path.exists(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            pending_list.append((photo_name, source_path, output_path))
+    if len(pending_list) == 0:
+        return derivative_dict
+
+    def finish(photo_name, source_path, output_path, error):
+        if error is not None:
+            print(f'Photo derivative of {source_path} failed ({error}), using the original')
+            derivative_dict[photo_name] = source_path
+            failed_list.append(source_path)
+            return
+        # Remove the derivatives of earlier versions of the photo
+        stale_pattern = re.compile(rf'{re.escape(os.path.splitext(os.path.basename(source_path))[0])}\.[0-9a-f]{{16}}\.(png|jpg)')
+        for entry in os.scandir(os.path.dirname(output_path)):
+            if stale_pattern.fullmatch(entry.name) and entry.path != output_path:
+                os.remove(entry.path)
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(pending_list) <= 1:
+        for photo_name, source_path, output_path in pending_list:
+            try:
+                make_derivative(source_path, output_path, target_px)
+                finish(photo_name, source_path, output_path, None)
+            except Exception as error:
+                finish(photo_name, source_path, output_path, error)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending_list))) as executor:
+            future_list = [(pending, executor.submit(make_derivative, pending[1], pending[2], target_px)) for pending in pending_list]
+            for (photo_name, source_path, output_path), future in future_list:
+                try:
+                    future.result()
+                    finish(photo_name, source_path, output_path, None)
+                except Exception as error:
+                    finish(photo_name, source_path, output_path, error)
+    print(f'PHOTO DERIVATIVES: {len(pending_list) - len(failed_list)} of {len(derivative_dict)} photos downsampled to {target_px} px '
+          f'in {time.perf_counter() - start_time:.1f}s')
+    return derivative_dict
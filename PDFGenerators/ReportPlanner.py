@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+###############################################################################
+#
+# Make-Like Planner of the Report Pages: Input Digests Recorded per PDF
+#
+###############################################################################
+
+# Bumped when the page assembly changes in a way the layouts do not show, rebuilds every page
+layout_version = 1
+
+# Start of the plan reason of a page that cannot be built
+blocked_prefix = 'blocked'
+
+def layout_key(*layout_parts):
+    """
+    Returns a digest of everything describing the page besides its input files: the
+    placements, the section title and the report options.
+    """
+    return hashlib.sha1(json.dumps([layout_version, *layout_parts], default=str).encode('utf-8')).hexdigest()
+
+class ReportPlanner:
+    """
+    Decides which report pages are stale. Every built PDF is recorded in a manifest
+    with the digest of its layout and of every input file (SVGs, photos, templates);
+    a page is rebuilt when its PDF is missing, its layout changed or one of its inputs
+    changed. File digests are memoized by modification time and size, so unchanged
+    files are not read again.
+
+    Parameters:
+    - manifest_path: str
+        The JSON manifest, kept next to the incremental state.
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        # {pdf_path: {'layout', 'inputs': {path: digest}, 'built_at'}}
+        self.page_dict = manifest.get('pages', {})
+        # {path: [mtime_ns, size, digest]}
+        self.file_dict = manifest.get('files', {})
+
+    def file_digest(self, input_path, input_data=None):
+        """
+        Returns the content digest of an input file (None when it is missing), or of
+        input_data when the input is held in memory.
+        """
+        if input_data is not None:
+            return hashlib.sha1(input_data).hexdigest()
+        try:
+            input_stat = os.stat(input_path)
+        except FileNotFoundError:
+            return None
+        memo = self.file_dict.get(input_path)
+        if memo is not None and memo[0] == input_stat.st_mtime_ns and memo[1] == input_stat.st_size:
+            return memo[2]
+        input_digest = hashlib.sha1()
+        with open(input_path, 'rb') as input_file:
+            for chunk in iter(lambda: input_file.read(1 << 20), b''):
+                input_digest.update(chunk)
+        self.file_dict[input_path] = [input_stat.st_mtime_ns, input_stat.st_size, input_digest.hexdigest()]
+        return input_digest.hexdigest()
+
+    def page_signature(self, page_layout_key, input_list, asset_bundle=None):
+        """
+        Returns the signature of a page: its layout key and the digest of every input path,
+        inputs held by asset_bundle digested from memory.
+        """
+        input_dict = {}
+        for input_path in input_list:
+            input_data = None
+            if asset_bundle is not None:
+                input_data = asset_bundle.get(os.path.basename(input_path))
+            input_dict[input_path] = self.file_digest(input_path, input_data)
+        return {'layout': page_layout_key, 'inputs': input_dict}
+
+    def stale_reason(self, pdf_path, signature, force=False):
+        """
+        Returns why the page has to be rebuilt, or None when its PDF is up to date.
+        """
+        if force:
+            return 'forced'
+        if not os.path.exists(pdf_path):
+            return 'pdf missing'
+        recorded = self.page_dict.get(pdf_path)
+        if recorded is None:
+            return 'not built by the planner'
+        if recorded['layout'] != signature['layout']:
+            return 'layout changed'
+        changed_list = [os.path.basename(input_path) for input_path, input_digest in signature['inputs'].items()
+                        if recorded['inputs'].get(input_path, '') != input_digest]
+        if len(changed_list) > 0:
+            return f"inputs changed: {', '.join(changed_list)}"
+        return None
+
+    def missing_reason(self, signature, required_list):
+        """
+        Returns why the page cannot be built when one of the required_list inputs is
+        missing, or None. Such a page is not rebuilt with placeholders.
+        """
+        missing_list = [os.path.basename(input_path) for input_path in required_list
+                        if signature['inputs'].get(input_path) is None]
+        if len(missing_list) > 0:
+            return f"{blocked_prefix}, inputs missing: {', '.join(missing_list)}"
+        return None
+
+    def record(self, pdf_path, signature):
+        self.page_dict[pdf_path] = dict(signature, built_at=datetime.now().strftime('%Y%m%d-%H%M%S'))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        temp_path = f'{self.manifest_path}.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump({'pages': self.page_dict, 'files': self.file_dict}, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+def is_blocked(reason):
+    return reason is not None and reason.startswith(blocked_prefix)
+
+def print_plan(page_plan_list, dry_run=False):
+    """
+    Prints the stale and the blocked pages with the reason, and how many pages are up to date.
+
+    Parameters:
+    - page_plan_list: list
+        (pdf_path, reason) of every planned page, reason None when it is up to date.
+    """
+    stale_list = [(pdf_path, reason) for pdf_path, reason in page_plan_list if reason is not None and not is_blocked(reason)]
+    blocked_list = [(pdf_path, reason) for pdf_path, reason in page_plan_list if is_blocked(reason)]
+    print(f"REPORT PLAN: {len(stale_list)} of {len(page_plan_list)} pages {'would be ' if dry_run else ''}rebuilt, "
+          f"{len(blocked_list)} blocked")
+    for pdf_path, reason in stale_list + blocked_list:
+        print(f'  {os.path.basename(pdf_path)}: {reason}')
@@ -10,13 +10,17 @@ Created on Wed Dec 28 11:46:33 2022
 
 import pandas as pd
 import numpy as np
-import pygsheets
 from datetime import datetime
 import os
+import re
+import argparse
+import traceback
 import configparser
-from SVGGenerators import ChemProfGraphGen, ChemProfTableGen, FullFlushPieGen, HeatmapGen, IndivFlushGen
-from MLTools import MLFeatureModeling, CatBoostReg 
+from contextlib import nullcontext
+from SVGGenerators import ChemProfGraphGen, ChemProfTableGen, FullFlushPieGen, HeatmapGen, IndivFlushGen, GraphicsBatch, RenderService, AssetBundle
+from MLTools import MLFeatureModeling, CatBoostReg, ModelCache
 from PDFGenerators import PDFGen
+from DataTools import MgGConversion, StatsEngine, SampleIndex, SheetCache, IncrementalTracker, SheetWriteBack, SheetSchema, SampleSelection, ResultsStore, SheetArchive
 
 def convert_ppm_mg_g(sample_id, sample_wt, extraction_vol, extract_dil, compound_ppm):
     """
@@ -70,7 +74,8 @@ def load_worksheet_from_gsheet(service_file_path, gsheet_key, sheet_name):
     - loaded_df: pandas DataFrame
         The DataFrame containing the data from the specified sheet.
     """
-    # Authorize Google Sheets API with credentials file
+    # Authorize Google Sheets API with credentials file, pygsheets is only needed when the Google Sheet is used
+    import pygsheets
     google_credentials = pygsheets.authorize(service_file=service_file_path)
     
     # Open the Google Spreadsheet
@@ -112,48 +117,37 @@ def save_archive_worksheet(loaded_df, loaded_spreadsheet):
     new_worksheet.frozen_rows = 1
     new_worksheet.frozen_cols = 2
 
-def calculate_mg_g_values(loaded_df, sample_id):
+def calculate_mg_g_values(loaded_df, sample_id, sample_index=None, apply_dilution=False):
     """
-    Returns a new DataFrame containing only the rows where the 'Sample_ID'
-    column contains the given search term. It then calculates the 'mg_g'
-    values for the selected rows using the 'ppm' values and returns the
-    updated DataFrame.
+    Calculates the 'mg_g' values of the rows belonging to sample_id (the exact
+    'Sample_ID' and all of its replicates) using the 'ppm' values and returns
+    the updated DataFrame.
 
     Parameters:
     - loaded_df: pandas DataFrame
         The DataFrame to search and update.
-    - sample_list: list
-        The search term to use when selecting rows.
+    - sample_id: str
+        The Sample_ID (or parent ID of the replicates) to update.
+    - sample_index: SampleIndex.SampleIndex, optional
+        A prebuilt index of loaded_df, built on the fly when not given.
+    - apply_dilution: bool
+        Multiply the mg/g values by Extract_Dilution_Factor (default False).
 
     Returns:
     - updated_df: pandas DataFrame
         The updated DataFrame with 'mg_g' values calculated for the selected rows.
     """
     
-    # get a list of column names that contain 'ppm'
-    ppm_col_list = [col for col in loaded_df.columns if 'ppm' in col]
-
-    # get a list of column names that contain 'mg_g'
-    mg_g_col_list = [col for col in loaded_df.columns if 'mg_g' in col]
-
-    mg_g_mean_col_list = [col.replace('mg_g','mg_g_MEAN') for col in loaded_df.columns if 'mg_g' in col]
-    mg_g_SD_col_list = [col.replace('mg_g','mg_g_SD') for col in loaded_df.columns if 'mg_g' in col]
-
-    # create a new dataframe containing only the rows where 'Sample_ID' contains the search term
-    specific_sample_df = loaded_df[loaded_df['Sample_ID'].str.contains(sample_id)].copy()
+    # Convert only the rows of the sample and its replicates
+    if sample_index is None:
+        sample_index = SampleIndex.SampleIndex(loaded_df)
+    sample_rows = sample_index.sample_mask(sample_id)
+    updated_df, error_mask = MgGConversion.calculate_all_mg_g_values(loaded_df, rows=sample_rows,
+                                                                       apply_dilution=apply_dilution)
 
-    for r, replicate in specific_sample_df.iterrows():
-        extraction_vol = replicate['Sonication_Solvent_Volume']
-        extract_dil = replicate['Extract_Dilution_Factor']
-        sample_wt = replicate['Processed_Amount']
-        for i, ppm_col in enumerate(ppm_col_list):
-            compound_ppm = replicate[ppm_col]
-            compound_mg_g = convert_ppm_mg_g(sample_id, sample_wt, extraction_vol, extract_dil, compound_ppm)
-            specific_sample_df.loc[r, mg_g_col_list[i]] = compound_mg_g
-
-    # update the original DataFrame with the updated rows
-    updated_df = loaded_df.copy()
-    updated_df.update(specific_sample_df)
+    error_df = MgGConversion.mg_g_error_report(updated_df, error_mask)
+    if len(error_df) > 0:
+        print(f'{sample_id} has {len(error_df)} mg/g values that could not be converted:\n{error_df}')
 
     return updated_df
 
@@ -196,42 +190,24 @@ def stats_df_generator(df):
 
 
 def mean_df_generator(df, sample_id, sample_name):
-    df = df.reset_index()
-    df = df.drop(columns=['index'])
-    # create a new empty DataFrame with the same columns as the original DataFrame
-    mean_df = pd.DataFrame(columns=df.columns)
-    # reindex the new DataFrame to set the same column order as the original DataFrame
-    mean_df = mean_df.reindex(columns=df.columns)
-    # fill the first row with None values
-    mean_df.loc[0] = [None] * len(mean_df.columns)
-    for c, column in enumerate(df.columns):
-        for r, row in df.iterrows():
-            value = row[column]
-            if r == 0:
-                if isinstance(value, str) or column =='Generation_Date' or column =='Date_Processed':
-                    string_value = value
-                    # Store string_value in first row of mean_df[column]
-                    mean_df.iloc[0, c] = string_value
-        if df[column].dtype == 'str' or column =='Generation_Date' or column =='Date_Processed':
-            pass
-        else:
-            try:
-                df[column]  = df[column].replace('', 0)    
-                col_mean = df[column].mean()
-                #print(col_mean)
-                # Store col_mean in first row of mean_df[column]
-                mean_df.iloc[0, c] = col_mean
-            except TypeError:
-                print(f'TypeError: {column}')    
-    mean_df = mean_df.assign(
-        Sample_ID=pd.Series(sample_id, dtype='object'),
-        Sample_Name=pd.Series(sample_name, dtype='object'),
-        Generation_Date=pd.Series(df.iloc[0, 7], dtype='object'),
-        Date_Processed=pd.Series(df.iloc[0, 8], dtype='object'),
-        Lab_Description=pd.Series(df.iloc[0, 14], dtype='object'),
-        Homogenized_Description=pd.Series(df.iloc[0, 15], dtype='object'))
-    return(mean_df)
+    """
+    Returns a one-row DataFrame with the mean of every numeric column of df and the text
+    and date fields of its first replicate.
+
+    Parameters:
+    - df: pandas DataFrame
+        The replicate rows to average.
+    - sample_id: str
+        The Sample_ID of the mean row.
+    - sample_name: str
+        The Sample_Name of the mean row.
 
+    Returns:
+    - mean_df: pandas DataFrame
+        The aggregate row with the same columns as df.
+    """
+    mean_df = StatsEngine.aggregate_group_means(df, [sample_id] * len(df), {sample_id: sample_name})
+    return(mean_df)
 
 ###############################################################################
 #
@@ -239,188 +215,529 @@ def mean_df_generator(df, sample_id, sample_name):
 #
 ###############################################################################
 
-# Use Python's built-in configparser library to parse the variables in the config.txt file
-config = configparser.ConfigParser()
-config.read('C:/Users/theda/OneDrive/Documents/Python/HL/config.txt')
+# Used when neither --config nor the HL_CONFIG environment variable is given: config.txt next to this file
+default_config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.txt')
 
-automation_workspace = config.get('DEFAULT', 'automation_workspace')
-template_dir = config.get('DEFAULT', 'template_dir')
-service_file_path = config.get('DEFAULT', 'service_file_path')
-gsheet_key = config.get('DEFAULT', 'gsheet_key')
-sheet_name = config.get('DEFAULT', 'sheet_name')
+pipeline_stage_list = ['graphics', 'reports']
 
+def read_pipeline_config(config_path):
+    """
+    Returns the settings of the config.txt file (see README.md) as a dictionary.
+    """
+    # Use Python's built-in configparser library to parse the variables in the config.txt file
+    config = configparser.ConfigParser()
+    if len(config.read(config_path)) == 0:
+        raise FileNotFoundError(f'Config file not found: {config_path}')
+
+    template_dir = config.get('DEFAULT', 'template_dir')
+    return {'automation_workspace': config.get('DEFAULT', 'automation_workspace'),
+            'template_dir': template_dir,
+            'service_file_path': config.get('DEFAULT', 'service_file_path'),
+            'gsheet_key': config.get('DEFAULT', 'gsheet_key'),
+            'sheet_name': config.get('DEFAULT', 'sheet_name'),
+            'local_sheet_dir': config.get('DEFAULT', 'local_sheet_dir', fallback=None),
+            'sheet_cache_dir': config.get('DEFAULT', 'sheet_cache_dir', fallback=f'{template_dir}/Sheet Cache'),
+            'incremental_state_dir': config.get('DEFAULT', 'incremental_state_dir', fallback=f'{template_dir}/Incremental State'),
+            'apply_dilution': config.getboolean('DEFAULT', 'apply_dilution', fallback=False),
+            'write_back_mg_g': config.getboolean('DEFAULT', 'write_back_mg_g', fallback=False),
+            'graphics_workers': config.getint('DEFAULT', 'graphics_workers', fallback=1),
+            'render_sessions': config.getint('DEFAULT', 'render_sessions', fallback=1),
+            'render_cache_dir': config.get('DEFAULT', 'render_cache_dir', fallback=f'{template_dir}/Render Cache'),
+            'render_cache_mb': config.getint('DEFAULT', 'render_cache_mb', fallback=500),
+            'in_memory_assets': config.getboolean('DEFAULT', 'in_memory_assets', fallback=False),
+            'keep_asset_files': config.getboolean('DEFAULT', 'keep_asset_files', fallback=False),
+            'store_results': config.getboolean('DEFAULT', 'store_results', fallback=True),
+            'results_db': config.get('DEFAULT', 'results_db', fallback=f'{template_dir}/Results/results.sqlite'),
+            'archive_sheet': config.getboolean('DEFAULT', 'archive_sheet', fallback=True),
+            'archive_dir': config.get('DEFAULT', 'archive_dir', fallback=f'{template_dir}/Sheet Archive'),
+            'model_cache_dir': config.get('DEFAULT', 'model_cache_dir', fallback=f'{template_dir}/Model Cache'),
+            'model_threads': config.getint('DEFAULT', 'model_threads', fallback=-1),
+            'model_iterations': config.getint('DEFAULT', 'model_iterations', fallback=1000),
+            'model_early_stopping_rounds': config.getint('DEFAULT', 'model_early_stopping_rounds', fallback=50),
+            'model_time_budget': config.getfloat('DEFAULT', 'model_time_budget', fallback=0)}
+
+def load_sample_sheet(settings, force_refresh=False):
+    """
+    Loads the sample sheet (from the snapshot cache when its revision is unchanged),
+    applies the typed schema and indexes the Sample_IDs.
 
-# Load Main Dataframe
-try:
-    print('DATAFRAME LOADED')
-    print(loaded_df.head(1))
-except NameError:
+    Returns:
+    - sheet_backend: SheetCache.PygsheetsBackend or SheetCache.LocalFileBackend
+        The backend the sheet was loaded from, reused for the write-back.
+    - loaded_df: pandas DataFrame
+        The typed sample sheet.
+    - sample_index: SampleIndex.SampleIndex
+        The index of loaded_df.
+    - raw_df: pandas DataFrame
+        The sheet as loaded, before the schema was applied.
+    - sheet_revision: str
+        The revision of the sheet the rows were loaded from.
+    """
+    # Load Main Dataframe, downloading the sheet only when its revision changed
     print('LOADING DATAFRAME')
-    loaded_df, loaded_spreadsheet = load_worksheet_from_gsheet(service_file_path,gsheet_key,sheet_name)
+    if settings['local_sheet_dir'] is not None:
+        sheet_backend = SheetCache.LocalFileBackend(settings['local_sheet_dir'])
+    else:
+        sheet_backend = SheetCache.PygsheetsBackend(settings['service_file_path'])
+    loaded_df, snapshot_info = SheetCache.load_worksheet_cached(sheet_backend, settings['gsheet_key'], settings['sheet_name'],
+                                                                settings['sheet_cache_dir'], force_refresh)
+    print(f"DATAFRAME LOADED FROM {snapshot_info['source'].upper()}")
 
-# Create a Copy of the Loaded Dataframe
-try:
-    print('UPDATED DATAFRAME LOADED')
-    print(updated_df.head(1))
-except NameError:
-    print('UPDATING LOADED DATAFRAME')
-    # Save an Arhcive of the Loaded Dataframe
-    #save_archive_worksheet(updated_df, loaded_spreadsheet)
-    
-    # create a duplicate dataframe
-    updated_df = loaded_df
-    
-    # Generate List of All Samples in loaded_df
-    sample_list = loaded_df['Sample_ID'].tolist()
+    # Coerce every column to its declared dtype once, failed cells are reported and set blank
+    raw_df = loaded_df
+    loaded_df, schema_validation_df = SheetSchema.apply_schema(raw_df)
+    SheetSchema.print_schema_report(raw_df, loaded_df, schema_validation_df)
+
+    # Index every Sample_ID, replicate and Flush Test position once
+    sample_index = SampleIndex.SampleIndex(loaded_df)
+    return sheet_backend, loaded_df, sample_index, raw_df, snapshot_info['revision']
+
+def select_samples(loaded_df, sample_index, sample_patterns, report_types):
+    """
+    Returns the (non Flush Test) samples matching the command line patterns whose
+    Report_Type is one of report_types.
+    """
+    candidate_list = [group_id for group_id in sample_index.group_ids()
+                      if not re.match(SampleSelection.flush_test_pattern, group_id)]
+    sample_list, unmatched_list = SampleSelection.expand_sample_patterns(sample_patterns, candidate_list)
+    if len(unmatched_list) > 0:
+        print(f'No samples match: {", ".join(unmatched_list)}')
+    report_type_dict = {sample_id: loaded_df['Report_Type'].iloc[sample_index.replicate_positions(sample_id)[0]]
+                        for sample_id in sample_list}
+    return [sample_id for sample_id in sample_list
+            if SampleSelection.report_category(str(report_type_dict[sample_id])) in report_types]
+
+def select_flush_tests(settings, sample_index, flush_range, report_types):
+    """
+    Returns the Flush Tests and the ID of the Flush Test campaign of flush_range, ([], None)
+    when no range is given or Flush reports are not requested.
+    """
+    if flush_range is None or 'Flush' not in report_types:
+        return [], None
+    ft_start, ft_end = flush_range
+    ft_list = SampleSelection.flush_test_list(ft_start, ft_end)
+    missing_list = [ft for ft in ft_list if len(sample_index.replicate_positions(ft)) == 0]
+    if len(missing_list) > 0:
+        raise ValueError(f'Flush Tests not found in {settings["sheet_name"]}: {", ".join(missing_list)}')
+    return ft_list, f'FT{ft_start}-{ft_end}'
+
+def plan_incremental_run(loaded_df, sample_index, automation_workspace, tracker_state, sample_list,
+                         ft_list, ft_campaign_id, force=False, apply_dilution=False):
+    """
+    Hashes the replicate rows of every selected Sample and Flush Test, compares them with
+    the last run and returns which of them have to be reprocessed. Turning on
+    apply_dilution changes every hash, so the mg/g values are recalculated.
+
+    Returns:
+    - current_hashes: dict
+        {group_id: hash} of every Sample, Flush Test and the Flush Test campaign.
+    - processed_dict: dict
+        {group_id: reason} of the groups to reprocess.
+    - skipped_list: list
+        The unchanged groups.
+    """
+    # Hash the replicate rows of every Sample and Flush Test and compare with the last run
+    settings_key = 'apply_dilution' if apply_dilution else ''
+    current_hashes = IncrementalTracker.sample_hashes(loaded_df, sample_index, sample_list + ft_list, settings_key)
+    if len(ft_list) > 0:
+        current_hashes[ft_campaign_id] = IncrementalTracker.combined_hash([current_hashes[ft] for ft in ft_list])
+
+    processed_dict = {}
+    skipped_list = []
+    for sample_id in sample_list + ft_list:
+        first_replicate = loaded_df.iloc[sample_index.replicate_positions(sample_id)[0]]
+        if sample_id in ft_list:
+            output_dir = f"{automation_workspace}/Flush - {ft_campaign_id} - {first_replicate['Cultivar']}/{sample_id}"
+            graphic_types = IncrementalTracker.flush_graphic_types
+        else:
+            output_dir = f"{automation_workspace}/{first_replicate['Report_Type']} - {sample_id} - {first_replicate['Sample_Name']}"
+            graphic_types = IncrementalTracker.profile_graphic_types
+        outputs_present = IncrementalTracker.outputs_exist(tracker_state, output_dir, sample_id, graphic_types)
+        reason = IncrementalTracker.needs_processing(tracker_state, sample_id, current_hashes[sample_id], outputs_present)
+        if force:
+            reason = reason or 'forced'
+        if reason is None:
+            skipped_list.append(sample_id)
+        else:
+            processed_dict[sample_id] = reason
+    # The all-flush aggregate needs every Flush Test of the campaign when any of them changed
+    if len(ft_list) > 0:
+        ft_campaign_reason = IncrementalTracker.needs_processing(tracker_state, ft_campaign_id, current_hashes[ft_campaign_id], True)
+        if force:
+            ft_campaign_reason = ft_campaign_reason or 'forced'
+        if ft_campaign_reason is not None or any(ft in processed_dict for ft in ft_list):
+            processed_dict[ft_campaign_id] = ft_campaign_reason or 'flush test outputs missing'
+    IncrementalTracker.print_skip_summary(processed_dict, skipped_list)
+    return current_hashes, processed_dict, skipped_list
+
+def profile_graphics_task(sample_id, sample_stats_df, automation_workspace, stored_stats=None):
+    """
+    Returns the graphics task of one Profile or Cup sample, written into its sample folder.
+    stored_stats are the statistics read from the results store when the sample was not
+    recomputed.
+    """
+    # Look up the precomputed Stats of the Sample
+    if stored_stats is None:
+        stored_stats = StatsEngine.lookup_sample_stats(sample_stats_df, sample_id)
+    sample_info_df, full_compound_list, full_mean_data, full_sd_data = stored_stats
     
-    # Calculate mg/g values for all Compounds
-    for sample in sample_list:
-        sample_id = sample
-        updated_df = calculate_mg_g_values(updated_df, sample_id)
+    sample_name = sample_info_df['Sample_Name']
+    report_type = sample_info_df['Report_Type']
     
-    # Save an Updated Dataframe to the Google Sheet
-    # PLACEHOLDER FUNCTION
+    sample_folder = f'{automation_workspace}/{report_type} - {sample_id} - {sample_name}'
+    return GraphicsBatch.graphics_task(sample_id, sample_name, sample_info_df, full_compound_list,
+                                       full_mean_data, full_sd_data, sample_folder, report_type=report_type)
 
+def flush_test_folder(automation_workspace, ft_campaign_id, sample_info_df):
+    return f"{automation_workspace}/Flush - {ft_campaign_id} - {sample_info_df['Cultivar']}"
 
-# SAMPLE LIST PLACEHOLDER Set Sample ID List to work with
-sample_list = ['HLO126', 'HLO127', 'HLO128', 'HLO129']
+def flush_test_graphics_task(ft, updated_df, sample_index, sample_stats_df, automation_workspace, ft_campaign_id):
+    """
+    Returns the graphics task of one Flush Test, written into its folder of the campaign.
+    """
+    # Select the replicates of the Flush Test (FT3A, FT3B, ...) from the index
+    specific_sample_df = sample_index.replicate_df(updated_df, ft)
+    # Look up the precomputed Stats of the Flush Test
+    sample_info_df, full_compound_list, full_mean_data, full_sd_data = StatsEngine.lookup_sample_stats(sample_stats_df, ft)
+    sample_name = sample_info_df['Sample_Name'].split(' Position')[0]
+    campaign_folder = flush_test_folder(automation_workspace, ft_campaign_id, sample_info_df)
+    # The reports are named after the campaign folder, as when they are built from the sample folders
+    return GraphicsBatch.graphics_task(ft, sample_name, sample_info_df, full_compound_list,
+                                       full_mean_data, full_sd_data, f'{campaign_folder}/{ft}', specific_sample_df, 'Flush',
+                                       PDFGen.folder_report_name(campaign_folder))
+
+def generate_flush_campaign_graphics(updated_df, sample_index, sample_stats_df, automation_workspace, ft_start, ft_end,
+                                     render_sessions=1, in_memory=False, keep_files=False, results_store=None):
+    """
+    Generates the all-flush aggregate graphics of the Flush Test campaign FT{ft_start}-{ft_end}
+    from the rows of all of its Flush Tests. The replicate aggregates and the feature
+    importances of the campaign are saved to results_store when given.
 
-for sample_id in sample_list:
+    Returns:
+    - asset_bundle: AssetBundle.AssetBundle
+        The graphics of the campaign when in_memory, None when they were written to its folder.
+    """
+    ft_list = SampleSelection.flush_test_list(ft_start, ft_end)
+    ft_campaign_id = f'FT{ft_start}-{ft_end}'
 
-    # Set Sample ID to work with
-    #sample_id = 'HLO124'
+    ft_df = pd.DataFrame(columns=['Sample_ID','Bin_ID','Flush_ID','Position','Sample_Mass_g','PCB_PCN_SUM_mg_g'])
     
-    # Create a new DataFrame containing only the rows where 'Sample_ID' contains the search term
-    specific_sample_df = updated_df[updated_df['Sample_ID'].str.contains(sample_id)].copy()
-
-    # Generate Stats Dataframe
-    sample_info_df, full_compound_list, full_mean_data, full_sd_data = stats_df_generator(specific_sample_df)
+    total_df = pd.DataFrame(columns=updated_df.columns)
     
-    sample_name = sample_info_df['Sample_Name']
-    report_type = sample_info_df['Report_Type']
+    for ft in ft_list:
+        # Select the replicates of the Flush Test (FT3A, FT3B, ...) from the index
+        specific_sample_df = sample_index.replicate_df(updated_df, ft)
+        sample_info_df = StatsEngine.lookup_sample_stats(sample_stats_df, ft)[0]
+        campaign_folder = flush_test_folder(automation_workspace, ft_campaign_id, sample_info_df)
+        # Bin, Flush and Position (1-5: [NW, NE, C, SW, SE]) parsed by the index
+        flush_info_df = sample_index.flush_info(ft)
+        position_list = flush_info_df['Position'].tolist()
+        sample_id = flush_info_df['Sample_ID'].tolist()
+        bin_id = flush_info_df['Bin_ID'].tolist()
+        flush_id = flush_info_df['Flush_ID'].tolist()
+        pcb_pcn_sum = [round(specific_sample_df.loc[i, 'Psilocybin_mg_g'] + specific_sample_df.loc[i, 'Psilocin_mg_g'],1) for i in specific_sample_df.index]
+        sample_mass = [replicate[1]['Sample_Weight_(g)'] for replicate in specific_sample_df.iterrows()]
+        fruit_pcb_pcn = [0]*len(pcb_pcn_sum)
+        data_dict = {'Sample_ID' : sample_id,
+                      'Bin_ID' : bin_id,
+                      'Flush_ID' : flush_id,
+                      'Position' : position_list,
+                      'Sample_Mass_g' : sample_mass,
+                      'PCB_PCN_SUM_mg_g' : pcb_pcn_sum,
+                      'Fruit_PCB+PCN_mg' : fruit_pcb_pcn}
+        df = pd.DataFrame(data=data_dict)    
+        data= [ft_df, df]
+        ft_df = pd.concat(data)
+        total_df = pd.concat([total_df, specific_sample_df])
     
-    sample_folder = f'{automation_workspace}/{report_type} - {sample_id} - {sample_name}'
+    # Generate Nuanced and Broad Dataframes
+    # Work on ft_df for graphics/tables
+    os.makedirs(campaign_folder, exist_ok=True)
     
-    # Check if the folder exists
-    if not os.path.exists(sample_folder):
-        # Create the folder if it doesn't exist
-        os.makedirs(sample_folder)
+    sample_info_df, full_compound_list, full_mean_data, full_sd_data = stats_df_generator(total_df)    
     
-    # Change the current working directory to the folder
-    os.chdir(sample_folder)
+    pre_flush_mean_df = total_df.reset_index().drop(columns=['index'])
     
-    # Generate Page Topper Table containing Sample ID & Name
-    ChemProfTableGen.item_id_table_generator(sample_id, sample_name)
+    sample_id = ft_campaign_id
+    sample_name = 'All Flushes Mean'
     
-    # Generate Sample Information Table
-    ChemProfTableGen.profile_table_generator(sample_id, sample_name, sample_info_df)
+    all_flush_mean_df = mean_df_generator(pre_flush_mean_df, sample_id, sample_name)
     
-    # Generate Donut Graphic, Legend Table, and Dosage Table
-    ChemProfGraphGen.profile_graphics_generator(sample_id, sample_name, full_compound_list, full_mean_data, full_sd_data)
-
-
-# Comparing bin vs position vs mass vs flush effects on PCB+PCN mg/g
-ft_start = 3
-
-ft_count = ft_start
-
-ft_end = 11
-
-ft_list = []
-
-while ft_count <= ft_end:
-    ft_list.append(f'FT{ft_count}')
-    ft_count+=1
-
-ft_df = pd.DataFrame(columns=['Sample_ID','Bin_ID','Flush_ID','Position','Sample_Mass_g','PCB_PCN_SUM_mg_g'])
+    
+    sample_info_df, full_compound_list, full_mean_data, full_sd_data = stats_df_generator(all_flush_mean_df)  
+    
+    asset_bundle = None
+    if in_memory:
+        asset_bundle = AssetBundle.AssetBundle(sample_id, PDFGen.folder_report_name(campaign_folder), 'Flush', campaign_folder,
+                                               write_files=keep_files)
+
+    # All figures of the campaign are rendered together in one Kaleido batch
+    with asset_bundle or nullcontext(), RenderService.FigureBatch(render_sessions):
+        # Generate Page Topper Table containing Sample ID & Name
+        ChemProfTableGen.item_id_table_generator(sample_id, sample_name, output_dir=campaign_folder)
+        # Generate Sample Information Table
+        ChemProfTableGen.profile_table_generator(sample_id, sample_name, sample_info_df, output_dir=campaign_folder)    
+        # Generate Donut Graphic, Legend Table, and Dosage Table
+        ChemProfGraphGen. profile_graphics_generator(sample_id, sample_name, full_compound_list, full_mean_data, full_sd_data, output_dir=campaign_folder)
+        # Generate Nuanced and Broad Flush Pies and Table
+        importance_dict = FullFlushPieGen.broad_nuanced_pie_generator(ft_start, ft_end, ft_df, output_dir=campaign_folder)
+    if results_store is not None:
+        results_store.store_flush_campaign(ft_campaign_id, ft_df)
+        results_store.store_importances(ft_campaign_id, importance_dict)
+    return asset_bundle
+
+def run_graphics_stage(settings, sample_patterns, flush_range=None, report_types=None, force=False, force_refresh=False,
+                       workers=None, bundle_dict=None):
+    """
+    Loads the sample sheet once, converts the mg/g values of the selected samples and
+    generates their graphics, skipping samples that did not change since the last run.
+    When bundle_dict is given the graphics are kept in memory and {group_id: AssetBundle}
+    of the regenerated groups is collected into it.
 
-total_df = pd.DataFrame(columns=updated_df.columns)
+    Returns:
+    - processed_list: list
+        The Samples, Flush Tests and Flush Test campaign that were reprocessed.
+    """
+    if report_types is None:
+        report_types = SampleSelection.report_type_list
+    if workers is None:
+        workers = settings['graphics_workers']
+    automation_workspace = settings['automation_workspace']
+    sheet_backend, loaded_df, sample_index, raw_df, sheet_revision = load_sample_sheet(settings, force_refresh)
+
+    # Archive the rows that changed since the last archived version (replaces save_archive_worksheet), as loaded from the sheet
+    if settings['archive_sheet']:
+        SheetArchive.SheetArchive(settings['archive_dir']).save(raw_df, f"{settings['sheet_name']} revision {sheet_revision}")
+
+    # Selected Samples, the Flush Test campaign only when a range is given and Flush reports are requested
+    sample_list = select_samples(loaded_df, sample_index, sample_patterns, report_types)
+    ft_list, ft_campaign_id = select_flush_tests(settings, sample_index, flush_range, report_types)
+
+    tracker_state_path = f"{settings['incremental_state_dir']}/sample_hashes.json"
+    tracker_state = IncrementalTracker.load_state(tracker_state_path)
+    current_hashes, processed_dict, skipped_list = plan_incremental_run(loaded_df, sample_index, automation_workspace, tracker_state,
+                                                                        sample_list, ft_list, ft_campaign_id, force,
+                                                                        settings['apply_dilution'])
+    if len(processed_dict) == 0:
+        return []
+
+    # Samples whose rows did not change since they were stored (e.g. deleted graphics) reuse the stored statistics
+    results_store = ResultsStore.open_results_store(settings)
+    stored_stats_dict = {}
+    if results_store is not None:
+        for sample_id in sample_list:
+            if processed_dict.get(sample_id) == 'outputs missing':
+                stored_stats = results_store.lookup_sample_stats(sample_id, current_hashes[sample_id])
+                if stored_stats is not None:
+                    stored_stats_dict[sample_id] = stored_stats
+        if len(stored_stats_dict) > 0:
+            print(f'RESULTS STORE: statistics of {len(stored_stats_dict)} unchanged samples read back')
+
+    # Only the rows of the samples that are reprocessed flow into the mg/g conversion
+    print('UPDATING LOADED DATAFRAME')
+    convert_list = [sample_id for sample_id in processed_dict
+                    if sample_id != ft_campaign_id and sample_id not in stored_stats_dict]
+    if ft_campaign_id in processed_dict:
+        convert_list = convert_list + [ft for ft in ft_list if ft not in convert_list]
+    convert_rows = np.zeros(len(loaded_df), dtype=bool)
+    for sample_id in convert_list:
+        convert_rows |= sample_index.sample_mask(sample_id)
+
+    # Calculate mg/g values for all Compounds of the selected Samples in one pass
+    updated_df, mg_g_error_mask = MgGConversion.calculate_all_mg_g_values(loaded_df, rows=convert_rows,
+                                                                          apply_dilution=settings['apply_dilution'])
+    mg_g_error_df = MgGConversion.mg_g_error_report(updated_df, mg_g_error_mask)
+    if len(mg_g_error_df) > 0:
+        print(f'{len(mg_g_error_df)} mg/g values could not be converted:\n{mg_g_error_df}')
+
+    # Save the changed mg/g cells of the Updated Dataframe to the Google Sheet
+    if settings['write_back_mg_g']:
+        SheetWriteBack.write_back_changes(sheet_backend, settings['gsheet_key'], settings['sheet_name'], loaded_df, updated_df)
+
+    # Generate Stats Dataframe for every converted Sample and Flush Test group in one pass
+    sample_stats_df = StatsEngine.sample_stats_table(updated_df[convert_rows], sample_index.group_keys[convert_rows])
+
+    # Keep the mg/g values and statistics of the reprocessed groups for later runs and queries
+    if results_store is not None:
+        results_store.store_samples(updated_df, sample_index, sample_stats_df, convert_list, current_hashes)
+
+    # Graphics of the changed Samples and Flush Tests, spread over the worker processes
+    task_list = [profile_graphics_task(sample_id, sample_stats_df, automation_workspace, stored_stats_dict.get(sample_id))
+                 for sample_id in sample_list if sample_id in processed_dict]
+    if ft_campaign_id in processed_dict:
+        task_list += [flush_test_graphics_task(ft, updated_df, sample_index, sample_stats_df, automation_workspace, ft_campaign_id)
+                      for ft in ft_list if ft in processed_dict]
+    error_dict = GraphicsBatch.run_graphics_tasks(task_list, workers, settings['render_sessions'],
+                                                  settings['render_cache_dir'], settings['render_cache_mb'] * 1024 * 1024,
+                                                  bundle_dict, settings['keep_asset_files'])
+
+    # Record the processed rows so the next run can skip the Samples, failed ones are retried
+    bundled = bundle_dict is not None and not settings['keep_asset_files']
+    for task in task_list:
+        if task['sample_id'] not in error_dict:
+            IncrementalTracker.mark_processed(tracker_state, task['sample_id'], current_hashes[task['sample_id']], bundled)
+    IncrementalTracker.save_state(tracker_state_path, tracker_state)
+
+    if ft_campaign_id in processed_dict:
+        ft_start, ft_end = flush_range
+        # Figures of the campaign whose spec did not change are copied from the render cache
+        RenderService.configure_cache(settings['render_cache_dir'], settings['render_cache_mb'] * 1024 * 1024)
+        # Flush pie models fitted on unchanged Flush Test data are read from the model cache
+        model_cache = ModelCache.configure_cache(settings['model_cache_dir'], settings['model_threads'])
+        CatBoostReg.configure_training(settings['model_iterations'], settings['model_early_stopping_rounds'],
+                                       settings['model_time_budget'])
+        # A failed campaign is reported like a failed sample and retried on the next run
+        try:
+            campaign_bundle = generate_flush_campaign_graphics(updated_df, sample_index, sample_stats_df, automation_workspace,
+                                                               ft_start, ft_end, settings['render_sessions'],
+                                                               bundle_dict is not None, settings['keep_asset_files'], results_store)
+            if campaign_bundle is not None:
+                bundle_dict[ft_campaign_id] = campaign_bundle
+        except Exception:
+            error_dict[ft_campaign_id] = traceback.format_exc()
+            print(f'{ft_campaign_id} campaign graphics FAILED')
+            print(error_dict[ft_campaign_id])
+        model_cache.print_stats()
+        if not any(group_id in error_dict for group_id in ft_list + [ft_campaign_id]):
+            IncrementalTracker.mark_processed(tracker_state, ft_campaign_id, current_hashes[ft_campaign_id], bundled)
+            IncrementalTracker.save_state(tracker_state_path, tracker_state)
+    if results_store is not None:
+        results_store.close()
+    if len(error_dict) > 0:
+        print(f'Graphics failed for: {", ".join(error_dict)}')
+    return list(processed_dict)
+
+def plan_graphics_stage(settings, sample_patterns, flush_range=None, report_types=None, force=False, force_refresh=False):
+    """
+    Prints which of the selected samples run_graphics_stage would reprocess and why,
+    without converting or generating anything.
 
+    Returns:
+    - processed_list: list
+        The Samples, Flush Tests and Flush Test campaign that would be reprocessed.
+    """
+    if report_types is None:
+        report_types = SampleSelection.report_type_list
+    loaded_df, sample_index = load_sample_sheet(settings, force_refresh)[1:3]
+    sample_list = select_samples(loaded_df, sample_index, sample_patterns, report_types)
+    ft_list, ft_campaign_id = select_flush_tests(settings, sample_index, flush_range, report_types)
+    tracker_state = IncrementalTracker.load_state(f"{settings['incremental_state_dir']}/sample_hashes.json")
+    processed_dict = plan_incremental_run(loaded_df, sample_index, settings['automation_workspace'], tracker_state,
+                                          sample_list, ft_list, ft_campaign_id, force, settings['apply_dilution'])[1]
+    return list(processed_dict)
+
+def report_patterns(sample_patterns, flush_range=None):
+    # Flush Test campaign folders are named by the campaign ID (FT3-11)
+    pattern_list = list(sample_patterns)
+    if flush_range is not None:
+        pattern_list.append(f'FT{flush_range[0]}-{flush_range[1]}')
+    return pattern_list
+
+def run_pipeline(config_path=default_config_path, sample_patterns=('changed',), flush_range=None, report_types=None,
+                 stages=pipeline_stage_list, force=False, force_refresh=False, write_back=None, workers=None,
+                 in_memory=None, dry_run=False):
+    """
+    Runs the pipeline from the sheet load to the PDF reports in one process.
 
+    Parameters:
+    - config_path: str
+        The config.txt file (see README.md).
+    - sample_patterns: list
+        Sample_IDs, glob patterns ('HLO12*'), ranges ('HLO120..HLO129') or 'changed' / 'all'
+        ('all' also reprocesses the unchanged samples, like force).
+    - flush_range: tuple, optional
+        (ft_start, ft_end) of the Flush Test campaign to process.
+    - report_types: list, optional
+        Any of 'Profile', 'Cup' and 'Flush', defaults to all of them.
+    - stages: list
+        'graphics' (sheet load, mg/g conversion and SVGs) and/or 'reports' (PDFs).
+    - force: bool
+        Reprocess the selected samples even when their rows did not change.
+    - force_refresh: bool
+        Download the sheet even when the snapshot is up to date.
+    - write_back: bool, optional
+        Overrides write_back_mg_g of the config file.
+    - workers: int, optional
+        Number of graphics worker processes, overrides graphics_workers of the config file.
+    - in_memory: bool, optional
+        Pass the graphics to the reports as in-memory AssetBundles instead of sample folder
+        files, overrides in_memory_assets of the config file. Needs both stages.
+    - dry_run: bool
+        Only list the samples whose graphics would be regenerated and the report pages
+        that would be rebuilt, with the reasons; nothing is generated.
+    """
+    if report_types is None:
+        report_types = SampleSelection.report_type_list
+    settings = read_pipeline_config(config_path)
+    if write_back is not None:
+        settings['write_back_mg_g'] = write_back
+    if in_memory is not None:
+        settings['in_memory_assets'] = in_memory
+    # 'all' rebuilds the unchanged samples too, 'changed' only the changed ones
+    force = force or SampleSelection.forces_rebuild(sample_patterns)
+
+    if dry_run:
+        if 'graphics' in stages:
+            processed_list = plan_graphics_stage(settings, sample_patterns, flush_range, report_types, force, force_refresh)
+            if len(processed_list) > 0:
+                # The report plan compares the graphics on disk, the pages of these groups follow once they are regenerated
+                print(f'The report pages of the {len(processed_list)} reprocessed groups are rebuilt after their graphics')
+        if 'reports' in stages:
+            PDFGen.generate_reports(config_path, report_types, report_patterns(sample_patterns, flush_range), force, dry_run=True)
+        return
+
+    if settings['in_memory_assets'] and 'graphics' in stages and 'reports' in stages:
+        # The reports are built from the bundles of the regenerated groups, nothing is read back from disk
+        bundle_dict = {}
+        run_graphics_stage(settings, sample_patterns, flush_range, report_types, force, force_refresh, workers, bundle_dict)
+        PDFGen.generate_bundle_reports(config_path, list(bundle_dict.values()))
+        return
+
+    if 'graphics' in stages:
+        run_graphics_stage(settings, sample_patterns, flush_range, report_types, force, force_refresh, workers)
+
+    if 'reports' in stages:
+        PDFGen.generate_reports(config_path, report_types, report_patterns(sample_patterns, flush_range), force)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the graphics and PDF reports of the samples in the sample sheet.')
+    parser.add_argument('--config', default=os.environ.get('HL_CONFIG', default_config_path),
+                        help='config.txt file (default: $HL_CONFIG or config.txt in the repository folder)')
+    parser.add_argument('-s', '--samples', nargs='+', default=['changed'],
+                        help="Sample_IDs (HLO126), glob patterns ('HLO12*'), ranges (HLO120..HLO129) "
+                             "or 'changed' (default) for every sample; unchanged samples are skipped unless --force "
+                             "or 'all' is given")
+    parser.add_argument('-f', '--flush-range',
+                        help='Flush Test campaign to process, e.g. 3-11 for FT3 through FT11')
+    parser.add_argument('-r', '--report-types', nargs='+', choices=SampleSelection.report_type_list,
+                        default=SampleSelection.report_type_list)
+    parser.add_argument('--stages', nargs='+', choices=pipeline_stage_list, default=pipeline_stage_list)
+    parser.add_argument('--force', action='store_true',
+                        help='reprocess the selected samples even when their rows did not change')
+    parser.add_argument('--refresh', action='store_true',
+                        help='download the sheet even when the snapshot is up to date')
+    parser.add_argument('--write-back', action=argparse.BooleanOptionalAction, default=None,
+                        help='write computed mg/g cells back to the sheet (default: write_back_mg_g of the config)')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='graphics worker processes (default: graphics_workers of the config, 1)')
+    parser.add_argument('--in-memory', action=argparse.BooleanOptionalAction, default=None,
+                        help='build the reports from in-memory graphics instead of the sample folders '
+                             '(default: in_memory_assets of the config)')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='list the samples whose rows changed since the last run and the report pages that '
+                             'would be rebuilt, with the reasons, without generating anything; pages of changed '
+                             'samples are only listed once their graphics were regenerated')
+    args = parser.parse_args(argv)
+
+    flush_range = None
+    if args.flush_range is not None:
+        try:
+            flush_range = SampleSelection.parse_flush_range(args.flush_range)
+        except ValueError as error:
+            parser.error(str(error))
 
-# Generate Flush Bar Graphic
-for ft in ft_list:
-    sample_id = ft
-    all_sample_df = updated_df[updated_df['Sample_ID'].str.contains(sample_id)].copy()
-    replicate_list = all_sample_df['Sample_ID']
-    replicate_list = [x for x in replicate_list if '-' not in x and ',' not in x]
-    if ft in replicate_list:
-        replicate_list.remove(ft)    
-    # drop rows where Sample_ID is not in replicate_list
-    specific_sample_df = all_sample_df[all_sample_df['Sample_ID'].isin(replicate_list)]
-    # Generate Stats Dataframe    
-    sample_info_df, full_compound_list, full_mean_data, full_sd_data = stats_df_generator(specific_sample_df)   
-    sample_name = sample_info_df['Sample_Name'].split(' Position')[0]
-    report_type = sample_info_df['Report_Type']
-    sample_cultivar = sample_info_df['Cultivar']
-    flush_test_folder = f'{automation_workspace}/Flush - FT{ft_start}-{ft_end} - {sample_cultivar}'
-    indiv_flush_folder = f'{flush_test_folder}/{ft}'
-    # Check if the folder exists
-    try:
-        if not os.path.exists(indiv_flush_folder):
-            # Create the folder if it doesn't exist
-            os.makedirs(indiv_flush_folder)
-    except FileExistsError:
-        pass
-    os.chdir(indiv_flush_folder)    
-    # Generate Page Topper Table containing Sample ID & Name
-    ChemProfTableGen.item_id_table_generator(sample_id, sample_name)
-    # Generate Sample Information Table
-    ChemProfTableGen.profile_table_generator(sample_id, sample_name, sample_info_df)    
-    # Generate Donut Graphic, Legend Table, and Dosage Table
-    ChemProfGraphGen. profile_graphics_generator(sample_id, sample_name, full_compound_list, full_mean_data, full_sd_data)
-    # Generate Flush Bar Graphic and Legend Table
-    IndivFlushGen.indiv_flush_test_graphics_generator(sample_id, specific_sample_df, full_compound_list)   
-    position_list = [1, 2, 3, 4, 5] # [NW, NE, C, SW, SE]
-    sample_name = [replicate[1]['Sample_Name'] for replicate in specific_sample_df.iterrows()][0].split(' ')
-    sample_id = [replicate[1]['Sample_ID'] for replicate in specific_sample_df.iterrows()]
-    bin_id = [f'{sample_name[1]}' for position in position_list]
-    flush_id = [f'{sample_name[3]}' for position in position_list]  
-    pcb_pcn_sum = [round(specific_sample_df.loc[i, 'Psilocybin_mg_g'] + specific_sample_df.loc[i, 'Psilocin_mg_g'],1) for i in specific_sample_df.index]
-    sample_mass = [replicate[1]['Sample_Weight_(g)'] for replicate in specific_sample_df.iterrows()]
-    fruit_pcb_pcn = [0]*len(pcb_pcn_sum)
-    data_dict = {'Sample_ID' : sample_id,
-                  'Bin_ID' : bin_id,
-                  'Flush_ID' : flush_id,
-                  'Position' : position_list,
-                  'Sample_Mass_g' : sample_mass,
-                  'PCB_PCN_SUM_mg_g' : pcb_pcn_sum,
-                  'Fruit_PCB+PCN_mg' : fruit_pcb_pcn}
-    df = pd.DataFrame(data=data_dict)    
-    data= [ft_df, df]
-    ft_df = pd.concat(data)
-    total_df = pd.concat([total_df, specific_sample_df])
-
-# Generate Nuanced and Broad Dataframes
-# Work on ft_df for graphics/tables
-os.chdir(flush_test_folder)    
-
-sample_info_df, full_compound_list, full_mean_data, full_sd_data = stats_df_generator(total_df)    
-
-pre_flush_mean_df = total_df.reset_index().drop(columns=['index'])
-
-sample_id = f'FT{ft_start}-{ft_end}'
-sample_name = 'All Flushes Mean'
-
-all_flush_mean_df = mean_df_generator(pre_flush_mean_df, sample_id, sample_name)
-
-
-sample_info_df, full_compound_list, full_mean_data, full_sd_data = stats_df_generator(all_flush_mean_df)  
-
-# Generate Page Topper Table containing Sample ID & Name
-ChemProfTableGen.item_id_table_generator(sample_id, sample_name)
-# Generate Sample Information Table
-ChemProfTableGen.profile_table_generator(sample_id, sample_name, sample_info_df)    
-# Generate Donut Graphic, Legend Table, and Dosage Table
-ChemProfGraphGen. profile_graphics_generator(sample_id, sample_name, full_compound_list, full_mean_data, full_sd_data)
-# Generate Nuanced and Broad Flush Pies and Table
-FullFlushPieGen.broad_nuanced_pie_generator(ft_start, ft_end, ft_df)
-
-
-
-def group_flush_test_graphics_generator(sample_id, df, full_compound_list):
-    print('DO GROUP FLUSH TEST GRAPHICS GENERATION')
-
-# Generate Flush Bar Graphic and Legend Table
-group_flush_test_graphics_generator(sample_id, specific_sample_df, full_compound_list)   
+    run_pipeline(args.config, args.samples, flush_range, args.report_types, args.stages,
+                 args.force, args.refresh, args.write_back, args.workers, args.in_memory, args.dry_run)
 
+if __name__ == '__main__':
+    main()
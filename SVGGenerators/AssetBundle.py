@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+###############################################################################
+#
+# In-Memory Bundle of the Graphics of One Sample, Consumed by the PDF Assembly
+#
+###############################################################################
+
+# The AssetBundle collecting the graphics of the current thread, None writes them to their files
+active_bundles = threading.local()
+
+def active_bundle():
+    return getattr(active_bundles, 'bundle', None)
+
+def capture(output_path, data):
+    """
+    Adds data to the AssetBundle active in this thread under the file name of output_path.
+    Returns False when no bundle is active and the caller has to write the file itself.
+    """
+    asset_bundle = active_bundle()
+    if asset_bundle is None:
+        return False
+    asset_bundle.add(os.path.basename(output_path), data)
+    return True
+
+class AssetBundle:
+    """
+    Holds the generated graphics of one sample as bytes keyed by their file names
+    ('{sample_id}-donut_plot.svg', ...). While a bundle is active in a 'with' block the
+    SVG generators add their output to it instead of writing files, and PDFGen builds
+    the reports from it directly. Bundles are picklable, so worker processes can
+    return them.
+
+    Parameters:
+    - sample_id: str
+        The Sample_ID (or Flush Test ID) of the graphics.
+    - sample_name: str
+        The name shown in the report and in its file names, the Sample_Name part of the
+        sample folder name (PDFGen.folder_report_name).
+    - report_type: str
+        The Report_Type of the sample ('Profile', 'Cup', 'Flush').
+    - output_dir: str, optional
+        The sample folder, where the reports are saved.
+    - write_files: bool
+        Also write every asset to output_dir, as the file-based pipeline does.
+    """
+    def __init__(self, sample_id, sample_name='', report_type='', output_dir=None, write_files=False):
+        self.sample_id = sample_id
+        self.sample_name = sample_name
+        self.report_type = report_type
+        self.output_dir = output_dir
+        self.write_files = write_files
+        self.asset_dict = {}
+        self.previous_bundle = None
+
+    def add(self, file_name, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.asset_dict[file_name] = data
+        if self.write_files and self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, file_name), 'wb') as asset_file:
+                asset_file.write(data)
+
+    def get(self, file_name):
+        return self.asset_dict.get(file_name)
+
+    def __contains__(self, file_name):
+        return file_name in self.asset_dict
+
+    def size_bytes(self):
+        return sum(len(data) for data in self.asset_dict.values())
+
+    def __enter__(self):
+        self.previous_bundle = active_bundle()
+        active_bundles.bundle = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        active_bundles.bundle = self.previous_bundle
+        self.previous_bundle = None
+        return False
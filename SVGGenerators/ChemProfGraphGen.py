@@ -4,10 +4,12 @@ Created on Mon Mar 13 12:09:24 2023
 
 @author: theda
 """
+import os
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.offline import plot
 import pandas as pd
+from SVGGenerators import RenderService
 
 pio.renderers.default='svg'
 
@@ -17,7 +19,7 @@ pio.renderers.default='svg'
 #
 ###############################################################################
 
-def profile_graphics_generator(sample_id, sample_name, full_compound_list, full_mean_data, full_sd_data):    
+def profile_graphics_generator(sample_id, sample_name, full_compound_list, full_mean_data, full_sd_data, output_dir=''):    
     """
     Generates the Donut Graphic, Legend Table, and Reccomended Dose Chart based on the mean data for sample_id.
     
@@ -80,12 +82,12 @@ def profile_graphics_generator(sample_id, sample_name, full_compound_list, full_
         columns=['Compound_Name', 'mg_g_value', 'STD_value', 'Legend_Color', 'Legend_Font_Color'])
     
     # Call the graphic and table functions with consolidated inputs
-    donut_plot_generator(sample_id, sample_name, abrv_dict, mg_g_values, STD_values, mg_g_sum, STD_sum, colors, font_colors)
-    legend_table_generator(sample_id, sample_name, final_data)
-    dose_table_generator(sample_id, sample_name, mg_g_sum['known'])
+    donut_plot_generator(sample_id, sample_name, abrv_dict, mg_g_values, STD_values, mg_g_sum, STD_sum, colors, font_colors, output_dir=output_dir)
+    legend_table_generator(sample_id, sample_name, final_data, output_dir=output_dir)
+    dose_table_generator(sample_id, sample_name, mg_g_sum['known'], output_dir=output_dir)
     
 
-def donut_plot_generator(sample_id, sample_name, abrv_dict, mg_g_values, STD_values, mg_g_sum, STD_sum, colors, font_colors):
+def donut_plot_generator(sample_id, sample_name, abrv_dict, mg_g_values, STD_values, mg_g_sum, STD_sum, colors, font_colors, output_dir=''):
     """
     Generates the Donut Graphic based on the mean data for sample_id.
     
@@ -152,9 +154,9 @@ def donut_plot_generator(sample_id, sample_name, abrv_dict, mg_g_values, STD_val
     # Display the figure and save it as an SVG image
     #plot(donut_fig)
     donut_output_filename = f'{sample_id}-donut_plot.svg'
-    donut_fig.write_image(donut_output_filename)
+    RenderService.save_figure(donut_fig, os.path.join(output_dir, donut_output_filename))
 
-def legend_table_generator(sample_id, sample_name, final_data):        
+def legend_table_generator(sample_id, sample_name, final_data, output_dir=''):        
     # Filter data to exclude compounds with 0 mg_g value and sort by mg_g value in descending order
     legend_df = final_data[final_data['mg_g_value'] != 0].sort_values('mg_g_value', ascending=False)
     
@@ -184,11 +186,11 @@ def legend_table_generator(sample_id, sample_name, final_data):
     # Display the table and save it as an SVG image
     #plot(legend_table)
     legend_table_output_filename = sample_id + '-legend_table.svg'
-    legend_table.write_image(legend_table_output_filename)
+    RenderService.save_figure(legend_table, os.path.join(output_dir, legend_table_output_filename))
 
 
 # NEEDS BETTER DOCUMENTATION##################################################
-def dose_table_generator(sample_id, sample_name, known_mg_g_sum):
+def dose_table_generator(sample_id, sample_name, known_mg_g_sum, output_dir=''):
     # Define dose information
     dose_fruit_g = [0.1, 0.2, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0]
     dose_active_mg = []
@@ -270,4 +272,4 @@ def dose_table_generator(sample_id, sample_name, known_mg_g_sum):
     # Display the table and save it as an SVG image
     #plot(dose_table)
     dose_table_output_filename = sample_id + '-dose_table.svg'
-    dose_table.write_image(dose_table_output_filename)
\ No newline at end of file
+    RenderService.save_figure(dose_table, os.path.join(output_dir, dose_table_output_filename))
\ No newline at end of file
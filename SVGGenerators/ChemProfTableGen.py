@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import os
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.offline import plot
+from SVGGenerators import RenderService, SVGTableTemplates
 
 pio.renderers.default='svg'
 
-def item_id_table_generator(sample_id, sample_name):
+# Write the fixed banner tables from the native SVG templates instead of rendering Plotly tables
+native_svg_tables = True
+
+def item_id_table_generator(sample_id, sample_name, output_dir=''):
     # Generate Sample Name & ID Table
+    sample_table_name_id_output_filename = f"{sample_id}-sample_table_name_id.svg"
+    if native_svg_tables:
+        SVGTableTemplates.write_svg(SVGTableTemplates.label_value_table_svg('ITEM ID & NAME:', f"{sample_id} - {sample_name}",
+                                                                            height=75, label_fill='black', value_fill='black',
+                                                                            label_font_size=35, value_font_size=45,
+                                                                            font_color='white', label_bold=False),
+                                    os.path.join(output_dir, sample_table_name_id_output_filename))
+        return
     header_values = ['ITEM ID & NAME:', f"{sample_id} - {sample_name}"]
     header_align = ['right', 'left']
     header_fill = dict(color='black')
@@ -21,10 +34,9 @@ def item_id_table_generator(sample_id, sample_name):
                                                         showlegend=False))
     # Display the table and save it as an SVG image
     #plot(sample_table_name_id)
-    sample_table_name_id_output_filename = f"{sample_id}-sample_table_name_id.svg"
-    sample_table_name_id.write_image(sample_table_name_id_output_filename)
+    RenderService.save_figure(sample_table_name_id, os.path.join(output_dir, sample_table_name_id_output_filename))
 
-def profile_table_generator(sample_id, sample_name, sample_info_df): 
+def profile_table_generator(sample_id, sample_name, sample_info_df, output_dir=''): 
     sample_client = sample_info_df['Client_Name']
     sample_species = sample_info_df['Species_of_Origin']
     
@@ -48,10 +60,23 @@ def profile_table_generator(sample_id, sample_name, sample_info_df):
     else:
         sample_homog_desc = sample_info_df['Homogenized_Description']
         
-    sample_info_table_generator(sample_id, sample_client, sample_species, sample_cultivar, cultivar_font_size, sample_gen_date, sample_client_desc)
-    lab_table_generator(sample_id, sample_lab_desc, sample_homog_desc)
+    sample_info_table_generator(sample_id, sample_client, sample_species, sample_cultivar, cultivar_font_size, sample_gen_date, sample_client_desc, output_dir=output_dir)
+    lab_table_generator(sample_id, sample_lab_desc, sample_homog_desc, output_dir=output_dir)
 
-def sample_info_table_generator(sample_id, sample_client, sample_species, sample_cultivar, cultivar_font_size, sample_gen_date, sample_client_desc):
+def sample_info_table_generator(sample_id, sample_client, sample_species, sample_cultivar, cultivar_font_size, sample_gen_date, sample_client_desc, output_dir=''):
+    if native_svg_tables:
+        # Long submittor notes start smaller, the template wraps and shrinks them further to fit
+        sample_client_desc_font = 20 if len(sample_client_desc) > 95 else 25 if len(sample_client_desc) > 65 else 30
+        native_table_list = [('sample_table_client', 'CULTIVATOR/PRODUCER:', sample_client, 30, False),
+                             ('sample_table_species', 'SPECIES:', sample_species, 30, True),
+                             ('sample_table_cultivar', 'CULTIVAR:', sample_cultivar, cultivar_font_size, False),
+                             ('sample_table_gen_date', 'GENERATION DATE:', sample_gen_date, 30, False),
+                             ('description_table_top', 'SUBMITTOR NOTES:', sample_client_desc, sample_client_desc_font, False)]
+        for graphic_type, label, value, value_font_size, value_italic in native_table_list:
+            SVGTableTemplates.write_svg(SVGTableTemplates.label_value_table_svg(label, value, value_font_size=value_font_size,
+                                                                                value_italic=value_italic),
+                                        os.path.join(output_dir, f"{sample_id}-{graphic_type}.svg"))
+        return
     # Generate Sample Client Table
     sample_table_client = go.Figure(data=[go.Table(
                                 columnwidth=[451,1000],
@@ -71,7 +96,7 @@ def sample_info_table_generator(sample_id, sample_client, sample_species, sample
     # Display the table and save it as an SVG image
     #plot(sample_table_client)
     sample_table_client_output_filename = f"{sample_id}-sample_table_client.svg"
-    sample_table_client.write_image(sample_table_client_output_filename)
+    RenderService.save_figure(sample_table_client, os.path.join(output_dir, sample_table_client_output_filename))
     
     # Generate Sample Species Table
     sample_table_species = go.Figure(data=[go.Table(
@@ -93,7 +118,7 @@ def sample_info_table_generator(sample_id, sample_client, sample_species, sample
     # Display the table and save it as an SVG image
     #plot(sample_table_species)
     sample_table_species_output_filename = f"{sample_id}-sample_table_species.svg"
-    sample_table_species.write_image(sample_table_species_output_filename)
+    RenderService.save_figure(sample_table_species, os.path.join(output_dir, sample_table_species_output_filename))
     
     # Generate Sample Cultivar Table
     sample_table_cultivar = go.Figure(data=[go.Table(
@@ -113,7 +138,7 @@ def sample_info_table_generator(sample_id, sample_client, sample_species, sample
     # Display the table and save it as an SVG image
     #plot(sample_table_cultivar)
     sample_table_cultivar_output_filename = f"{sample_id}-sample_table_cultivar.svg"
-    sample_table_cultivar.write_image(sample_table_cultivar_output_filename)
+    RenderService.save_figure(sample_table_cultivar, os.path.join(output_dir, sample_table_cultivar_output_filename))
     
     # Generate Sample Generation Date Table
     sample_table_gen_date = go.Figure(data=[go.Table(
@@ -133,7 +158,7 @@ def sample_info_table_generator(sample_id, sample_client, sample_species, sample
     # Display the table and save it as an SVG image
     #plot(sample_table_gen_date)
     sample_table_gen_date_output_filename = f"{sample_id}-sample_table_gen_date.svg"
-    sample_table_gen_date.write_image(sample_table_gen_date_output_filename)
+    RenderService.save_figure(sample_table_gen_date, os.path.join(output_dir, sample_table_gen_date_output_filename))
     
     sample_client_desc_font = 30
     if len(sample_client_desc) > 95:
@@ -159,12 +184,17 @@ def sample_info_table_generator(sample_id, sample_client, sample_species, sample
     # Display the table and save it as an SVG image
     #plot(description_table_top)
     description_table_top_output_filename = f"{sample_id}-description_table_top.svg"
-    description_table_top.write_image(description_table_top_output_filename)
+    RenderService.save_figure(description_table_top, os.path.join(output_dir, description_table_top_output_filename))
 
 
-def lab_table_generator(sample_id, sample_lab_desc, sample_homog_desc):
+def lab_table_generator(sample_id, sample_lab_desc, sample_homog_desc, output_dir=''):
     # Generate Bottom Half of Description Table
     description_table_bot_name = f"{sample_id}-description_table_bot.svg"
+    if native_svg_tables:
+        SVGTableTemplates.write_svg(SVGTableTemplates.row_table_svg(['', sample_lab_desc, '', sample_homog_desc], [451, 273, 451, 273],
+                                                                    height=425, row_height=405, font_size=25),
+                                    os.path.join(output_dir, description_table_bot_name))
+        return
     description_table_bot = go.Figure(data=[go.Table(    columnwidth=[451,273,451,273],
         header=dict(
             values=['', sample_lab_desc, '',sample_homog_desc],
@@ -182,4 +212,4 @@ def lab_table_generator(sample_id, sample_lab_desc, sample_homog_desc):
     # Display the table and save it as an SVG image
     #plot(description_table_bot)
     description_table_bot_output_filename = f"{sample_id}-description_table_bot.svg"
-    description_table_bot.write_image(description_table_bot_output_filename)
+    RenderService.save_figure(description_table_bot, os.path.join(output_dir, description_table_bot_output_filename))
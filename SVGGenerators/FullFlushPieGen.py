@@ -1,3 +1,4 @@
+import os
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.offline import plot
@@ -6,10 +7,11 @@ from MLTools import CatBoostReg
 import pandas as pd
 import colorlover as cl
 import numpy as np
+from SVGGenerators import RenderService
 
 pio.renderers.default='svg'
 
-def pie_table_generator(ft_start, ft_end, ft_df, shades_of_red):
+def pie_table_generator(ft_start, ft_end, ft_df, shades_of_red, output_dir=''):
     
     # Generate Pie Table
     table_cols = [col.replace('_', ' ') for col in ft_df.columns]
@@ -47,10 +49,10 @@ def pie_table_generator(ft_start, ft_end, ft_df, shades_of_red):
         margin=dict(l=0,r=0,t=0,b=0))
     #plot(flush_table)
     pie_table_output_filename = f'FT{ft_start}-{ft_end}-pie_table'
-    pie_table.write_image(f'{pie_table_output_filename}.svg')
+    RenderService.save_figure(pie_table, os.path.join(output_dir, f'{pie_table_output_filename}.svg'))
 
 
-def broad_nuanced_pie_generator(ft_start, ft_end, ft_df):
+def broad_nuanced_pie_generator(ft_start, ft_end, ft_df, output_dir=''):
     ft_df = ft_df.reset_index()
     ft_df = ft_df.drop(columns=['index'])
     for index, row in ft_df.iterrows():
@@ -77,9 +79,11 @@ def broad_nuanced_pie_generator(ft_start, ft_end, ft_df):
     ft_df_dict = {'Nuanced ': ft_df_nuanced,
                   'Broad ' : ft_df.drop(columns=['PCB_PCN_SUM_mg_g', 'Sample_Mass_g'])}
 
-    # Generate Pie Charts
+    # Generate Pie Charts, keeping the feature importances of both models
+    importance_dict = {}
     for key, value in ft_df_dict.items():
-        flush_pie_generator(ft_start, ft_end, value, key)
+        importance_dict[key.strip()] = flush_pie_generator(ft_start, ft_end, value, key, output_dir=output_dir)
+    return(importance_dict)
 
 def pie_colors_fonts_generator(df_importances):
     reds = cl.scales['9']['seq']['Reds']
@@ -92,13 +96,13 @@ def pie_colors_fonts_generator(df_importances):
         font_colors[4:] = ['black'] * (len(shades_of_red) - 4)
     return(shades_of_red, font_colors)
 
-def flush_pie_generator(ft_start, ft_end, ft_df, descriptor):
+def flush_pie_generator(ft_start, ft_end, ft_df, descriptor, output_dir=''):
             
     df_importances = CatBoostReg.cat_boost_regressor(ft_df)
     
     shades_of_red, font_colors = pie_colors_fonts_generator(df_importances)
     
-    pie_table_generator(ft_start, ft_end, ft_df, shades_of_red)
+    pie_table_generator(ft_start, ft_end, ft_df, shades_of_red, output_dir=output_dir)
     
     # Create the pie chart
     fig1 = go.Figure(data=[go.Pie(labels=df_importances['Analysis Feature'], values=df_importances['▲-Contribution %'], marker_colors=shades_of_red)])
@@ -118,5 +122,5 @@ def flush_pie_generator(ft_start, ft_end, ft_df, descriptor):
     if ' ' in descriptor:
         descriptor = descriptor.replace(' ', '_')
     flushpie_output_filename = f'FT{ft_start}-{ft_end}-{descriptor}flushpie'
-    fig1.write_image(f'{flushpie_output_filename}.svg')
-    return(shades_of_red)
\ No newline at end of file
+    RenderService.save_figure(fig1, os.path.join(output_dir, f'{flushpie_output_filename}.svg'))
+    return(df_importances)
\ No newline at end of file
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import traceback
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from SVGGenerators import ChemProfGraphGen, ChemProfTableGen, IndivFlushGen, RenderService, AssetBundle
+
+###############################################################################
+#
+# Per-Sample Graphics Tasks Fanned Out Over a Process Pool
+#
+###############################################################################
+
+def graphics_task(sample_id, sample_name, sample_info_df, full_compound_list, full_mean_data, full_sd_data,
+                  output_dir, specific_sample_df=None, report_type='', report_name=None):
+    """
+    Returns the description of one sample's graphics job, a picklable dictionary
+    passed to run_graphics_task in the worker process.
+
+    Parameters:
+    - sample_id: str
+        The Sample_ID (or Flush Test ID) of the graphics.
+    - sample_name: str
+        The name shown in the tables.
+    - sample_info_df: pandas Series
+        The information columns of the sample (StatsEngine.lookup_sample_stats).
+    - full_compound_list, full_mean_data, full_sd_data: list
+        The compounds with their mean and standard deviation mg/g values.
+    - output_dir: str
+        The folder the SVG files are written to.
+    - specific_sample_df: pandas DataFrame, optional
+        The replicate rows of a Flush Test, adds the individual flush table and bar graphics.
+    - report_type: str
+        The report category of the sample, carried into its AssetBundle.
+    - report_name: str, optional
+        The name the reports of an AssetBundle are saved under, defaults to sample_name.
+    """
+    return {'sample_id': sample_id,
+            'sample_name': sample_name,
+            'sample_info_df': sample_info_df,
+            'full_compound_list': full_compound_list,
+            'full_mean_data': full_mean_data,
+            'full_sd_data': full_sd_data,
+            'output_dir': output_dir,
+            'specific_sample_df': specific_sample_df,
+            'report_type': report_type,
+            'report_name': report_name if report_name is not None else sample_name}
+
+def run_graphics_task(task):
+    """
+    Generates every graphic of one sample into its output folder, all figures rendered
+    together in one Kaleido batch. In-memory tasks collect the graphics into an AssetBundle
+    instead. Errors are returned as text instead of raised so one failing sample does not
+    stop the batch.
+
+    Returns:
+    - task_result: dict
+        'sample_id', 'seconds', 'error' (None on success, the traceback otherwise), the
+        render cache hits and misses of the sample and its 'bundle' (None unless in memory).
+    """
+    start_time = time.perf_counter()
+    sample_id = task['sample_id']
+    output_dir = task['output_dir']
+    render_cache = RenderService.configure_cache(task.get('render_cache_dir'), task.get('render_cache_bytes'))
+    start_hits, start_misses = (render_cache.hits, render_cache.misses) if render_cache is not None else (0, 0)
+    asset_bundle = None
+    if task.get('in_memory', False):
+        asset_bundle = AssetBundle.AssetBundle(sample_id, task['report_name'], task.get('report_type', ''), output_dir,
+                                               write_files=task.get('keep_files', False))
+    try:
+        if asset_bundle is None or asset_bundle.write_files:
+            os.makedirs(output_dir, exist_ok=True)
+        with asset_bundle or nullcontext(), RenderService.FigureBatch(task.get('render_sessions', 1)):
+            # Generate Page Topper Table containing Sample ID & Name
+            ChemProfTableGen.item_id_table_generator(sample_id, task['sample_name'], output_dir=output_dir)
+            # Generate Sample Information Table
+            ChemProfTableGen.profile_table_generator(sample_id, task['sample_name'], task['sample_info_df'], output_dir=output_dir)
+            # Generate Donut Graphic, Legend Table, and Dosage Table
+            ChemProfGraphGen.profile_graphics_generator(sample_id, task['sample_name'], task['full_compound_list'],
+                                                        task['full_mean_data'], task['full_sd_data'], output_dir=output_dir)
+            # Generate Flush Bar Graphic and Legend Table
+            if task['specific_sample_df'] is not None:
+                IndivFlushGen.indiv_flush_test_graphics_generator(sample_id, task['specific_sample_df'], task['full_compound_list'],
+                                                                  output_dir=output_dir)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    task_result = {'sample_id': sample_id, 'seconds': time.perf_counter() - start_time, 'error': error,
+                   'cache_hits': 0, 'cache_misses': 0, 'bundle': asset_bundle if error is None else None}
+    if render_cache is not None:
+        task_result['cache_hits'] = render_cache.hits - start_hits
+        task_result['cache_misses'] = render_cache.misses - start_misses
+    return task_result
+
+def run_graphics_tasks(task_list, workers=1, render_sessions=1, render_cache_dir=None, render_cache_bytes=None,
+                       bundle_dict=None, keep_files=False):
+    """
+    Runs the graphics tasks, spread over a pool of worker processes when workers > 1,
+    and prints the progress of every finished sample.
+
+    Parameters:
+    - task_list: list
+        Tasks built with graphics_task.
+    - workers: int
+        Number of worker processes, 1 runs the tasks in this process.
+    - render_sessions: int
+        Number of Kaleido sessions rendering the figures of one sample at the same time.
+    - render_cache_dir: str, optional
+        The RenderCache directory shared by all workers, None renders every figure.
+    - render_cache_bytes: int, optional
+        Size cap of the render cache.
+    - bundle_dict: dict, optional
+        Runs the tasks in memory and collects {sample_id: AssetBundle} of the successful
+        samples into it, None writes the graphics into the sample folders.
+    - keep_files: bool
+        Also write the graphics of in-memory tasks into the sample folders.
+
+    Returns:
+    - error_dict: dict
+        {sample_id: traceback} of the samples that failed, empty when all succeeded.
+    """
+    error_dict = {}
+    cache_counts = {'cache_hits': 0, 'cache_misses': 0}
+    batch_start = time.perf_counter()
+    task_list = [dict(task, render_sessions=render_sessions, render_cache_dir=render_cache_dir,
+                      render_cache_bytes=render_cache_bytes, in_memory=bundle_dict is not None, keep_files=keep_files)
+                 for task in task_list]
+
+    def report_progress(done_count, task_result):
+        status = 'FAILED' if task_result['error'] is not None else 'done'
+        print(f"[{done_count}/{len(task_list)}] {task_result['sample_id']} graphics {status} ({task_result['seconds']:.1f}s)")
+        if task_result['error'] is not None:
+            error_dict[task_result['sample_id']] = task_result['error']
+            print(task_result['error'])
+        for count_type in cache_counts:
+            cache_counts[count_type] += task_result[count_type]
+        if bundle_dict is not None and task_result['bundle'] is not None:
+            bundle_dict[task_result['sample_id']] = task_result['bundle']
+
+    if workers <= 1 or len(task_list) <= 1:
+        for t, task in enumerate(task_list):
+            report_progress(t + 1, run_graphics_task(task))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(task_list))) as executor:
+            futures = [executor.submit(run_graphics_task, task) for task in task_list]
+            for f, future in enumerate(as_completed(futures)):
+                report_progress(f + 1, future.result())
+
+    print(f'GRAPHICS BATCH: {len(task_list) - len(error_dict)} of {len(task_list)} samples in '
+          f'{time.perf_counter() - batch_start:.1f}s with {max(1, min(workers, len(task_list)))} worker(s)')
+    if render_cache_dir is not None:
+        print(f"RENDER CACHE: {cache_counts['cache_hits']} figures reused, {cache_counts['cache_misses']} rendered")
+    return error_dict
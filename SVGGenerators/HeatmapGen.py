@@ -5,10 +5,12 @@ Created on Sun Mar  5 11:06:52 2023
 @author: theda
 """
 
+import os
 import plotly 
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.offline import plot
+from SVGGenerators import RenderService
 
 pio.renderers.default='svg'
 
@@ -32,7 +34,7 @@ else:
     
 
 
-def heatmap_plot_generator(sample_id, sample_name, plot_type, input_data, input_colors):
+def heatmap_plot_generator(sample_id, sample_name, plot_type, input_data, input_colors, output_dir=''):
     if plot_type == 'pcb-pcn':
         font_color='white'
         title_text = 'PCB+PCN (mg/g)'
@@ -97,7 +99,7 @@ def heatmap_plot_generator(sample_id, sample_name, plot_type, input_data, input_
     plot(heatmap_plot)
     
     heatmap_plot_output_filename = f"{sample_id}-{plot_type}-heatmap_plot.svg"
-    heatmap_plot.write_image(heatmap_plot_output_filename)
+    RenderService.save_figure(heatmap_plot, os.path.join(output_dir, heatmap_plot_output_filename))
 #    
 #heatmap_plot_generator(sample_id, sample_name, pcb_pcn_plot_type, pcb_pcn_input_data, pcb_pcn_colors)
 
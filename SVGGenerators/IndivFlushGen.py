@@ -1,16 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import os
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.offline import plot
 import pandas as pd
+from SVGGenerators import RenderService
 
 ###############################################################################
 #
 # Flush Test Generator
 #
 ###############################################################################
-def indiv_flush_table_generator(sample_id, table_colors, font_colors, sample_labels, indiv_flush_df):
+def indiv_flush_table_generator(sample_id, table_colors, font_colors, sample_labels, indiv_flush_df, output_dir=''):
     
     table_data_rev = [indiv_flush_df['North-West<br>  '].tolist(),
                   indiv_flush_df['North-East<br>   '].tolist(),
@@ -48,9 +50,9 @@ def indiv_flush_table_generator(sample_id, table_colors, font_colors, sample_lab
 
     #plot(indiv_flush_table)
     indiv_flush_table_output_filename = f'{sample_id}-indiv_flush_table.svg'
-    indiv_flush_table.write_image(indiv_flush_table_output_filename)
+    RenderService.save_figure(indiv_flush_table, os.path.join(output_dir, indiv_flush_table_output_filename))
     
-def indiv_flush_bar_generator(sample_id, sample_name, sample_cultivar, colors_dict, indiv_flush_df):
+def indiv_flush_bar_generator(sample_id, sample_name, sample_cultivar, colors_dict, indiv_flush_df, output_dir=''):
     
     df = indiv_flush_df.transpose()
     # set column names from the first row
@@ -123,9 +125,9 @@ def indiv_flush_bar_generator(sample_id, sample_name, sample_cultivar, colors_di
                           showarrow=False)])
     #plot(indiv_flush_bar_plot)
     indiv_flush_bar_plot_output_filename = f'{sample_id}-indiv_flush_bar.svg'
-    indiv_flush_bar_plot.write_image(indiv_flush_bar_plot_output_filename)
+    RenderService.save_figure(indiv_flush_bar_plot, os.path.join(output_dir, indiv_flush_bar_plot_output_filename))
 
-def indiv_flush_test_graphics_generator(sample_id, specific_sample_df, full_compound_list):
+def indiv_flush_test_graphics_generator(sample_id, specific_sample_df, full_compound_list, output_dir=''):
     """
     Generates a flush bar graph for a given sample DataFrame and a list of compounds.
 
@@ -156,20 +158,10 @@ def indiv_flush_test_graphics_generator(sample_id, specific_sample_df, full_comp
     compounds = full_compound_list
     
     # Create data for each sample
-    replicate_data = []
-    table_data = []
-    
-    # Use iterrows() to iterate over the rows of the DataFrame
-    for r, row in specific_sample_df.iterrows():
-        # Use a list comprehension to select only column names that contain the search string
-        columns_to_select = [col for col in row.index if 'mg_g' in col]
-        # Use loc[] to select only the columns that contain the search string, and then convert the values to a list
-        values = row.loc[columns_to_select].values.tolist()
-        # Use sum() to concatenate all the lists of values into one list
-        values = [float(value) for value in values]
-        table_values = [round(replicate_masses[r], 2)] + [float(value) for value in values]
-        replicate_data.append(values)
-        table_data.append(table_values)
+    # Select the mg/g columns of every replicate at once, they are already numeric (SheetSchema)
+    mg_g_values = specific_sample_df[[col for col in specific_sample_df.columns if 'mg_g' in col]].astype('float64')
+    replicate_data = mg_g_values.values.tolist()
+    table_data = [[round(float(mass), 2)] + values for mass, values in zip(replicate_masses, replicate_data)]
  
     # Define colors for each compound
     colors_dict = {'Norbaeocystin':['#4682B4'],
@@ -225,5 +217,5 @@ def indiv_flush_test_graphics_generator(sample_id, specific_sample_df, full_comp
     # indiv_flush_df = indiv_flush_df.drop(index=drop_index)
     
     # Generate the Individual Flush Table
-    indiv_flush_table_generator(sample_id, table_colors, font_colors, sample_labels, indiv_flush_df)
-    indiv_flush_bar_generator(sample_id, sample_name, sample_cultivar, colors_dict, indiv_flush_df)
\ No newline at end of file
+    indiv_flush_table_generator(sample_id, table_colors, font_colors, sample_labels, indiv_flush_df, output_dir=output_dir)
+    indiv_flush_bar_generator(sample_id, sample_name, sample_cultivar, colors_dict, indiv_flush_df, output_dir=output_dir)
\ No newline at end of file
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import threading
+from DataTools import ContentKeys
+
+# Size cap used when none is configured
+default_max_bytes = 500 * 1024 * 1024
+
+###############################################################################
+#
+# Content-Addressed Cache of Rendered SVG/PNG Artifacts with LRU Eviction
+#
+###############################################################################
+
+class RenderCache:
+    """
+    Stores rendered artifacts as '{cache_dir}/{key}.{ext}', the key being a hash of
+    everything the rendering depends on. The file modification time is the last use:
+    hits touch the file and the least recently used files are evicted once the cache
+    grows beyond max_bytes. Every process may open its own RenderCache on the same
+    directory, artifacts are written atomically; the counters and the eviction of one
+    RenderCache are guarded by a lock, so threads of a process can share it.
+
+    Parameters:
+    - cache_dir: str
+        The directory holding the artifacts.
+    - max_bytes: int
+        Size cap of the directory.
+    """
+    def __init__(self, cache_dir, max_bytes=default_max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+
+    # Hex digest of the key parts (bytes, or anything JSON-serializable)
+    key_for = staticmethod(ContentKeys.key_for)
+
+    def figure_key(self, fig, image_format):
+        """
+        Returns the key of a Plotly figure rendered to image_format: its full JSON spec
+        plus the plotly version.
+        """
+        import plotly
+        return self.key_for('figure', plotly.__version__, image_format, fig.to_json())
+
+    def file_key(self, source_path, **render_params):
+        """
+        Returns the key of a source file (e.g. an SVG) converted with render_params
+        (target format, size, DPI, converter).
+        """
+        with open(source_path, 'rb') as source_file:
+            return self.bytes_key(source_file.read(), **render_params)
+
+    def bytes_key(self, source_data, **render_params):
+        """
+        Returns the key of in-memory source data, equal to file_key of a file holding it.
+        """
+        return self.key_for('file', source_data, render_params)
+
+    def artifact_path(self, key, ext):
+        return os.path.join(self.cache_dir, f'{key}.{ext}')
+
+    def fetch(self, key, ext, output_path):
+        """
+        Copies the cached artifact to output_path and returns True, or returns False
+        when it is not cached.
+        """
+        cached_path = self.artifact_path(key, ext)
+        try:
+            shutil.copyfile(cached_path, output_path)
+            os.utime(cached_path)
+        except FileNotFoundError:
+            self.count_lookup(False)
+            return False
+        self.count_lookup(True)
+        return True
+
+    def read(self, key, ext):
+        """
+        Returns the bytes of the cached artifact, or None when it is not cached.
+        """
+        cached_path = self.artifact_path(key, ext)
+        try:
+            with open(cached_path, 'rb') as cached_file:
+                data = cached_file.read()
+            os.utime(cached_path)
+        except FileNotFoundError:
+            self.count_lookup(False)
+            return None
+        self.count_lookup(True)
+        return data
+
+    def count_lookup(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def store(self, key, ext, source_path):
+        """
+        Adds the rendered file source_path to the cache under key.
+        """
+        cached_path = self.artifact_path(key, ext)
+        temp_path = f'{cached_path}.{os.getpid()}.tmp'
+        shutil.copyfile(source_path, temp_path)
+        self.commit(temp_path, cached_path)
+
+    def store_bytes(self, key, ext, data):
+        """
+        Adds rendered in-memory data to the cache under key.
+        """
+        cached_path = self.artifact_path(key, ext)
+        temp_path = f'{cached_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+        self.commit(temp_path, cached_path)
+
+    def commit(self, temp_path, cached_path):
+        with self.lock:
+            # A key stored again replaces its artifact, only the size difference is added
+            try:
+                replaced_bytes = os.path.getsize(cached_path)
+            except FileNotFoundError:
+                replaced_bytes = 0
+            os.replace(temp_path, cached_path)
+            self.total_bytes += os.path.getsize(cached_path) - replaced_bytes
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used artifacts until the cache fits max_bytes.
+        """
+        entry_list = sorted((entry for entry in os.scandir(self.cache_dir)
+                             if entry.is_file() and not entry.name.endswith('.tmp')),
+                            key=lambda entry: entry.stat().st_mtime)
+        self.total_bytes = sum(entry.stat().st_size for entry in entry_list)
+        for entry in entry_list:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                entry_size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                # Evicted by another process
+                continue
+            self.total_bytes -= entry_size
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size_mb': round(self.total_bytes / 1e6, 1)}
+
+    def print_stats(self, label='RENDER CACHE'):
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups > 0 else 0
+        print(f'{label}: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), '
+              f'{self.evictions} evictions, {self.total_bytes / 1e6:.1f} MB')
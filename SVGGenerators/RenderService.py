@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import plotly.io as pio
+from SVGGenerators import RenderCache, AssetBundle
+
+###############################################################################
+#
+# Batched Kaleido Rendering of the Generated Figures
+#
+###############################################################################
+
+# The FigureBatch collecting the figures of the current thread, None writes every figure at once
+active_batches = threading.local()
+
+# The RenderCache consulted before rendering a figure, None renders every figure
+render_cache = None
+
+def configure_cache(cache_dir, max_bytes=None):
+    """
+    Sets the RenderCache of this process (None disables caching) and returns it.
+    """
+    global render_cache
+    if cache_dir is None:
+        render_cache = None
+    elif render_cache is None or render_cache.cache_dir != cache_dir:
+        render_cache = RenderCache.RenderCache(cache_dir, max_bytes or RenderCache.default_max_bytes)
+    return render_cache
+
+def image_format(output_path):
+    return os.path.splitext(output_path)[1].lstrip('.').lower()
+
+def store_rendered(path_list, key_list):
+    """
+    Adds freshly rendered files to the render cache.
+    """
+    if render_cache is None:
+        return
+    for output_path, cache_key in zip(path_list, key_list):
+        if cache_key is not None:
+            render_cache.store(cache_key, image_format(output_path), output_path)
+
+def write_figures(figure_list, path_list):
+    """
+    Renders a list of figures to their files through one Kaleido session.
+    """
+    if hasattr(pio, 'write_images'):
+        # plotly >= 6.1: the whole list is rendered by one Kaleido browser session
+        pio.write_images(figure_list, path_list)
+    else:
+        # Older plotly keeps one persistent Kaleido subprocess for all write_image calls
+        for fig, output_path in zip(figure_list, path_list):
+            fig.write_image(output_path)
+
+def save_figure(fig, output_path):
+    """
+    Writes a figure to output_path (the format follows the extension), or queues it when
+    a FigureBatch is active in this thread. A figure whose spec was rendered before is
+    copied from the render cache instead. When an AssetBundle is active the image is
+    added to the bundle instead of written. Used by every SVG generator instead of
+    fig.write_image().
+    """
+    asset_bundle = AssetBundle.active_bundle()
+    cache_key = None
+    if render_cache is not None:
+        cache_key = render_cache.figure_key(fig, image_format(output_path))
+        if asset_bundle is not None:
+            cached_data = render_cache.read(cache_key, image_format(output_path))
+            if cached_data is not None:
+                asset_bundle.add(os.path.basename(output_path), cached_data)
+                return
+        elif render_cache.fetch(cache_key, image_format(output_path), output_path):
+            return
+    figure_batch = getattr(active_batches, 'batch', None)
+    if figure_batch is not None:
+        figure_batch.add(fig, output_path, cache_key, asset_bundle)
+    elif asset_bundle is not None:
+        image_data = fig.to_image(format=image_format(output_path))
+        asset_bundle.add(os.path.basename(output_path), image_data)
+        if render_cache is not None:
+            render_cache.store_bytes(cache_key, image_format(output_path), image_data)
+    else:
+        fig.write_image(output_path)
+        store_rendered([output_path], [cache_key])
+
+class FigureBatch:
+    """
+    Collects the figures saved inside a 'with' block and renders them together when the
+    block ends, split over at most `sessions` concurrent Kaleido sessions. Figures queued
+    in a block that raised are dropped.
+
+    Parameters:
+    - sessions: int
+        Upper bound of Kaleido sessions rendering at the same time.
+    - max_batch_size: int
+        Upper bound of figures rendered by one session call.
+    """
+    def __init__(self, sessions=1, max_batch_size=200):
+        self.sessions = max(1, sessions)
+        self.max_batch_size = max_batch_size
+        self.figure_list = []
+        self.path_list = []
+        self.key_list = []
+        self.bundle_list = []
+        self.previous_batch = None
+
+    def add(self, fig, output_path, cache_key=None, asset_bundle=None):
+        self.figure_list.append(fig)
+        self.path_list.append(output_path)
+        self.key_list.append(cache_key)
+        self.bundle_list.append(asset_bundle)
+
+    def clear(self):
+        self.figure_list, self.path_list, self.key_list, self.bundle_list = [], [], [], []
+
+    def render(self):
+        """
+        Renders every queued figure and returns the written paths.
+        """
+        figure_list, path_list, key_list, bundle_list = self.figure_list, self.path_list, self.key_list, self.bundle_list
+        self.clear()
+        if len(figure_list) == 0:
+            return []
+        with tempfile.TemporaryDirectory() as render_dir:
+            # Figures going into an AssetBundle are rendered to a scratch folder and read back
+            render_path_list = [output_path if asset_bundle is None else os.path.join(render_dir, f'{f}_{os.path.basename(output_path)}')
+                                for f, (output_path, asset_bundle) in enumerate(zip(path_list, bundle_list))]
+            # Spread the figures evenly over the sessions, each session renders its share in chunks
+            chunk_size = min(self.max_batch_size, -(-len(figure_list) // self.sessions))
+            chunk_list = [(figure_list[c:c + chunk_size], render_path_list[c:c + chunk_size])
+                          for c in range(0, len(figure_list), chunk_size)]
+            if self.sessions == 1 or len(chunk_list) == 1:
+                for chunk_figures, chunk_paths in chunk_list:
+                    write_figures(chunk_figures, chunk_paths)
+            else:
+                with ThreadPoolExecutor(max_workers=self.sessions) as executor:
+                    # list() re-raises the first rendering error
+                    list(executor.map(lambda chunk: write_figures(*chunk), chunk_list))
+            store_rendered(render_path_list, key_list)
+            for render_path, output_path, asset_bundle in zip(render_path_list, path_list, bundle_list):
+                if asset_bundle is not None:
+                    with open(render_path, 'rb') as image_file:
+                        asset_bundle.add(os.path.basename(output_path), image_file.read())
+        return path_list
+
+    def __enter__(self):
+        self.previous_batch = getattr(active_batches, 'batch', None)
+        active_batches.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        active_batches.batch = self.previous_batch
+        if exc_type is None:
+            self.render()
+        else:
+            self.clear()
+        return False
+
+def render_to_bytes(figure_list, image_format='svg', sessions=1):
+    """
+    Renders a list of figures in one batch and returns their image bytes, in order.
+    """
+    with tempfile.TemporaryDirectory() as render_dir:
+        path_list = [os.path.join(render_dir, f'figure_{f}.{image_format}') for f in range(len(figure_list))]
+        figure_batch = FigureBatch(sessions)
+        for fig, output_path in zip(figure_list, path_list):
+            figure_batch.add(fig, output_path)
+        figure_batch.render()
+        image_list = []
+        for output_path in path_list:
+            with open(output_path, 'rb') as image_file:
+                image_list.append(image_file.read())
+    return image_list
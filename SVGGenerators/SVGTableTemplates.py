@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import re
+import html
+from string import Template
+from SVGGenerators import AssetBundle
+
+###############################################################################
+#
+# Native SVG Tables for the Fixed Report Banners (no Plotly/Kaleido render)
+#
+###############################################################################
+
+# Approximate Arial advance widths in em, characters not listed use default_char_width
+char_width_dict = {**{char: 0.278 for char in " ijl.,:;!|'I"},
+                   **{char: 0.333 for char in 'frt()-[]/'},
+                   **{char: 0.5 for char in 'cksvxyzJ'},
+                   **{char: 0.556 for char in '0123456789abdeghnopquL_#$'},
+                   **{char: 0.667 for char in 'ABEKPSVXY&'},
+                   **{char: 0.722 for char in 'CDHNRUw'},
+                   **{char: 0.778 for char in 'GOQ'},
+                   **{char: 0.833 for char in 'mM'},
+                   'W': 0.944, '%': 0.889, '@': 1.015}
+default_char_width = 0.556
+bold_width_factor = 1.08
+
+cell_padding = 8
+line_spacing = 1.2
+
+# Precompiled templates, only the text and geometry are substituted per table
+svg_template = Template('<svg xmlns="http://www.w3.org/2000/svg" width="$width" height="$height" '
+                        'viewBox="0 0 $width $height">\n$cells</svg>\n')
+cell_template = Template('<rect x="$x" y="$y" width="$width" height="$height" fill="$fill" '
+                         'stroke="$line_color" stroke-width="1"/>\n')
+text_template = Template('<text x="$x" y="$y" text-anchor="$anchor" font-family="Arial" font-size="$font_size" '
+                         'font-weight="$weight" font-style="$style" fill="$color">$text</text>\n')
+
+def text_width(text, font_size, bold=False):
+    """
+    Returns the approximate rendered width in px of a single line of Arial text.
+    """
+    width = sum(char_width_dict.get(char, default_char_width) for char in text) * font_size
+    return width * bold_width_factor if bold else width
+
+def wrap_text(text, font_size, max_width, bold=False):
+    """
+    Returns the lines of text wrapped at word boundaries to max_width, '<br>' forces a break.
+    """
+    line_list = []
+    for paragraph in re.split(r'<br\s*/?>', str(text)):
+        line = ''
+        for word in paragraph.split():
+            candidate = f'{line} {word}' if line != '' else word
+            if line != '' and text_width(candidate, font_size, bold) > max_width:
+                line_list.append(line)
+                line = word
+            else:
+                line = candidate
+        line_list.append(line)
+    # Drop the empty lines the Plotly tables used for vertical spacing
+    while len(line_list) > 1 and line_list[0] == '':
+        line_list.pop(0)
+    return line_list
+
+def fit_text(text, font_size, max_width, max_height, bold=False, min_font_size=10):
+    """
+    Returns (font_size, lines): the largest font size <= font_size at which the wrapped
+    text fits the cell, shrinking in steps of 1 px down to min_font_size.
+    """
+    while True:
+        line_list = wrap_text(text, font_size, max_width, bold)
+        fits_width = all(text_width(line, font_size, bold) <= max_width for line in line_list)
+        fits_height = len(line_list) * font_size * line_spacing <= max_height
+        if (fits_width and fits_height) or font_size <= min_font_size:
+            return font_size, line_list
+        font_size -= 1
+
+def cell_svg(x, y, width, height, text, fill='white', font_size=30, font_color='black', line_color='black',
+             align='left', valign='middle', bold=False, italic=False):
+    """
+    Returns the SVG of one table cell: its rectangle and the fitted, wrapped text.
+    """
+    cells = cell_template.substitute(x=round(x, 2), y=round(y, 2), width=round(width, 2), height=round(height, 2),
+                                     fill=fill, line_color=line_color)
+    if str(text).strip() == '':
+        return cells
+    font_size, line_list = fit_text(text, font_size, width - 2 * cell_padding, height - 2 * cell_padding, bold)
+    line_height = font_size * line_spacing
+    if valign == 'top':
+        first_baseline = y + cell_padding + font_size
+    else:
+        first_baseline = y + (height - len(line_list) * line_height) / 2 + font_size * 0.9
+    anchor, text_x = {'left': ('start', x + cell_padding),
+                      'right': ('end', x + width - cell_padding),
+                      'center': ('middle', x + width / 2)}[align]
+    for l, line in enumerate(line_list):
+        cells += text_template.substitute(x=round(text_x, 2), y=round(first_baseline + l * line_height, 2),
+                                          anchor=anchor, font_size=font_size,
+                                          weight='bold' if bold else 'normal', style='italic' if italic else 'normal',
+                                          color=font_color, text=html.escape(line))
+    return cells
+
+def column_positions(column_widths, total_width):
+    """
+    Returns the x position and pixel width of every column, relative widths scaled
+    to total_width like Plotly's columnwidth.
+    """
+    scale = total_width / sum(column_widths)
+    x_list = [sum(column_widths[:c]) * scale for c in range(len(column_widths))]
+    return x_list, [column_width * scale for column_width in column_widths]
+
+def label_value_table_svg(label, value, width=1325, height=70, column_widths=(451, 1000),
+                          label_fill='lightgrey', value_fill='white', label_font_size=30, value_font_size=30,
+                          font_color='black', line_color='black', label_bold=True, value_bold=False, value_italic=False):
+    """
+    Returns the SVG of a one-row 'LABEL: | value' banner, the layout of the sample
+    information tables (label right aligned, value left aligned).
+    """
+    x_list, width_list = column_positions(column_widths, width)
+    cells = cell_svg(x_list[0], 0, width_list[0], height, label, label_fill, label_font_size, font_color,
+                     line_color, 'right', bold=label_bold)
+    cells += cell_svg(x_list[1], 0, width_list[1], height, value, value_fill, value_font_size, font_color,
+                      line_color, 'left', bold=value_bold, italic=value_italic)
+    return svg_template.substitute(width=width, height=height, cells=cells)
+
+def row_table_svg(value_list, column_widths, width=1325, height=425, row_height=None, fill='white',
+                  font_size=25, font_color='black', line_color='black'):
+    """
+    Returns the SVG of a one-row table with top-left aligned, wrapped text in every cell.
+    """
+    row_height = height if row_height is None else row_height
+    x_list, width_list = column_positions(column_widths, width)
+    cells = ''.join(cell_svg(x, 0, column_width, row_height, value, fill, font_size, font_color, line_color,
+                             'left', 'top')
+                    for x, column_width, value in zip(x_list, width_list, value_list))
+    return svg_template.substitute(width=width, height=height, cells=cells)
+
+def write_svg(svg_text, output_path):
+    if AssetBundle.capture(output_path, svg_text):
+        return
+    with open(output_path, 'w', encoding='utf-8') as svg_file:
+        svg_file.write(svg_text)
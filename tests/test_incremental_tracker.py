@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+from DataTools import IncrementalTracker, SampleIndex
+
+def sheet_df():
+    return pd.DataFrame({'Sample_ID': ['HLO1A', 'HLO1B', 'HLO2'], 'Psilocybin_ppm': [1.0, 2.0, 3.0]})
+
+def test_hash_changes_only_with_the_rows_of_the_group():
+    df = sheet_df()
+    hash_dict = IncrementalTracker.sample_hashes(df, SampleIndex.SampleIndex(df), ['HLO1', 'HLO2', 'HLO3'])
+    assert hash_dict['HLO3'] is None
+
+    changed_df = df.copy()
+    changed_df.loc[1, 'Psilocybin_ppm'] = 2.5
+    changed_hashes = IncrementalTracker.sample_hashes(changed_df, SampleIndex.SampleIndex(changed_df), ['HLO1', 'HLO2'])
+    assert changed_hashes['HLO1'] != hash_dict['HLO1']
+    assert changed_hashes['HLO2'] == hash_dict['HLO2']
+
+    # A settings key and a new column change every hash
+    keyed_hashes = IncrementalTracker.sample_hashes(df, SampleIndex.SampleIndex(df), ['HLO2'], 'apply_dilution')
+    assert keyed_hashes['HLO2'] != hash_dict['HLO2']
+    wider_df = df.assign(Psilocin_ppm=0.0)
+    assert IncrementalTracker.sample_hashes(wider_df, SampleIndex.SampleIndex(wider_df), ['HLO2'])['HLO2'] != hash_dict['HLO2']
+
+def test_needs_processing_reasons():
+    state = {}
+    assert IncrementalTracker.needs_processing(state, 'HLO1', 'a', True) == 'new'
+    IncrementalTracker.mark_processed(state, 'HLO1', 'a')
+    assert IncrementalTracker.needs_processing(state, 'HLO1', 'b', True) == 'changed'
+    assert IncrementalTracker.needs_processing(state, 'HLO1', 'a', False) == 'outputs missing'
+    assert IncrementalTracker.needs_processing(state, 'HLO1', 'a', True) is None
+
+def test_state_round_trip(tmp_path):
+    state_path = str(tmp_path / 'state' / 'sample_hashes.json')
+    assert IncrementalTracker.load_state(state_path) == {}
+    state = {}
+    IncrementalTracker.mark_processed(state, 'HLO1', 'a', bundled=True)
+    IncrementalTracker.save_state(state_path, state)
+    assert IncrementalTracker.load_state(state_path) == state
+
+def test_outputs_exist_checks_reports_of_bundled_samples(tmp_path):
+    graphic_types = ['donut_plot', 'legend_table']
+    (tmp_path / 'HLO1-donut_plot.svg').write_text('<svg/>')
+    assert not IncrementalTracker.outputs_exist({}, str(tmp_path), 'HLO1', graphic_types)
+    (tmp_path / 'HLO1-legend_table.svg').write_text('<svg/>')
+    assert IncrementalTracker.outputs_exist({}, str(tmp_path), 'HLO1', graphic_types)
+
+    # Bundled samples have no SVG files, their report pages are the outputs
+    state = {'HLO2': {'hash': 'a', 'bundled': True}}
+    assert not IncrementalTracker.outputs_exist(state, str(tmp_path), 'HLO2', graphic_types)
+    (tmp_path / 'HLO2 - Cap - Profile.pdf').write_bytes(b'%PDF')
+    assert IncrementalTracker.outputs_exist(state, str(tmp_path), 'HLO2', graphic_types)
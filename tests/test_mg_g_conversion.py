@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+from DataTools import MgGConversion
+
+def sheet_df():
+    # The mg/g columns are not in the order of the ppm columns
+    return pd.DataFrame({'Sample_ID': ['HLO1A', 'HLO1B', 'HLO2', 'HLO3'],
+                         'Sonication_Solvent_Volume': [10, 10, 5, 8],
+                         'Processed_Amount': [0.5, 0.25, 0.5, 0.4],
+                         'Extract_Dilution_Factor': [2, '', 4, 1],
+                         'Psilocybin_ppm': [123.4, 0, '', 77.7],
+                         'Psilocin_ppm': ['56.7', 12, 3.3, ''],
+                         'Psilocin_mg_g': ['', '', '', ''],
+                         'Psilocybin_mg_g': ['', '', '', '']})
+
+def test_columns_are_paired_by_compound():
+    ppm_col_list, mg_g_col_list = MgGConversion.conversion_column_lists(sheet_df())
+    assert ppm_col_list == ['Psilocybin_ppm', 'Psilocin_ppm']
+    assert mg_g_col_list == ['Psilocybin_mg_g', 'Psilocin_mg_g']
+
+def test_unmatched_column_raises():
+    with pytest.raises(ValueError, match='Baeocystin_ppm'):
+        MgGConversion.conversion_column_lists(sheet_df().assign(Baeocystin_ppm=1.0))
+
+def test_matches_convert_ppm_mg_g():
+    ReportGenMain = pytest.importorskip('ReportGenMain')
+    df = sheet_df()
+    updated_df, error_mask = MgGConversion.calculate_all_mg_g_values(df)
+    assert not error_mask.to_numpy().any()
+    for compound in ['Psilocybin', 'Psilocin']:
+        legacy_values = [ReportGenMain.convert_ppm_mg_g(row['Sample_ID'], row['Processed_Amount'],
+                                                        row['Sonication_Solvent_Volume'], row['Extract_Dilution_Factor'],
+                                                        row[f'{compound}_ppm'])
+                         for _, row in df.iterrows()]
+        assert list(updated_df[f'{compound}_mg_g']) == legacy_values
+
+def test_formula_and_dilution():
+    df = sheet_df()
+    updated_df = MgGConversion.calculate_all_mg_g_values(df)[0]
+    # mg/g = ppm * volume / weight / 1000, rounded to one decimal
+    assert list(updated_df['Psilocybin_mg_g']) == [2.5, 0, 0, 1.6]
+    assert list(updated_df['Psilocin_mg_g']) == [1.1, 0.5, 0, 0]
+    diluted_df = MgGConversion.calculate_all_mg_g_values(df, apply_dilution=True)[0]
+    # A blank dilution factor counts as 1
+    assert list(diluted_df['Psilocybin_mg_g']) == [4.9, 0, 0, 1.6]
+    assert list(diluted_df['Psilocin_mg_g']) == [2.3, 0.5, 0.1, 0]
+
+def test_rows_and_error_mask():
+    df = sheet_df()
+    df.loc[2, 'Psilocin_ppm'] = 'n/a'
+    rows = np.array([False, False, True, True])
+    updated_df, error_mask = MgGConversion.calculate_all_mg_g_values(df, rows=rows)
+    assert list(updated_df['Psilocybin_mg_g']) == ['', '', 0, 1.6]
+    assert list(error_mask.index) == [2, 3]
+    error_df = MgGConversion.mg_g_error_report(updated_df, error_mask)
+    assert error_df.to_dict('records') == [{'Sample_ID': 'HLO2', 'Column': 'Psilocin_mg_g'}]
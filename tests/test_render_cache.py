@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from DataTools import ContentKeys
+from SVGGenerators import RenderCache
+
+def test_keys_separate_their_parts():
+    assert ContentKeys.key_for('ab', 'c') != ContentKeys.key_for('a', 'bc')
+    assert ContentKeys.key_for({'dpi': 300, 'format': 'png'}) == ContentKeys.key_for({'format': 'png', 'dpi': 300})
+    assert RenderCache.RenderCache.key_for('file', b'<svg/>') == ContentKeys.key_for('file', b'<svg/>')
+
+def test_store_read_and_fetch(tmp_path):
+    render_cache = RenderCache.RenderCache(str(tmp_path / 'cache'))
+    source_path = str(tmp_path / 'HLO1-donut_plot.svg')
+    with open(source_path, 'wb') as source_file:
+        source_file.write(b'<svg/>')
+    key = render_cache.file_key(source_path, fmt='png', dpi=300)
+    assert key == render_cache.bytes_key(b'<svg/>', fmt='png', dpi=300)
+    assert render_cache.read(key, 'png') is None
+    render_cache.store_bytes(key, 'png', b'png data')
+    assert render_cache.read(key, 'png') == b'png data'
+    assert render_cache.fetch(key, 'png', str(tmp_path / 'out.png'))
+    assert not render_cache.fetch('missing', 'png', str(tmp_path / 'other.png'))
+    assert render_cache.stats()['hits'] == 2 and render_cache.stats()['misses'] == 2
+
+def test_stored_again_counts_once(tmp_path):
+    render_cache = RenderCache.RenderCache(str(tmp_path / 'cache'))
+    render_cache.store_bytes('key', 'png', b'x' * 100)
+    render_cache.store_bytes('key', 'png', b'x' * 60)
+    assert render_cache.total_bytes == 60
+    assert RenderCache.RenderCache(str(tmp_path / 'cache')).total_bytes == 60
+
+def test_least_recently_used_is_evicted(tmp_path):
+    render_cache = RenderCache.RenderCache(str(tmp_path / 'cache'), max_bytes=250)
+    for key in ['a', 'b']:
+        render_cache.store_bytes(key, 'png', b'x' * 100)
+    # Reading 'a' makes 'b' the least recently used artifact
+    past = time.time() - 60
+    os.utime(render_cache.artifact_path('b', 'png'), (past, past))
+    render_cache.read('a', 'png')
+    render_cache.store_bytes('c', 'png', b'x' * 100)
+    assert render_cache.read('b', 'png') is None
+    assert render_cache.read('a', 'png') is not None and render_cache.read('c', 'png') is not None
+    assert render_cache.evictions == 1 and render_cache.total_bytes == 200
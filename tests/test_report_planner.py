@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from PDFGenerators import ReportPlanner
+
+def test_pages_are_rebuilt_when_an_input_changes(tmp_path):
+    manifest_path = str(tmp_path / 'state' / 'report_manifest.json')
+    svg_path = str(tmp_path / 'HLO1-donut_plot.svg')
+    pdf_path = str(tmp_path / 'HLO1 - Cap - Profile.pdf')
+    with open(svg_path, 'w') as svg_file:
+        svg_file.write('<svg/>')
+    page_layout_key = ReportPlanner.layout_key('Profile', [0, 0, 100, 100])
+
+    report_planner = ReportPlanner.ReportPlanner(manifest_path)
+    signature = report_planner.page_signature(page_layout_key, [svg_path])
+    assert report_planner.stale_reason(pdf_path, signature) == 'pdf missing'
+    with open(pdf_path, 'wb') as pdf_file:
+        pdf_file.write(b'%PDF')
+    assert report_planner.stale_reason(pdf_path, signature) == 'not built by the planner'
+    report_planner.record(pdf_path, signature)
+    report_planner.save()
+
+    report_planner = ReportPlanner.ReportPlanner(manifest_path)
+    assert report_planner.stale_reason(pdf_path, report_planner.page_signature(page_layout_key, [svg_path])) is None
+    assert report_planner.stale_reason(pdf_path, signature, force=True) == 'forced'
+    other_layout_key = ReportPlanner.layout_key('Profile', [0, 0, 50, 50])
+    assert report_planner.stale_reason(pdf_path, report_planner.page_signature(other_layout_key, [svg_path])) == 'layout changed'
+    with open(svg_path, 'w') as svg_file:
+        svg_file.write('<svg width="2"/>')
+    signature = report_planner.page_signature(page_layout_key, [svg_path])
+    assert report_planner.stale_reason(pdf_path, signature) == 'inputs changed: HLO1-donut_plot.svg'
+
+def test_in_memory_inputs_match_their_files(tmp_path):
+    svg_path = str(tmp_path / 'HLO1-donut_plot.svg')
+    with open(svg_path, 'wb') as svg_file:
+        svg_file.write(b'<svg/>')
+    report_planner = ReportPlanner.ReportPlanner(str(tmp_path / 'report_manifest.json'))
+    assert report_planner.file_digest(svg_path) == report_planner.file_digest('unused', b'<svg/>')
+    signature = report_planner.page_signature('layout', [svg_path], {'HLO1-donut_plot.svg': b'<svg/>'})
+    assert signature['inputs'][svg_path] == report_planner.file_digest(svg_path)
+
+def test_missing_required_inputs_block_the_page(tmp_path):
+    present_path = str(tmp_path / 'HLO1-donut_plot.svg')
+    missing_path = str(tmp_path / 'HLO1-legend_table.svg')
+    with open(present_path, 'w') as svg_file:
+        svg_file.write('<svg/>')
+    report_planner = ReportPlanner.ReportPlanner(str(tmp_path / 'report_manifest.json'))
+    signature = report_planner.page_signature('layout', [present_path, missing_path])
+    assert report_planner.missing_reason(signature, [present_path]) is None
+    reason = report_planner.missing_reason(signature, [present_path, missing_path])
+    assert reason == 'blocked, inputs missing: HLO1-legend_table.svg'
+    assert ReportPlanner.is_blocked(reason)
+    assert not ReportPlanner.is_blocked('pdf missing')
+    assert not ReportPlanner.is_blocked(None)
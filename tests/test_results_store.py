@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import pandas as pd
+from DataTools import ResultsStore, SampleIndex, StatsEngine
+
+def sheet_df():
+    # HLO1A appears twice, the replicates are kept apart by their occurrence
+    return pd.DataFrame({'Sample_ID': ['HLO1A', 'HLO1A', 'HLO1B', 'HLO2'],
+                         'Sample_Name': ['Cap', 'Cap', 'Cap', 'Stem'],
+                         'Client_Name': ['Lab', 'Lab', 'Lab', 'Farm'],
+                         'Cultivar': ['GT', 'GT', 'GT', 'PE'],
+                         'Generation_Date': ['01/02/2024', '01/02/2024', '01/02/2024', '03/04/2024'],
+                         'Sonication_Solvent_Volume': [10] * 4,
+                         'Psilocybin_mg_g': [1.0, 2.0, 3.0, 4.0],
+                         'Psilocin_mg_g': [0.5, 0.5, '', 0.2]})
+
+def stored_results(tmp_path):
+    df = sheet_df()
+    sample_index = SampleIndex.SampleIndex(df)
+    stats_df = StatsEngine.sample_stats_table(df, sample_index.group_keys)
+    results_store = ResultsStore.ResultsStore(str(tmp_path / 'results' / 'results.sqlite'))
+    results_store.store_samples(df, sample_index, stats_df, ['HLO1', 'HLO2'], {'HLO1': 'hash1', 'HLO2': 'hash2'})
+    return results_store, stats_df
+
+def test_lookup_sample_stats_matches_stats_engine(tmp_path):
+    results_store, stats_df = stored_results(tmp_path)
+    with results_store:
+        stored_stats = results_store.lookup_sample_stats('HLO1', 'hash1')
+        computed_stats = StatsEngine.lookup_sample_stats(stats_df, 'HLO1')
+        assert stored_stats[0]['Sample_Name'] == 'Cap'
+        assert stored_stats[1:] == computed_stats[1:]
+        # Stored from other rows, or never stored
+        assert results_store.lookup_sample_stats('HLO1', 'other hash') is None
+        assert results_store.lookup_sample_stats('HLO3') is None
+
+def test_replicates_and_queries(tmp_path):
+    results_store, stats_df = stored_results(tmp_path)
+    with results_store:
+        replicate_df = results_store.replicate_values('HLO1')
+        assert list(replicate_df.index) == [('HLO1A', 0), ('HLO1A', 1), ('HLO1B', 0)]
+        assert list(replicate_df['Psilocybin']) == [1.0, 2.0, 3.0]
+        query_df = results_store.query_samples(client='Farm', compound='Psilocybin')
+        assert query_df[['group_id', 'generation_date', 'mean']].values.tolist() == [['HLO2', '2024-03-04', 4.0]]
+
+        # Storing a group again replaces its rows
+        results_store.store_samples(sheet_df(), SampleIndex.SampleIndex(sheet_df()), stats_df, ['HLO1'], {'HLO1': 'hash3'})
+        assert len(results_store.replicate_values('HLO1')) == 3
+        assert results_store.lookup_sample_stats('HLO1', 'hash3') is not None
+
+def test_outdated_store_is_rebuilt(tmp_path):
+    db_path = str(tmp_path / 'results.sqlite')
+    connection = sqlite3.connect(db_path)
+    connection.execute('CREATE TABLE samples (group_id TEXT PRIMARY KEY)')
+    connection.execute('PRAGMA user_version = 1')
+    connection.commit()
+    connection.close()
+    with ResultsStore.ResultsStore(db_path) as results_store:
+        assert results_store.connection.execute('PRAGMA user_version').fetchone()[0] == ResultsStore.store_version
+        assert 'row_hash' in [row[1] for row in results_store.connection.execute('PRAGMA table_info(samples)')]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+from DataTools import SampleIndex
+
+def sheet_df():
+    # Bare parent rows (HLO126, FT3) and a combined ID row (HLO12-126) sit between the replicates
+    return pd.DataFrame({'Sample_ID': ['HLO126', 'HLO126A', 'HLO12-126', 'HLO126B', 'FT3', 'FT3A', 'FT3B',
+                                       'HLO127', 'HLO126C', 'HLO128'],
+                         'Sample_Name': ['', '', '', '', '', 'Bin 1 Flush 3 Position 1', 'Bin 1 Flush 3 Position 2',
+                                         '', '', ''],
+                         'Value': range(10)})
+
+def test_replicate_rows_skip_bare_parents_and_combined_ids():
+    df = sheet_df()
+    sample_index = SampleIndex.SampleIndex(df)
+    assert list(sample_index.replicate_df(df, 'HLO126')['Sample_ID']) == ['HLO126A', 'HLO126B', 'HLO126C']
+    assert list(sample_index.replicate_df(df, 'FT3')['Sample_ID']) == ['FT3A', 'FT3B']
+    assert list(sample_index.replicate_df(df, 'HLO127')['Sample_ID']) == ['HLO127']
+    assert list(sample_index.replicate_df(df, 'HLO128')['Value']) == [9]
+    assert len(sample_index.replicate_positions('HLO12-126')) == 0
+
+def test_sample_mask_covers_the_parent_and_its_replicates():
+    df = sheet_df()
+    sample_index = SampleIndex.SampleIndex(df)
+    assert list(df['Sample_ID'][sample_index.sample_mask('HLO126')]) == ['HLO126', 'HLO126A', 'HLO126B', 'HLO126C']
+    assert list(df['Sample_ID'][sample_index.sample_mask('HLO12-126')]) == ['HLO12-126']
+
+def test_group_ids_and_flush_info():
+    df = sheet_df()
+    sample_index = SampleIndex.SampleIndex(df)
+    assert sample_index.group_ids() == ['HLO126', 'FT3', 'HLO127', 'HLO128']
+    flush_info_df = sample_index.flush_info('FT3')
+    assert list(flush_info_df['Sample_ID']) == ['FT3A', 'FT3B']
+    assert list(flush_info_df['Flush_ID']) == ['3', '3']
+    assert list(flush_info_df['Position']) == [1, 2]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from DataTools import SampleSelection
+
+group_ids = ['HLO118', 'HLO120', 'HLO125', 'HLO129', 'HLO130', 'FT3', 'CUP7']
+
+def test_expand_sample_patterns():
+    assert SampleSelection.expand_sample_patterns(['HLO125'], group_ids) == (['HLO125'], [])
+    assert SampleSelection.expand_sample_patterns(['HLO12*,CUP7'], group_ids) == (['HLO120', 'HLO125', 'HLO129', 'CUP7'], [])
+    assert SampleSelection.expand_sample_patterns(['HLO120..HLO129'], group_ids) == (['HLO120', 'HLO125', 'HLO129'], [])
+    assert SampleSelection.expand_sample_patterns(['HLO119..125', 'HLO999'], group_ids) == (['HLO120', 'HLO125'], ['HLO999'])
+    assert SampleSelection.expand_sample_patterns(['changed'], group_ids) == (group_ids, [])
+
+def test_range_with_another_end_prefix_raises():
+    with pytest.raises(ValueError):
+        SampleSelection.expand_sample_patterns(['HLO120..CUP129'], group_ids)
+
+def test_forces_rebuild():
+    assert SampleSelection.forces_rebuild(['HLO1,All'])
+    assert not SampleSelection.forces_rebuild(['changed'])
+
+def test_parse_flush_range():
+    assert SampleSelection.parse_flush_range('3-11') == (3, 11)
+    assert SampleSelection.parse_flush_range('FT3-FT11') == (3, 11)
+    assert SampleSelection.parse_flush_range('ft5') == (5, 5)
+    with pytest.raises(ValueError):
+        SampleSelection.parse_flush_range('11-3')
+    assert SampleSelection.flush_test_list(3, 5) == ['FT3', 'FT4', 'FT5']
+
+def test_report_category():
+    assert [SampleSelection.report_category(report_type) for report_type in ['CUP Report', 'Profile', 'FT3-11', 'Other']] \
+        == ['Cup', 'Profile', 'Flush', None]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+from DataTools import SheetArchive
+
+def sheet_df():
+    # Mixed numbers and text as get_as_df returns them, and a repeated blank Sample_ID
+    return pd.DataFrame({'Sample_ID': ['HLO1', 'HLO2', '', 'HLO3', ''],
+                         'Psilocybin_ppm': [1.5, '', 2.0, 'n/a', ''],
+                         'Volume': [10, 10, 5, 8, 0]})
+
+def test_versions_are_rebuilt_from_the_deltas(tmp_path):
+    sheet_archive = SheetArchive.SheetArchive(str(tmp_path / 'archive'))
+    first_df = sheet_df()
+    assert sheet_archive.save(first_df, 'revision 1')['full']
+    assert sheet_archive.save(first_df, 'revision 2') is None
+
+    second_df = first_df.copy()
+    second_df.loc[1, 'Psilocybin_ppm'] = 3.5
+    second_df = pd.concat([second_df.drop(index=3), pd.DataFrame({'Sample_ID': ['HLO4'], 'Psilocybin_ppm': [0.1], 'Volume': [9]})],
+                          ignore_index=True)
+    entry = sheet_archive.save(second_df, 'revision 3')
+    assert not entry['full']
+    assert entry['changed'] == 2
+    assert entry['removed'] == ['HLO3']
+
+    # A reopened archive rebuilds both versions, the mixed-type column as text
+    sheet_archive = SheetArchive.SheetArchive(str(tmp_path / 'archive'))
+    assert list(sheet_archive.versions()['label']) == ['revision 1', 'revision 3']
+    pd.testing.assert_frame_equal(sheet_archive.load(1), SheetArchive.SheetArchive.text_frame(first_df))
+    pd.testing.assert_frame_equal(sheet_archive.load(), SheetArchive.SheetArchive.text_frame(second_df))
+
+    diff_dict = sheet_archive.diff(1)
+    assert diff_dict['added'] == ['HLO4']
+    assert diff_dict['removed'] == ['HLO3']
+    assert diff_dict['changed'].values.tolist() == [['HLO2', 'Psilocybin_ppm', '', '3.5']]
+
+def test_reordered_rows_are_archived(tmp_path):
+    sheet_archive = SheetArchive.SheetArchive(str(tmp_path / 'archive'))
+    sheet_archive.save(sheet_df())
+    reordered_df = sheet_df().iloc[[3, 0, 1, 2, 4]].reset_index(drop=True)
+    entry = sheet_archive.save(reordered_df)
+    assert entry['order'] and entry['changed'] == 0
+    assert list(sheet_archive.load()['Sample_ID']) == ['HLO3', 'HLO1', 'HLO2', '', '']
+
+def test_full_snapshot_every_full_interval(tmp_path):
+    sheet_archive = SheetArchive.SheetArchive(str(tmp_path / 'archive'), full_interval=2)
+    df = sheet_df()
+    full_list = []
+    for volume in range(4):
+        df.loc[0, 'Volume'] = volume
+        full_list.append(sheet_archive.save(df)['full'])
+    assert full_list == [True, False, True, False]
+    assert sheet_archive.load(4).loc[0, 'Volume'] == 3
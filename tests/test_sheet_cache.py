@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import pytest
+from DataTools import SheetCache
+
+def local_backend(tmp_path):
+    sheet_dir = tmp_path / 'sheets' / 'key'
+    sheet_dir.mkdir(parents=True)
+    pd.DataFrame({'Sample_ID': ['HLO1', 'HLO2'], 'Psilocybin_ppm': [1.5, '']}).to_csv(sheet_dir / 'Sheet.csv', index=False)
+    return SheetCache.LocalFileBackend(str(tmp_path / 'sheets'))
+
+def test_snapshot_is_reused_until_the_revision_changes(tmp_path):
+    backend = local_backend(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    loaded_df, snapshot_info = SheetCache.load_worksheet_cached(backend, 'key', 'Sheet', cache_dir)
+    assert snapshot_info['source'] == 'remote'
+    assert list(loaded_df['Psilocybin_ppm']) == ['1.5', '']
+
+    cached_df, snapshot_info = SheetCache.load_worksheet_cached(backend, 'key', 'Sheet', cache_dir)
+    assert snapshot_info['source'] == 'snapshot'
+    pd.testing.assert_frame_equal(cached_df, loaded_df)
+
+    backend.write_ranges('key', 'Sheet', ['B3:B3'], [[[2.5]]])
+    refreshed_df, snapshot_info = SheetCache.load_worksheet_cached(backend, 'key', 'Sheet', cache_dir)
+    assert snapshot_info['source'] == 'remote'
+    assert list(refreshed_df['Psilocybin_ppm']) == [1.5, 2.5]
+
+def test_offline_falls_back_to_the_snapshot(tmp_path):
+    backend = local_backend(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    loaded_df = SheetCache.load_worksheet_cached(backend, 'key', 'Sheet', cache_dir)[0]
+    offline_backend = SheetCache.LocalFileBackend(str(tmp_path / 'unreachable'))
+    offline_df, snapshot_info = SheetCache.load_worksheet_cached(offline_backend, 'key', 'Sheet', cache_dir)
+    assert snapshot_info['source'] == 'offline-snapshot'
+    pd.testing.assert_frame_equal(offline_df, loaded_df)
+
+    with pytest.raises(FileNotFoundError):
+        SheetCache.load_worksheet_cached(offline_backend, 'key', 'Other Sheet', cache_dir)
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_write_frame_round_trip(tmp_path, compress):
+    # Mixed-type columns cannot be stored as Parquet and fall back to a pickle
+    df = pd.DataFrame({'Sample_ID': ['HLO1', 'HLO2'], 'Value': [1.5, '']})
+    frame_format = SheetCache.write_frame(df, str(tmp_path / 'frame'), compress=compress)
+    assert frame_format in ['parquet', 'pickle', 'pickle-gzip']
+    pd.testing.assert_frame_equal(SheetCache.read_frame(str(tmp_path / 'frame'), frame_format), df)
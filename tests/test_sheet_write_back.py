@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+from DataTools import SheetCache, SheetWriteBack
+
+def write_sheet(tmp_path):
+    sheet_dir = tmp_path / 'key'
+    sheet_dir.mkdir()
+    pd.DataFrame({'Sample_ID': ['HLO1', 'HLO2', 'HLO3', 'HLO4'],
+                  'Psilocybin_mg_g': ['', '', 1.5, ''],
+                  'Psilocin_mg_g': ['', '', '', 0.5]}).to_csv(sheet_dir / 'Sheet.csv', index=False)
+    return SheetCache.LocalFileBackend(str(tmp_path))
+
+def computed_df(loaded_df):
+    updated_df = loaded_df.copy()
+    updated_df['Psilocybin_mg_g'] = [2.5, 0.7, 1.5, 0.0]
+    updated_df['Psilocin_mg_g'] = [1.1, 0.2, 0.0, 0.5]
+    return updated_df
+
+def test_column_letter():
+    assert [SheetWriteBack.column_letter(col_pos) for col_pos in [0, 25, 26, 27, 701, 702]] == ['A', 'Z', 'AA', 'AB', 'ZZ', 'AAA']
+
+def test_changed_ranges_merge_rows_and_columns():
+    loaded_df = pd.DataFrame({'Sample_ID': ['HLO1', 'HLO2', 'HLO3'],
+                              'Psilocybin_mg_g': ['', '', 1.5],
+                              'Psilocin_mg_g': ['', '', '']})
+    updated_df = loaded_df.copy()
+    updated_df['Psilocybin_mg_g'] = [2.5, 0.7, 1.5]
+    updated_df['Psilocin_mg_g'] = [1.1, 0.2, '']
+    range_list, value_list = SheetWriteBack.changed_ranges(loaded_df, updated_df)
+    assert range_list == ['B2:C3']
+    assert value_list == [[[2.5, 1.1], [0.7, 0.2]]]
+
+def test_write_back_rerun_is_idempotent(tmp_path):
+    backend = write_sheet(tmp_path)
+    loaded_df = backend.fetch('key', 'Sheet')
+    summary = SheetWriteBack.write_back_changes(backend, 'key', 'Sheet', loaded_df, computed_df(loaded_df))
+    assert summary['calls'] == 1
+    assert summary['cells'] == 6
+    assert len(backend.write_calls) == 1
+
+    # The second run loads the written sheet and computes the same values: nothing is sent
+    reloaded_df = backend.fetch('key', 'Sheet')
+    assert list(reloaded_df['Psilocybin_mg_g']) == [2.5, 0.7, 1.5, 0.0]
+    summary = SheetWriteBack.write_back_changes(backend, 'key', 'Sheet', reloaded_df, computed_df(reloaded_df))
+    assert summary == {'ranges': 0, 'cells': 0, 'calls': 0}
+    assert len(backend.write_calls) == 1
+
+def test_rate_limited_batch_is_retried(tmp_path):
+    backend = write_sheet(tmp_path)
+    loaded_df = backend.fetch('key', 'Sheet')
+    write_ranges = backend.write_ranges
+    error_list = [Exception('429 RATE_LIMIT_EXCEEDED')]
+
+    def flaky_write_ranges(*args):
+        if error_list:
+            raise error_list.pop()
+        write_ranges(*args)
+
+    backend.write_ranges = flaky_write_ranges
+    summary = SheetWriteBack.write_back_changes(backend, 'key', 'Sheet', loaded_df, computed_df(loaded_df), backoff_seconds=0)
+    assert summary['calls'] == 1
+    assert len(backend.write_calls) == 1
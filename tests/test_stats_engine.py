@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from DataTools import StatsEngine
+
+def sheet_df():
+    return pd.DataFrame({'Sample_ID': ['HLO1', 'HLO1A', 'HLO1B', 'HLO1C', 'HLO1-2', 'HLO2'],
+                         'Sample_Name': ['', 'Cap', 'Cap', 'Cap', '', 'Stem'],
+                         'Sonication_Solvent_Volume': [10] * 6,
+                         'Psilocybin_mg_g': [9.9, 1.0, 2.0, 3.0, 9.9, 4.0],
+                         'Psilocin_mg_g': [9.9, 0.5, '', 0.7, 9.9, 0.2]})
+
+def test_sample_stats_table_groups_replicates():
+    stats_df = StatsEngine.sample_stats_table(sheet_df())
+    assert list(stats_df.index) == ['HLO1', 'HLO2']
+    assert list(stats_df['Sample_Name']) == ['Cap', 'Stem']
+    assert list(stats_df['Psilocybin_mg_g_MEAN']) == [2.0, 4.0]
+    assert list(stats_df['Psilocybin_mg_g_SD'][:1]) == [1.0]
+    assert np.isnan(stats_df.loc['HLO2', 'Psilocybin_mg_g_SD'])
+    # Blank cells are left out of the mean and the count
+    assert list(stats_df['Psilocin_mg_g_MEAN']) == [0.6, 0.2]
+    assert list(stats_df['Psilocin_mg_g_N']) == [2, 1]
+
+def test_lookup_sample_stats():
+    stats_df = StatsEngine.sample_stats_table(sheet_df())
+    sample_info_df, compound_list, mean_list, sd_list = StatsEngine.lookup_sample_stats(stats_df, 'HLO1')
+    assert list(sample_info_df.index) == ['Sample_ID', 'Sample_Name']
+    assert compound_list == ['Psilocybin', 'Psilocin']
+    assert mean_list == [2.0, 0.6]
+    assert sd_list == [1.0, 0.1]
+
+def test_aggregate_group_means():
+    df = pd.DataFrame({'Sample_ID': ['FT3A', 'FT3B', 'FT4A'],
+                       'Sample_Name': ['Bin 1 Flush 3 Position 1', 'Bin 1 Flush 3 Position 2', 'Bin 1 Flush 4 Position 1'],
+                       'Notes': ['a', 'b', 'c'],
+                       'Psilocybin_mg_g': [1.0, '', 4.0]})
+    mean_df = StatsEngine.aggregate_group_means(df, ['FT3', 'FT3', 'FT4'], {'FT3': 'Flush 3'})
+    assert list(mean_df['Sample_ID']) == ['FT3', 'FT4']
+    assert list(mean_df['Sample_Name']) == ['Flush 3', 'Bin 1 Flush 4 Position 1']
+    assert list(mean_df['Notes']) == ['a', 'c']
+    # Blank cells count as 0
+    assert list(mean_df['Psilocybin_mg_g']) == [0.5, 4.0]